@@ -1,88 +1,110 @@
-import sqlite3
-from datetime import datetime
+import asyncio
+import json
+import logging
+import math
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 import uvicorn
-from os import getenv
 
-from stylemail import seed_user_style, generate_email, generate_nudge_summary, generate_nudge_email
-from stylemail.vectorstore import UserVectorStore
+from stylemail import aseed_user_style, agenerate_email, agenerate_nudge_email, agenerate_team_nudge_emails
+from stylemail import astream_email, astream_nudge_email
+from stylemail.batch import NudgeSummaryBatch
+from stylemail import logs, metrics
+from stylemail.clients import AsyncStyleMailClients
+from stylemail.nudges import prepare_nudges
+from stylemail.scheduler import RateLimitedError
+from stylemail.vectorstore import AsyncUserVectorStore
 from stylemail.config import Config
-from services import get_auth_token, get_nudge_data
+from services import AsyncNudgeApiClient
 
 # Load environment variables
 load_dotenv()
 
-def create_employee_nudge_summary_table():
-    """Create the employee_nudge_summary table in SQLite if it doesn't exist."""
-    try:
-        sql_connection = sqlite3.connect("laudio_client1.db")
-        print("[server] SQLite connection successful.")
-        
-        # Create table if it doesn't exist
-        cursor = sql_connection.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS employee_nudge_summary (
-                employee_id INT PRIMARY KEY,
-                created_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                summary TEXT,
-                nudge_snippet TEXT
-            );
-        ''')
-        sql_connection.commit()
-        cursor.close()
-    except Exception as e:
-        print(f"[server] SQLite connection failed: {e}")
-
+logger = logging.getLogger(__name__)
 
 config: Config = None
-store: UserVectorStore = None
+clients: AsyncStyleMailClients = None
+store: AsyncUserVectorStore = None
+nudge_api: AsyncNudgeApiClient = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global config
-
-    redis_host = getenv("REDIS_HOST")
-    redis_port = getenv("REDIS_PORT")
-    redis_db = int(getenv("REDIS_DB")) if getenv("REDIS_DB") else None
-    redis_password = getenv("REDIS_PASSWORD")
-    openai_api_key = getenv("OPENAI_API_KEY")
-
-    auth_part = f":{redis_password}@" if redis_password else ""
-
-    config = Config.load(
-        openai_api_key=openai_api_key,
-        redis_host=redis_host,
-        redis_port=redis_port,
-        redis_db=redis_db,
-        redis_password=redis_password,
-    )
-    print("[server] Loaded config:", config)
-    global store
-    store = UserVectorStore(
-        host=config.redis_host,
-        port=config.redis_port,
-        db=config.redis_db,
-        password=config.redis_password,
-    )
+    global config, clients, store, nudge_api
+
+    config = Config.from_env()
+    logs.configure_logging(config.log_level, config.log_levels, config.prompt_log_sample_rate)
+    logger.info("Loaded config: %s", config)
+    clients = AsyncStyleMailClients(config)
+    store = clients.store
+    nudge_api = AsyncNudgeApiClient()
+    try:
+        metrics.configure(enabled=config.metrics_enabled, otel=config.otel_enabled)
+    except ValueError as e:
+        logger.warning("%s; exporting metrics only", e)
+        metrics.configure(enabled=config.metrics_enabled)
+    register_metrics()
     # Connect to SQLite and create table
-    create_employee_nudge_summary_table()
+    try:
+        clients.summaries.create_table()
+        logger.info("SQLite connection successful")
+    except Exception as e:
+        logger.error("SQLite connection failed: %s", e)
 
     try:
-        pong = store.redis.ping()
-        print(f"[server] Redis connection successful: {pong}")
+        pong = await clients.warm()
+        logger.info("Redis connection successful: %s", pong)
     except Exception as e:
-        print(f"[server] Redis connection failed: {e}")
+        logger.error("Redis connection failed: %s", e)
 
     yield
 
+    await nudge_api.aclose()
+    await clients.aclose()
+    logs.shutdown_logging()
+
 
 app = FastAPI(lifespan=lifespan)
 
 
+def register_metrics():
+    """Expose the counters the caches and scheduler already keep, read at scrape time."""
+    def summary_stats():
+        return clients.summary_cache.stats() if "summary_cache" in clients.__dict__ else {}
+
+    metrics.REGISTRY.collector(
+        "stylemail_cache_events_total",
+        "Cache lookups by cache and result.",
+        "counter",
+        ("cache", "result"),
+        metrics.stats_collector(
+            {"style_matrix": store.matrix_cache.stats, "embedding": store.embedding_cache.stats, "nudge_summary": summary_stats},
+            keys=("hits", "local_hits", "remote_hits", "stale_hits", "misses", "evictions", "refreshes"),
+        ),
+    )
+    metrics.REGISTRY.collector(
+        "stylemail_openai_scheduler_events_total",
+        "OpenAI requests, retries and throttling seen by the client-side scheduler.",
+        "counter",
+        ("client", "event"),
+        metrics.stats_collector({"openai": clients.scheduler.stats}, keys=("calls", "retries", "throttled", "rate_limited")),
+    )
+
+
+def http_error(e: Exception) -> HTTPException:
+    """400 for a failed request, or 429 with Retry-After when OpenAI kept rate limiting us."""
+    cause = e
+    while cause is not None:
+        if isinstance(cause, RateLimitedError):
+            headers = {"Retry-After": str(math.ceil(cause.retry_after))} if cause.retry_after else None
+            return HTTPException(status_code=429, detail=str(e), headers=headers)
+        cause = cause.__cause__ or cause.__context__
+    return HTTPException(status_code=400, detail=str(e))
+
+
 class SeedRequest(BaseModel):
     user_id: str
     samples: list[str]
@@ -95,12 +117,12 @@ class GenerateRequest(BaseModel):
 
 
 @app.post("/seed")
-def seed(req: SeedRequest):
+async def seed(req: SeedRequest):
     try:
-        seed_user_style(req.user_id, req.samples, store=store, openai_api_key=config.openai_api_key)
-        return {"status": "ok"}
+        stored = await aseed_user_style(req.user_id, req.samples, clients=clients)
+        return {"status": "ok", "stored": stored}
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise http_error(e)
 
 
 class NudgeSummaryRequest(BaseModel):
@@ -110,12 +132,56 @@ class NudgeSummaryRequest(BaseModel):
 
 
 @app.post("/generate")
-def generate(req: GenerateRequest):
+async def generate(req: GenerateRequest):
     try:
-        result = generate_email(req.user_id, req.subject, req.prompt, store=store, openai_api_key=config.openai_api_key)
+        result = await agenerate_email(req.user_id, req.subject, req.prompt, clients=clients)
         return result
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise http_error(e)
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event; data is JSON-encoded so newlines survive."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def sse_stream(events, first=None):
+    """Relay (event, data) tuples as SSE, ending with a done or error event."""
+    try:
+        if first is not None:
+            yield sse_event(*first)
+        async for event, data in events:
+            yield sse_event(event, data)
+        yield sse_event("done", "")
+    except Exception as e:
+        yield sse_event("error", str(e))
+
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateRequest):
+    try:
+        events = astream_email(req.user_id, req.subject, req.prompt, clients=clients)
+        # Pull the first event so retrieval errors (e.g. no style data) still surface as a 400
+        first = await anext(events)
+    except Exception as e:
+        raise http_error(e)
+    return StreamingResponse(sse_stream(events, first), media_type="text/event-stream")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = {"style_matrix": store.matrix_cache.stats()}
+    if "summary_cache" in clients.__dict__:
+        stats["nudge_summary"] = clients.summary_cache.stats()
+    stats["coalescing"] = {**clients.coalescing_stats(), "nudge_api": nudge_api.flights.stats()}
+    stats["openai_scheduler"] = clients.scheduler.stats()
+    return stats
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage timings, token usage and cache counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 class FetchNudgeDataRequest(BaseModel):
@@ -126,107 +192,133 @@ class FetchNudgeDataRequest(BaseModel):
     employee_id: str
 
 @app.post("/fetch-nudge-data")
-def fetch_nudge_data(req: FetchNudgeDataRequest):
+async def fetch_nudge_data(req: FetchNudgeDataRequest):
     try:
-        # Get authentication token
-        auth_token = get_auth_token(req.email, req.password)
-        
-        nudge_data = get_nudge_data(auth_token, req.employee_id)
+        # Fetch nudge data with a cached auth token
+        nudge_data = await nudge_api.fetch_nudges(req.email, req.password, req.employee_id)
         
         return nudge_data
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise http_error(e)
 
 @app.post("/nudge-email")
-def nudge_email(req: FetchNudgeDataRequest):
+async def nudge_email(req: FetchNudgeDataRequest):
     try:
-        # Get authentication token
-        auth_token = get_auth_token(req.email, req.password)
-        
-        # Fetch nudge data
-        nudge_data = get_nudge_data(auth_token, req.employee_id)
+        # Fetch nudge data with a cached auth token
+        nudge_data = await nudge_api.fetch_nudges(req.email, req.password, req.employee_id)
         
         # Prepare nudge data for email generation
-        nudges = [
-            {
-                "title": nudge.get("config", {}).get("message", "No Title"),
-                "instructions": nudge.get("config", {}).get("metaData", "No Instructions"),
-                "metrics": (
-                    f"Threshold: {nudge.get('config', {}).get('threshold', 'N/A')}, "
-                    f"Date Range: {nudge.get('config', {}).get('dateRange', {}).get('from', 'N/A')} to {nudge.get('config', {}).get('dateRange', {}).get('to', 'N/A')}, "
-                    f"Prior Date Range: {nudge.get('config', {}).get('priorDateRange', {}).get('from', 'N/A')} to {nudge.get('config', {}).get('priorDateRange', {}).get('to', 'N/A')}, "
-                    f"Metric: {nudge.get('config', {}).get('metric', 'N/A')}, "
-                    f"Unit: {nudge.get('config', {}).get('unit', 'N/A')}, "
-                    f"Operator: {nudge.get('config', {}).get('operator', 'N/A')}"
-                )
-            }
-            for nudge in nudge_data.get("data", [])
-        ]
+        nudges = prepare_nudges(nudge_data)
 
         # Generate nudge email
-        result = generate_nudge_email(req.user_id, req.prompt, nudges, store=store, openai_api_key=config.openai_api_key)
+        result = await agenerate_nudge_email(req.user_id, req.prompt, nudges, clients=clients)
         return result
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise http_error(e)
+
+@app.post("/nudge-email/stream")
+async def nudge_email_stream(req: FetchNudgeDataRequest):
+    try:
+        nudge_data = await nudge_api.fetch_nudges(req.email, req.password, req.employee_id)
+        nudges = prepare_nudges(nudge_data)
+        events = astream_nudge_email(req.user_id, req.prompt, nudges, clients=clients)
+        # As in generate_stream, pull the first event so OpenAI errors still surface as a 400/429
+        first = await anext(events, None)
+    except Exception as e:
+        raise http_error(e)
+    return StreamingResponse(sse_stream(events, first), media_type="text/event-stream")
+
+class NudgeEmailTeamRequest(BaseModel):
+    user_id: str
+    prompt: str
+    email: str
+    password: str
+    employee_ids: List[str]
+    fetch_concurrency: int = 8
+
+
+@app.post("/nudge-email/team")
+async def nudge_email_team(req: NudgeEmailTeamRequest):
+    """Nudge emails for a whole team, several employees per completion; fetch failures are reported per employee."""
+    employee_ids = list(dict.fromkeys(e for e in req.employee_ids if e.strip()))
+    if not employee_ids:
+        raise HTTPException(status_code=400, detail="employee_ids must be a non-empty list")
+    slots = asyncio.Semaphore(max(1, req.fetch_concurrency))
+
+    async def fetch(employee_id):
+        async with slots:
+            return prepare_nudges(await nudge_api.fetch_nudges(req.email, req.password, employee_id))
+
+    fetched = await asyncio.gather(*(fetch(e) for e in employee_ids), return_exceptions=True)
+    team, no_nudges, failures = {}, [], []
+    for employee_id, nudges in zip(employee_ids, fetched):
+        if isinstance(nudges, Exception):
+            failures.append({"employee_id": employee_id, "stage": "fetch", "error": str(nudges)})
+        elif nudges:
+            team[employee_id] = nudges
+        else:
+            no_nudges.append(employee_id)
+
+    emails = {}
+    if team:
+        try:
+            emails = await agenerate_team_nudge_emails(req.user_id, req.prompt, team, clients=clients)
+        except Exception as e:
+            raise http_error(e)
+    return {"emails": emails, "no_nudges": no_nudges, "failures": failures}
 
 @app.post("/nudge-summary")
-def nudge_summary(req: FetchNudgeDataRequest):
+async def nudge_summary(req: FetchNudgeDataRequest):
     try:
-        # Get authentication token
-        auth_token = get_auth_token(req.email, req.password)
+        # Fetch nudge data with a cached auth token
+        nudge_data = await nudge_api.fetch_nudges(req.email, req.password, req.employee_id)
         
-        # Fetch nudge data
-        nudge_data = get_nudge_data(auth_token, req.employee_id)
-        
-        print(f"[nudge_summary] Fetched nudge data: {len(nudge_data.get('data', []))}")
+        logger.debug("Fetched %d nudges for employee %s", len(nudge_data.get("data", [])), req.employee_id)
         # Prepare nudge data for summary generation
-        nudges = [
-            {
-                "title": nudge.get("config", {}).get("message", "No Title"),
-                "instructions": nudge.get("config", {}).get("metaData", "No Instructions"),
-                "metrics": (
-                    f"Threshold: {nudge.get('config', {}).get('threshold', 'N/A')}, "
-                    f"Date Range: {nudge.get('config', {}).get('dateRange', {}).get('from', 'N/A')} to {nudge.get('config', {}).get('dateRange', {}).get('to', 'N/A')}, "
-                    f"Prior Date Range: {nudge.get('config', {}).get('priorDateRange', {}).get('from', 'N/A')} to {nudge.get('config', {}).get('priorDateRange', {}).get('to', 'N/A')}, "
-                    f"Metric: {nudge.get('config', {}).get('metric', 'N/A')}, "
-                    f"Unit: {nudge.get('config', {}).get('unit', 'N/A')}, "
-                    f"Operator: {nudge.get('config', {}).get('operator', 'N/A')}"
-                )
-            }
-            for nudge in nudge_data.get("data", [])
-        ]
-
-        # Prepare nudge snippet for comparison
-        nudge_snippet = ", ".join([nudge.get("title", "No Title") for nudge in nudges])
-
-        # Check if summary already exists with matching nudge snippet
-        sql_connection = sqlite3.connect("laudio_client1.db")
-        cursor = sql_connection.cursor()
-        cursor.execute("SELECT summary FROM employee_nudge_summary WHERE employee_id = ?", (req.employee_id,))
-        existing_summary = cursor.fetchone()
-
-        cursor.execute("SELECT nudge_snippet FROM employee_nudge_summary WHERE employee_id = ?", (req.employee_id,))
-        existing_nudge_snippet = cursor.fetchone()
-        if existing_nudge_snippet and existing_nudge_snippet[0] == nudge_snippet:
-            return {"summary": existing_summary[0]}
-
-        if existing_summary:
-            return {"summary": existing_summary[0]}
-
-        # Generate nudge summary
-        result = generate_nudge_summary(req.employee_id, req.prompt, nudges, store=store, openai_api_key=config.openai_api_key)
-
-        # Insert new summary into the database
-        nudge_snippet = ", ".join([nudge.get("title", "No Title") for nudge in nudges])
-        cursor.execute(
-            "INSERT INTO employee_nudge_summary (employee_id, created_date, summary, nudge_snippet) VALUES (?, ?, ?, ?)",
-            (req.employee_id, datetime.now(), result["summary"], nudge_snippet)
-        )
-        sql_connection.commit()
-        cursor.close()
+        nudges = prepare_nudges(nudge_data)
 
-        return result
+        # Serve the stored summary when it is usable, refreshing it in the background if stale
+        return await clients.summary_cache.get_summary(req.employee_id, req.prompt, nudges)
     except Exception as e:
+        raise http_error(e)
+
+
+class NudgeSummaryBatchRequest(BaseModel):
+    prompt: str
+    email: str
+    password: str
+    employee_ids: List[str]
+    fetch_concurrency: Optional[int] = None
+    generate_concurrency: Optional[int] = None
+    requests_per_minute: Optional[float] = None
+
+
+@app.post("/nudge-summary/batch")
+async def nudge_summary_batch(req: NudgeSummaryBatchRequest):
+    """Refresh summaries for many employees; per-employee failures are returned in the report."""
+    def progress(done, total, employee_id, status):
+        logger.info("Summary batch %d/%d employee %s: %s", done, total, employee_id, status)
+
+    limits = {
+        name: value
+        for name, value in (
+            ("fetch_concurrency", req.fetch_concurrency),
+            ("generate_concurrency", req.generate_concurrency),
+            ("requests_per_minute", req.requests_per_minute),
+        )
+        if value is not None
+    }
+    batch = NudgeSummaryBatch(
+        lambda employee_id: nudge_api.fetch_nudges(req.email, req.password, employee_id),
+        clients.nudge_summary_generator,
+        repository=clients.summaries,
+        progress=progress,
+        **limits,
+    )
+    try:
+        report = await batch.run(req.employee_ids, req.prompt)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return report.as_dict()
 
     uvicorn.run("server:app", host="127.0.0.1", port=8000, reload=True)
@@ -1,32 +1,338 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from os import getenv
+from typing import Dict, Optional, Tuple
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
-def get_auth_token(email: str, password: str) -> str:
-    """Authenticate and retrieve an auth token."""
-    login_url = "https://api.dev.laudio.io/auth/login"
-    headers = {"x-app-id": "1"}
-    data = {"email": email, "password": password}
+from stylemail.metrics import span
+from stylemail.singleflight import AsyncSingleFlight, SingleFlight
 
-    response = requests.post(login_url, headers=headers, json=data)
-    try:
-        response.raise_for_status()  # Raise an error for bad responses
-    except requests.exceptions.HTTPError as e:
-        print(f"[get_auth_token] Error response: {response.text}")
-        raise e
+NUDGE_API_BASE_URL = getenv("NUDGE_API_BASE_URL", "https://api.dev.laudio.io")
+# Used when the login response carries neither an expiresIn field nor a JWT exp claim.
+DEFAULT_TOKEN_TTL = 15 * 60
 
-    print(f"[get_auth_token] Response Status Code: {response.status_code}")
-    return response.json().get("data", {}).get("accessToken")
+logger = logging.getLogger(__name__)
 
-def get_nudge_data(auth_token: str, employee_id: str) -> dict:
-    """Retrieve nudge data for a specific employee."""
-    nudge_url = f"https://api.dev.laudio.io/insight/v1/nudge/employee/{employee_id}?status=active"
-    headers = {"Authorization": f"Bearer {auth_token}", "x-app-id": "1"}
 
-    response = requests.get(nudge_url, headers=headers)
-    print(f"[get_nudge_data] Response Status Code: {response.status_code}")
+def _token_expiry(token: str, payload: dict) -> float:
+    """Work out when an access token expires, as a unix timestamp."""
+    expires_in = payload.get("data", {}).get("expiresIn")
+    if expires_in:
+        return time.time() + float(expires_in)
     try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        print(f"[get_nudge_data] Error response: {response.text}")
-        raise e
+        claims = token.split(".")[1]
+        claims += "=" * (-len(claims) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+    except Exception:
+        return time.time() + DEFAULT_TOKEN_TTL
+
+
+class TokenCache:
+    """
+    Access tokens keyed by a hash of the login credentials.
+
+    A token is treated as expired ``refresh_margin`` seconds early so callers log in
+    again before it actually lapses mid-request.
+    """
+
+    def __init__(self, refresh_margin: float = 60.0):
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(email: str, password: str) -> str:
+        return hashlib.sha256(f"{email}\0{password}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._tokens.get(key)
+        if entry and entry[1] - self.refresh_margin > time.time():
+            return entry[0]
+        return None
+
+    def put(self, key: str, token: str, expires_at: float) -> None:
+        with self._lock:
+            self._tokens[key] = (token, expires_at)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._tokens.pop(key, None)
+
+
+class NudgeApiClient:
+    """
+    Client for the Laudio auth and nudge endpoints.
+
+    Keeps one pooled requests.Session, caches access tokens per credentials until
+    shortly before they expire, applies explicit timeouts and retries timeouts,
+    connection errors and 5xx responses with exponential backoff. Concurrent
+    requests for the same employee's nudges share one upstream call.
+    """
+
+    def __init__(
+        self,
+        base_url: str = NUDGE_API_BASE_URL,
+        app_id: str = "1",
+        timeout: Tuple[float, float] = (5.0, 30.0),
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 20,
+        token_cache: Optional[TokenCache] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.app_id = app_id
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.token_cache = token_cache or TokenCache()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._login_lock = threading.Lock()
+        self.flights = SingleFlight()
+
+    def _retry_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        url = f"{self.base_url}{path}"
+        headers = {"x-app-id": self.app_id, **kwargs.pop("headers", {})}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except (requests.Timeout, requests.ConnectionError):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code < 500 or attempt == self.max_retries:
+                    return response
+            time.sleep(self._retry_delay(attempt))
+
+    def login(self, email: str, password: str) -> Tuple[str, float]:
+        """Perform a fresh login, returning the access token and its expiry timestamp."""
+        with span("nudge_api.login"):
+            response = self._request("POST", "/auth/login", json={"email": email, "password": password})
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            logger.warning("Nudge API login failed with status %s", response.status_code)
+            logger.debug("Nudge API login error response: %s", response.text)
+            raise e
+
+        logger.debug("Nudge API login status %s", response.status_code)
+        payload = response.json()
+        token = payload.get("data", {}).get("accessToken")
+        return token, _token_expiry(token, payload)
+
+    def get_auth_token(self, email: str, password: str) -> str:
+        """Return a cached access token for the credentials, logging in only when needed."""
+        key = self.token_cache.key(email, password)
+        token = self.token_cache.get(key)
+        if token:
+            return token
+        with self._login_lock:
+            token = self.token_cache.get(key)
+            if token:
+                return token
+            token, expires_at = self.login(email, password)
+            self.token_cache.put(key, token, expires_at)
+            return token
+
+    def _nudge_response(self, auth_token: str, employee_id: str) -> requests.Response:
+        with span("nudge_api.fetch_nudges"):
+            response = self._request(
+                "GET",
+                f"/insight/v1/nudge/employee/{employee_id}",
+                params={"status": "active"},
+                headers={"Authorization": f"Bearer {auth_token}"},
+            )
+        logger.debug("Nudge API fetch for employee %s: status %s", employee_id, response.status_code)
+        return response
+
+    def _json_or_raise(self, response: requests.Response) -> dict:
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            logger.warning("Nudge API request failed with status %s", response.status_code)
+            logger.debug("Nudge API error response: %s", response.text)
+            raise e
+        return response.json()
+
+    def get_nudge_data(self, auth_token: str, employee_id: str) -> dict:
+        """Retrieve nudge data for a specific employee."""
+        return self.flights.do(
+            ("nudges", auth_token, employee_id),
+            lambda: self._json_or_raise(self._nudge_response(auth_token, employee_id)),
+        )
+
+    def fetch_nudges(self, email: str, password: str, employee_id: str) -> dict:
+        """
+        Fetch an employee's active nudges with a cached token.
+
+        If the API rejects the cached token with a 401, the token is dropped and the
+        request is retried once after a fresh login.
+        """
+        key = ("fetch", self.token_cache.key(email, password), employee_id)
+        return self.flights.do(key, lambda: self._fetch_nudges(email, password, employee_id))
+
+    def _fetch_nudges(self, email: str, password: str, employee_id: str) -> dict:
+        token = self.get_auth_token(email, password)
+        response = self._nudge_response(token, employee_id)
+        if response.status_code == 401:
+            self.token_cache.invalidate(self.token_cache.key(email, password))
+            token = self.get_auth_token(email, password)
+            response = self._nudge_response(token, employee_id)
+        return self._json_or_raise(response)
 
-    return response.json()
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncNudgeApiClient:
+    """
+    asyncio counterpart of NudgeApiClient built on a pooled httpx.AsyncClient.
+
+    Concurrent requests for the same credentials share a single login, and for the
+    same employee a single nudge fetch.
+    """
+
+    def __init__(
+        self,
+        base_url: str = NUDGE_API_BASE_URL,
+        app_id: str = "1",
+        timeout: Tuple[float, float] = (5.0, 30.0),
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 20,
+        token_cache: Optional[TokenCache] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.app_id = app_id
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.token_cache = token_cache or TokenCache()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self._login_locks: Dict[str, asyncio.Lock] = {}
+        self.flights = AsyncSingleFlight()
+
+    def _retry_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        url = f"{self.base_url}{path}"
+        headers = {"x-app-id": self.app_id, **kwargs.pop("headers", {})}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.request(method, url, headers=headers, **kwargs)
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code < 500 or attempt == self.max_retries:
+                    return response
+            await asyncio.sleep(self._retry_delay(attempt))
+
+    async def login(self, email: str, password: str) -> Tuple[str, float]:
+        with span("nudge_api.login"):
+            response = await self._request("POST", "/auth/login", json={"email": email, "password": password})
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logger.warning("Nudge API login failed with status %s", response.status_code)
+            logger.debug("Nudge API login error response: %s", response.text)
+            raise e
+
+        logger.debug("Nudge API login status %s", response.status_code)
+        payload = response.json()
+        token = payload.get("data", {}).get("accessToken")
+        return token, _token_expiry(token, payload)
+
+    async def get_auth_token(self, email: str, password: str) -> str:
+        key = self.token_cache.key(email, password)
+        token = self.token_cache.get(key)
+        if token:
+            return token
+        lock = self._login_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            token = self.token_cache.get(key)
+            if token:
+                return token
+            token, expires_at = await self.login(email, password)
+            self.token_cache.put(key, token, expires_at)
+            return token
+
+    async def _nudge_response(self, auth_token: str, employee_id: str) -> httpx.Response:
+        with span("nudge_api.fetch_nudges"):
+            response = await self._request(
+                "GET",
+                f"/insight/v1/nudge/employee/{employee_id}",
+                params={"status": "active"},
+                headers={"Authorization": f"Bearer {auth_token}"},
+            )
+        logger.debug("Nudge API fetch for employee %s: status %s", employee_id, response.status_code)
+        return response
+
+    def _json_or_raise(self, response: httpx.Response) -> dict:
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logger.warning("Nudge API request failed with status %s", response.status_code)
+            logger.debug("Nudge API error response: %s", response.text)
+            raise e
+        return response.json()
+
+    async def get_nudge_data(self, auth_token: str, employee_id: str) -> dict:
+        return await self.flights.do(("nudges", auth_token, employee_id), lambda: self._get_nudge_data(auth_token, employee_id))
+
+    async def _get_nudge_data(self, auth_token: str, employee_id: str) -> dict:
+        return self._json_or_raise(await self._nudge_response(auth_token, employee_id))
+
+    async def fetch_nudges(self, email: str, password: str, employee_id: str) -> dict:
+        key = ("fetch", self.token_cache.key(email, password), employee_id)
+        return await self.flights.do(key, lambda: self._fetch_nudges(email, password, employee_id))
+
+    async def _fetch_nudges(self, email: str, password: str, employee_id: str) -> dict:
+        token = await self.get_auth_token(email, password)
+        response = await self._nudge_response(token, employee_id)
+        if response.status_code == 401:
+            self.token_cache.invalidate(self.token_cache.key(email, password))
+            token = await self.get_auth_token(email, password)
+            response = await self._nudge_response(token, employee_id)
+        return self._json_or_raise(response)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_default_client: Optional[NudgeApiClient] = None
+
+
+def _client() -> NudgeApiClient:
+    global _default_client
+    if _default_client is None:
+        _default_client = NudgeApiClient()
+    return _default_client
+
+
+def get_auth_token(email: str, password: str) -> str:
+    """Authenticate and retrieve an auth token."""
+    return _client().get_auth_token(email, password)
+
+
+def get_nudge_data(auth_token: str, employee_id: str) -> dict:
+    """Retrieve nudge data for a specific employee."""
+    return _client().get_nudge_data(auth_token, employee_id)
@@ -1 +1,28 @@
-from stylemail.api import seed_user_style, generate_email, generate_nudge_summary, generate_nudge_email
+"""
+Style-aware email generation.
+
+The public functions live in stylemail.api and are re-exported here on first
+access, so importing a light submodule (stylemail.config, stylemail.metrics, ...)
+does not pull in the clients, numpy and redis behind the API.
+"""
+_API = (
+    "seed_user_style", "import_mailbox", "generate_email", "generate_nudge_summary", "generate_nudge_email", "generate_team_nudge_emails",
+    "aseed_user_style", "agenerate_email", "agenerate_nudge_summary", "agenerate_nudge_email", "agenerate_team_nudge_emails",
+    "stream_email", "stream_nudge_email", "astream_email", "astream_nudge_email",
+)
+
+__all__ = list(_API)
+
+
+def __getattr__(name):
+    if name in _API:
+        from stylemail import api
+
+        value = getattr(api, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_API))
@@ -0,0 +1,122 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+from stylemail.similarity import normalize_rows, top_k_indices
+
+# Rows scored per block when assigning the corpus to lists, bounding peak memory
+ASSIGN_BLOCK = 8192
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (by dot product) for every row."""
+    out = np.empty(len(embeddings), dtype=np.intp)
+    for start in range(0, len(embeddings), ASSIGN_BLOCK):
+        block = embeddings[start:start + ASSIGN_BLOCK]
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def _spherical_kmeans(sample: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        lists, starts = np.unique(assign[order], return_index=True)
+        # Lists that lost every member keep their previous centroid
+        centroids[lists] = normalize_rows(np.add.reduceat(sample[order], starts, axis=0))
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over unit-norm rows.
+
+    Rows are clustered with spherical k-means into ``n_lists`` lists. A query
+    scores the centroids, then scores exactly only the rows of the ``n_probe``
+    closest lists, so a search touches roughly ``n_probe / n_lists`` of the
+    corpus. The index holds no vectors: the caller keeps its matrix with rows
+    grouped by list (see build), so every list is a contiguous slice and probing
+    it never copies.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, n_probe: int):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.n_probe = n_probe
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + self.offsets.nbytes
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 16,
+        iterations: int = 10,
+        train_size: Optional[int] = None,
+        seed: int = 0,
+    ) -> Tuple["IVFIndex", np.ndarray]:
+        """
+        Cluster ``embeddings`` into an index.
+
+        Args:
+            embeddings (np.ndarray): (n_samples, dim) unit-norm rows.
+            n_lists (int): Number of lists; defaults to sqrt(n_samples).
+            n_probe (int): Lists searched per query by default.
+            iterations (int): k-means iterations.
+            train_size (int): Rows k-means is trained on; defaults to 64 per list.
+            seed (int): Seed for the training sample and initial centroids.
+
+        Returns:
+            The index and the row permutation that groups rows by list. Searches
+            expect ``embeddings[order]``, and result indices refer to that order.
+        """
+        n = len(embeddings)
+        if n == 0:
+            raise ValueError("cannot build an index over an empty matrix")
+        n_lists = max(1, min(n, n_lists or int(math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        train_size = min(n, train_size or 64 * n_lists)
+        sample = embeddings if train_size == n else embeddings[rng.choice(n, train_size, replace=False)]
+        centroids = _spherical_kmeans(np.asarray(sample, dtype=np.float32), n_lists, iterations, rng)
+
+        assign = _assign(embeddings, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.intp)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=offsets[1:])
+        return cls(centroids, offsets, n_probe), order
+
+    def search(self, embeddings: np.ndarray, queries, k: int, n_probe: Optional[int] = None) -> np.ndarray:
+        """
+        Return the row indices of the (approximately) k best rows for each query, best first.
+
+        Probes at least ``n_probe`` lists and more when those hold fewer than k rows,
+        so every query gets min(k, n_samples) results.
+
+        Args:
+            embeddings (np.ndarray): The indexed rows, grouped by list as returned by build.
+            queries: (n_queries, dim) query embeddings.
+            k (int): Results per query.
+            n_probe (int): Lists to search; defaults to the index's n_probe.
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        k = max(0, min(k, int(self.offsets[-1])))
+        n_probe = min(self.n_lists, n_probe or self.n_probe)
+        sizes = np.diff(self.offsets)
+        ranked = top_k_indices(queries @ self.centroids.T, self.n_lists)
+        results = np.empty((len(queries), k), dtype=np.intp)
+        for q, lists in enumerate(ranked):
+            probes = max(n_probe, int(np.searchsorted(np.cumsum(sizes[lists]), k)) + 1)
+            spans = [(self.offsets[l], self.offsets[l + 1]) for l in lists[:probes]]
+            scores = np.concatenate([embeddings[a:b] @ queries[q] for a, b in spans])
+            rows = np.concatenate([np.arange(a, b) for a, b in spans])
+            results[q] = rows[top_k_indices(scores, k)]
+        return results
@@ -1,30 +1,40 @@
 import logging
-from typing import List, Dict, Any
+import os
+from collections.abc import Mapping
+from typing import List, Dict, Any, Optional, Iterable, Iterator, AsyncIterable, AsyncIterator, Union
+from stylemail.clients import StyleMailClients, AsyncStyleMailClients
 from stylemail.config import Config
-from stylemail.vectorstore import UserVectorStore
-from stylemail.seeder import StyleSeeder
-from stylemail.generator import EmailGenerator, NudgeSummaryGenerator, NudgeEmailGenerator
+from stylemail.vectorstore import UserVectorStore, AsyncUserVectorStore
+from stylemail.seeder import StyleSeeder, AsyncStyleSeeder
+from stylemail.mail_import import ImportProgressCallback, ImportReport, MailboxImporter
+from stylemail.generator import (
+    EmailGenerator,
+    NudgeSummaryGenerator,
+    NudgeEmailGenerator,
+    AsyncEmailGenerator,
+    AsyncNudgeSummaryGenerator,
+    AsyncNudgeEmailGenerator,
+)
 
+logger = logging.getLogger(__name__)
 
-def seed_user_style(user_id: str, samples: List[str], store: UserVectorStore, openai_api_key: str) -> None:
-    """
-    Store a user's writing style by embedding sample texts and saving them to Redis.
-    """
+
+def _validate_seed(user_id: str, samples: Iterable[str], streaming: bool = False) -> Iterable[str]:
+    # Returns the samples to seed: non-streaming input is read into a list first, so
+    # a generator is not used up by the check before the seeder sees it
     if not user_id or not isinstance(user_id, str):
         raise ValueError("user_id must be a non-empty string")
+    if streaming:
+        # Iterators are checked sample by sample as the seeder consumes them
+        return samples
+    if isinstance(samples, Iterable) and not isinstance(samples, str):
+        samples = list(samples)
     if not samples or not all(isinstance(s, str) for s in samples):
         raise ValueError("samples must be a list of non-empty strings")
+    return samples
 
-    seeder = StyleSeeder(openai_api_key, store)
-    logging.info(f"Seeding style for user '{user_id}' with {len(samples)} samples.")
-    seeder.seed_user_style(user_id, samples)
 
-
-def generate_email(user_id: str, subject: str, prompt: str, store: UserVectorStore, openai_api_key: str) -> Dict[str, str]:
-    """
-    Generate a personalized email using the user's writing style and a given prompt.
-    Returns a dictionary with 'subject' and 'body'.
-    """
+def _validate_generate(user_id: str, subject: str, prompt: str) -> None:
     if not user_id or not isinstance(user_id, str):
         raise ValueError("user_id must be a non-empty string")
     if not subject or not isinstance(subject, str):
@@ -32,34 +42,212 @@ def generate_email(user_id: str, subject: str, prompt: str, store: UserVectorSto
     if not prompt or not isinstance(prompt, str):
         raise ValueError("prompt must be a non-empty string")
 
-    generator = EmailGenerator(openai_api_key, store)
-    logging.info(f"[generate_email] user='{user_id}' subject='{subject}' prompt='{prompt}'")
-    return generator.generate_email(user_id, subject, prompt)
-def generate_nudge_email(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: UserVectorStore, openai_api_key: str) -> Dict[str, str]:
-    """
-    Generate an email for a list of nudges based on a given prompt.
-    """
+
+def _validate_nudges(user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> None:
     if not user_id or not isinstance(user_id, str):
         raise ValueError("user_id must be a non-empty string")
     if not prompt or not isinstance(prompt, str):
         raise ValueError("prompt must be a non-empty string")
-    if not nudges or not all(isinstance(n, dict) for n in nudges):
+    if not nudges or not all(isinstance(n, Mapping) for n in nudges):
         raise ValueError("nudges must be a list of dictionaries with 'title', 'instructions', and 'metrics' keys")
 
-    generator = NudgeEmailGenerator(openai_api_key, store)
-    logging.info(f"[generate_nudge_email] user='{user_id}' prompt='{prompt}' nudges='{nudges}'")
-    return generator.generate_email(user_id, prompt, nudges)
-def generate_nudge_summary(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: UserVectorStore, openai_api_key: str) -> Dict[str, str]:
+
+def _validate_team(user_id: str, prompt: str, team: Mapping) -> None:
+    if not team or not isinstance(team, Mapping):
+        raise ValueError("team must be a non-empty mapping of employee id to nudges")
+    for employee_id, nudges in team.items():
+        if not employee_id or not isinstance(employee_id, str):
+            raise ValueError("team must be keyed by non-empty employee id strings")
+        _validate_nudges(user_id, prompt, nudges)
+
+
+def seed_user_style(user_id: str, samples: Iterable[str], store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None, streaming: bool = False) -> int:
     """
-    Generate a summary for a list of nudges based on a given prompt.
+    Store a user's writing style by embedding sample texts and saving them to Redis.
+    Returns the number of new samples stored.
+
+    With ``streaming=True`` ``samples`` may be any iterator (for example a mailbox
+    export) and is consumed lazily in chunks instead of being loaded into memory.
+
+    Pass ``clients`` to reuse long-lived pooled clients; otherwise a seeder is built
+    from ``store`` and ``openai_api_key`` for this call. The same applies to every
+    function in this module.
+    """
+    samples = _validate_seed(user_id, samples, streaming)
+
+    seeder = clients.seeder if clients else StyleSeeder(openai_api_key, store)
+    count = "a stream of" if streaming else len(samples)
+    logger.info("Seeding style for user %s with %s samples", user_id, count)
+    return seeder.seed_user_style(user_id, samples, streaming=streaming)
+
+
+def import_mailbox(user_id: str, paths: Iterable[str], store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None, sender: Optional[Iterable[str]] = None, limit: Optional[int] = None, progress: Optional[ImportProgressCallback] = None) -> ImportReport:
+    """
+    Seed a user's style from mbox files, maildirs or .eml files on disk.
+
+    Messages are streamed into the bulk seeding path with quoted replies and
+    signatures removed. Pass ``sender`` (the user's own addresses) to skip mail
+    written by others and ``limit`` to seed a random sample instead of everything.
     """
     if not user_id or not isinstance(user_id, str):
         raise ValueError("user_id must be a non-empty string")
-    if not prompt or not isinstance(prompt, str):
-        raise ValueError("prompt must be a non-empty string")
-    if not nudges or not all(isinstance(n, dict) for n in nudges):
-        raise ValueError("nudges must be a list of dictionaries with 'title', 'instructions', and 'metrics' keys")
+    if isinstance(paths, str):
+        paths = [paths]
+    paths = list(paths)
+    if not paths:
+        raise ValueError("paths must name at least one mailbox")
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise ValueError(f"Mailbox not found: {', '.join(missing)}")
+
+    seeder = clients.seeder if clients else StyleSeeder(openai_api_key, store)
+    logger.info("Importing mail for user %s from %d path(s)", user_id, len(paths))
+    return MailboxImporter(seeder, sender=sender, limit=limit, progress=progress).run(user_id, paths)
+
+
+def generate_email(user_id: str, subject: str, prompt: str, store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None) -> Dict[str, str]:
+    """
+    Generate a personalized email using the user's writing style and a given prompt.
+    Returns a dictionary with 'subject' and 'body'.
+    """
+    _validate_generate(user_id, subject, prompt)
+
+    generator = clients.email_generator if clients else EmailGenerator(openai_api_key, store)
+    logger.debug("generate_email user=%s prompt_chars=%d", user_id, len(prompt))
+    return generator.generate_email(user_id, subject, prompt)
+
+
+def stream_email(user_id: str, subject: str, prompt: str, store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None) -> Iterator[tuple]:
+    """
+    Streaming variant of generate_email.
+    Returns an iterator of ('subject', text) and ('token', text) events; inputs are validated immediately.
+    """
+    _validate_generate(user_id, subject, prompt)
+
+    generator = clients.email_generator if clients else EmailGenerator(openai_api_key, store)
+    logger.debug("stream_email user=%s prompt_chars=%d", user_id, len(prompt))
+    return generator.stream_email(user_id, subject, prompt)
+
+
+def stream_nudge_email(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None) -> Iterator[tuple]:
+    """
+    Streaming variant of generate_nudge_email. The subject event is emitted as soon as the subject line is complete.
+    """
+    _validate_nudges(user_id, prompt, nudges)
+
+    generator = clients.nudge_email_generator if clients else NudgeEmailGenerator(openai_api_key, store)
+    logger.debug("stream_nudge_email user=%s nudges=%d", user_id, len(nudges))
+    return generator.stream_email(user_id, prompt, nudges)
+
 
-    generator = NudgeSummaryGenerator(openai_api_key, store)
-    logging.info(f"[generate_nudge_summary] user='{user_id}' prompt='{prompt}' nudges='{nudges}'")
+def generate_nudge_email(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None) -> Dict[str, str]:
+    """
+    Generate an email for a list of nudges based on a given prompt.
+    """
+    _validate_nudges(user_id, prompt, nudges)
+
+    generator = clients.nudge_email_generator if clients else NudgeEmailGenerator(openai_api_key, store)
+    logger.debug("generate_nudge_email user=%s nudges=%d", user_id, len(nudges))
+    return generator.generate_email(user_id, prompt, nudges)
+
+
+def generate_team_nudge_emails(user_id: str, prompt: str, team: Mapping[str, List[Dict[str, str]]], store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Generate a nudge email for every employee in ``team`` (employee id -> nudges),
+    packing several employees into each completion.
+    Returns a dictionary of 'subject' and 'body' by employee id.
+    """
+    _validate_team(user_id, prompt, team)
+
+    generator = clients.nudge_email_generator if clients else NudgeEmailGenerator(openai_api_key, store)
+    logger.debug("generate_team_nudge_emails user=%s employees=%d", user_id, len(team))
+    return generator.generate_team_emails(user_id, prompt, team)
+
+
+def generate_nudge_summary(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: Optional[UserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[StyleMailClients] = None) -> Dict[str, str]:
+    """
+    Generate a summary for a list of nudges based on a given prompt.
+    """
+    _validate_nudges(user_id, prompt, nudges)
+
+    generator = clients.nudge_summary_generator if clients else NudgeSummaryGenerator(openai_api_key, store)
+    logger.debug("generate_nudge_summary user=%s nudges=%d", user_id, len(nudges))
     return generator.generate_summary(user_id, prompt, nudges)
+
+
+async def aseed_user_style(user_id: str, samples: Union[Iterable[str], AsyncIterable[str]], store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None, streaming: bool = False) -> int:
+    """
+    Async variant of seed_user_style; with ``streaming=True`` ``samples`` may also be an async iterable.
+    """
+    samples = _validate_seed(user_id, samples, streaming)
+
+    seeder = clients.seeder if clients else AsyncStyleSeeder(openai_api_key, store)
+    count = "a stream of" if streaming else len(samples)
+    logger.info("Seeding style for user %s with %s samples", user_id, count)
+    return await seeder.seed_user_style(user_id, samples, streaming=streaming)
+
+
+async def agenerate_email(user_id: str, subject: str, prompt: str, store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None) -> Dict[str, str]:
+    """
+    Async variant of generate_email.
+    """
+    _validate_generate(user_id, subject, prompt)
+
+    generator = clients.email_generator if clients else AsyncEmailGenerator(openai_api_key, store)
+    logger.debug("generate_email user=%s prompt_chars=%d", user_id, len(prompt))
+    return await generator.generate_email(user_id, subject, prompt)
+
+
+async def agenerate_nudge_email(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None) -> Dict[str, str]:
+    """
+    Async variant of generate_nudge_email.
+    """
+    _validate_nudges(user_id, prompt, nudges)
+
+    generator = clients.nudge_email_generator if clients else AsyncNudgeEmailGenerator(openai_api_key, store)
+    logger.debug("generate_nudge_email user=%s nudges=%d", user_id, len(nudges))
+    return await generator.generate_email(user_id, prompt, nudges)
+
+
+async def agenerate_team_nudge_emails(user_id: str, prompt: str, team: Mapping[str, List[Dict[str, str]]], store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Async variant of generate_team_nudge_emails.
+    """
+    _validate_team(user_id, prompt, team)
+
+    generator = clients.nudge_email_generator if clients else AsyncNudgeEmailGenerator(openai_api_key, store)
+    logger.debug("generate_team_nudge_emails user=%s employees=%d", user_id, len(team))
+    return await generator.generate_team_emails(user_id, prompt, team)
+
+
+async def agenerate_nudge_summary(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None) -> Dict[str, str]:
+    """
+    Async variant of generate_nudge_summary.
+    """
+    _validate_nudges(user_id, prompt, nudges)
+
+    generator = clients.nudge_summary_generator if clients else AsyncNudgeSummaryGenerator(openai_api_key, store)
+    logger.debug("generate_nudge_summary user=%s nudges=%d", user_id, len(nudges))
+    return await generator.generate_summary(user_id, prompt, nudges)
+
+
+def astream_email(user_id: str, subject: str, prompt: str, store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None) -> AsyncIterator[tuple]:
+    """
+    Async variant of stream_email. Returns an async iterator; inputs are validated immediately.
+    """
+    _validate_generate(user_id, subject, prompt)
+
+    generator = clients.email_generator if clients else AsyncEmailGenerator(openai_api_key, store)
+    logger.debug("stream_email user=%s prompt_chars=%d", user_id, len(prompt))
+    return generator.stream_email(user_id, subject, prompt)
+
+
+def astream_nudge_email(user_id: str, prompt: str, nudges: List[Dict[str, str]], store: Optional[AsyncUserVectorStore] = None, openai_api_key: Optional[str] = None, clients: Optional[AsyncStyleMailClients] = None) -> AsyncIterator[tuple]:
+    """
+    Async variant of stream_nudge_email.
+    """
+    _validate_nudges(user_id, prompt, nudges)
+
+    generator = clients.nudge_email_generator if clients else AsyncNudgeEmailGenerator(openai_api_key, store)
+    logger.debug("stream_nudge_email user=%s nudges=%d", user_id, len(nudges))
+    return generator.stream_email(user_id, prompt, nudges)
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from stylemail.nudges import nudge_snippet, prepare_nudges
+from stylemail.scheduler import BATCH, request_priority
+from stylemail.summary_cache import summary_cache_key
+from stylemail.summary_store import SummaryRepository
+
+logger = logging.getLogger(__name__)
+
+# (done, total, employee_id, status) -> None
+ProgressCallback = Callable[[int, int, str, str], None]
+
+
+class RateLimiter:
+    """
+    Spaces calls evenly so no more than ``per_minute`` start in any minute.
+
+    Waiters reserve their slot under a lock and sleep outside it, so a burst of
+    callers is released one interval apart rather than all at once.
+    """
+
+    def __init__(self, per_minute: float):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+@dataclass
+class BatchReport:
+    """Outcome of a summary batch; every requested employee lands in exactly one list."""
+    total: int
+    generated: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    no_nudges: List[str] = field(default_factory=list)
+    failures: List[Dict[str, str]] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "generated": self.generated,
+            "unchanged": self.unchanged,
+            "no_nudges": self.no_nudges,
+            "failures": self.failures,
+        }
+
+
+class NudgeSummaryBatch:
+    """
+    Refresh nudge summaries for many employees in one run.
+
+    Nudge data is fetched with bounded concurrency, employees whose stored summary
+    was built from the same nudges and prompt (by content hash) are skipped, the rest are summarised in parallel under
+    a requests-per-minute limit, and results are written in bulk transactions.
+    A failure for one employee is recorded in the report and never stops the batch.
+    """
+
+    def __init__(
+        self,
+        fetch_nudges: Callable[[str], Awaitable[dict]],
+        generator,
+        repository: Optional[SummaryRepository] = None,
+        fetch_concurrency: int = 8,
+        generate_concurrency: int = 4,
+        requests_per_minute: float = 60,
+        write_batch_size: int = 50,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        """
+        Args:
+            fetch_nudges: Coroutine function returning the raw nudge API payload for an employee id.
+            generator: An AsyncNudgeSummaryGenerator (or anything with the same generate_summary).
+            repository (SummaryRepository): Where summaries are read and written; defaults to the standard database.
+            fetch_concurrency (int): Maximum nudge API requests in flight.
+            generate_concurrency (int): Maximum chat completions in flight.
+            requests_per_minute (float): Cap on chat completions started per minute.
+            write_batch_size (int): Number of summaries written per transaction.
+            progress: Optional callback invoked as each employee finishes.
+        """
+        self.fetch_nudges = fetch_nudges
+        self.generator = generator
+        self.repository = repository or SummaryRepository()
+        self.fetch_concurrency = fetch_concurrency
+        self.generate_concurrency = generate_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.write_batch_size = write_batch_size
+        self.progress = progress
+
+    async def run(self, employee_ids: Sequence[str], prompt: str) -> BatchReport:
+        """
+        Summarise every employee in ``employee_ids`` with ``prompt``.
+
+        Raises:
+            ValueError: If the prompt or employee list is empty.
+        """
+        if not prompt or not isinstance(prompt, str):
+            raise ValueError("prompt must be a non-empty string")
+        employee_ids = list(dict.fromkeys(str(e) for e in employee_ids if str(e).strip()))
+        if not employee_ids:
+            raise ValueError("employee_ids must be a non-empty list")
+
+        report = BatchReport(total=len(employee_ids))
+        self._report = report
+        self._done = 0
+        self._pending: List[Tuple[str, str, str, str]] = []
+        self._fetch_slots = asyncio.Semaphore(self.fetch_concurrency)
+        self._generate_slots = asyncio.Semaphore(self.generate_concurrency)
+        self._limiter = RateLimiter(self.requests_per_minute)
+        self._write_lock = asyncio.Lock()
+
+        self._stored = await asyncio.to_thread(self.repository.get_content_hashes, employee_ids)
+        # Interactive requests sharing the OpenAI scheduler are served ahead of the batch
+        with request_priority(BATCH):
+            await asyncio.gather(*(self._process(employee_id, prompt) for employee_id in employee_ids))
+        await self._flush()
+        return report
+
+    async def _process(self, employee_id: str, prompt: str) -> None:
+        stage = "fetch"
+        try:
+            async with self._fetch_slots:
+                nudge_data = await self.fetch_nudges(employee_id)
+            nudges = prepare_nudges(nudge_data)
+            if not nudges:
+                return self._finish(employee_id, "no_nudges")
+            key = summary_cache_key(prompt, nudges)
+            if self._stored.get(employee_id) == key:
+                return self._finish(employee_id, "unchanged")
+
+            stage = "generate"
+            async with self._generate_slots:
+                await self._limiter.wait()
+                result = await self.generator.generate_summary(employee_id, prompt, nudges)
+        except Exception as e:
+            return self._fail(employee_id, stage, e)
+
+        # Reported as generated once its row is committed, not when the completion returns
+        self._pending.append((employee_id, result["summary"], nudge_snippet(nudges), key))
+        if len(self._pending) >= self.write_batch_size:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        async with self._write_lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                await asyncio.to_thread(self.repository.upsert_many, rows)
+            except Exception as e:
+                for employee_id, *_ in rows:
+                    self._fail(employee_id, "write", e)
+                return
+            for employee_id, *_ in rows:
+                self._finish(employee_id, "generated")
+
+    def _finish(self, employee_id: str, status: str) -> None:
+        getattr(self._report, status).append(employee_id)
+        self._done += 1
+        if self.progress:
+            self.progress(self._done, self._report.total, employee_id, status)
+
+    def _fail(self, employee_id: str, stage: str, error: Exception) -> None:
+        logger.warning("Summary batch: %s failed for employee %s: %s", stage, employee_id, error)
+        self._report.failures.append({"employee_id": employee_id, "stage": stage, "error": str(error)})
+        self._done += 1
+        if self.progress:
+            self.progress(self._done, self._report.total, employee_id, "failed")
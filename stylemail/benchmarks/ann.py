@@ -0,0 +1,72 @@
+"""
+Recall and latency of the IVF index against exhaustive search.
+
+    python -m stylemail.benchmarks.ann [--samples 50000] [--dim 1536] [--queries 200] [--k 3]
+
+Synthetic embeddings are drawn around random topic centres so the corpus has the
+cluster structure real style samples have; uniformly random vectors would make any
+partitioning index look worse than it is in practice.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from stylemail.ann import IVFIndex
+from stylemail.similarity import cosine_scores, normalize_rows, top_k_indices
+
+
+def synthetic_corpus(samples: int, dim: int, topics: int, spread: float = 2.0, seed: int = 0) -> np.ndarray:
+    """Unit rows scattered around ``topics`` random centres; larger ``spread`` means looser clusters."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim), dtype=np.float32)
+    rows = centres[rng.integers(topics, size=samples)] + spread * rng.standard_normal((samples, dim), dtype=np.float32)
+    return normalize_rows(rows)
+
+
+def run(samples: int = 50000, dim: int = 1536, queries: int = 200, k: int = 3, probes=(4, 8, 16, 32), seed: int = 0) -> dict:
+    corpus = synthetic_corpus(samples + queries, dim, topics=max(1, samples // 50), seed=seed)
+    matrix, query_rows = corpus[:samples], corpus[samples:]
+
+    start = time.perf_counter()
+    index, order = IVFIndex.build(matrix, seed=seed)
+    matrix = matrix[order]
+    build_s = time.perf_counter() - start
+
+    # One prompt per request in production, so both sides are timed per query
+    start = time.perf_counter()
+    exact = [top_k_indices(cosine_scores(matrix, q), k) for q in query_rows]
+    exact_ms = (time.perf_counter() - start) * 1000 / queries
+
+    report = {
+        "samples": samples,
+        "dim": dim,
+        "k": k,
+        "n_lists": index.n_lists,
+        "build_seconds": round(build_s, 3),
+        "exact_ms_per_query": round(exact_ms, 3),
+        "ivf": [],
+    }
+    for n_probe in probes:
+        start = time.perf_counter()
+        found = [index.search(matrix, q[None, :], k, n_probe=n_probe)[0] for q in query_rows]
+        ivf_ms = (time.perf_counter() - start) * 1000 / queries
+        recall = np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)])
+        report["ivf"].append({"n_probe": n_probe, "recall": round(float(recall), 4), "ms_per_query": round(ivf_ms, 3)})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.samples, args.dim, args.queries, args.k, seed=args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
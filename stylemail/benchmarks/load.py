@@ -0,0 +1,329 @@
+"""
+Latency and throughput of the HTTP service against local stand-ins.
+
+    python -m stylemail.benchmarks.load [--endpoints seed,generate,nudge-email,nudge-summary]
+        [--concurrency 1,8,32] [--requests 100] [--corpus 100,2000]
+        [--chat-latency 0.3] [--embedding-latency 0.05] [--token-delay 0.005]
+        [--redis HOST:PORT] [--output report.json] [--baseline previous.json]
+
+server.py runs unmodified under uvicorn in a subprocess, pointed at the OpenAI and
+nudge API stand-ins and at an in-process Redis (or a real one with ``--redis``),
+see upstream. Every endpoint is driven at each concurrency level and ``/generate``
+additionally at each style corpus size. Requests are made distinct (prompts,
+employee ids, samples) so caches and request coalescing do not hide the work a
+real workload would do. Results report p50/p99/mean latency and requests per
+second; with ``--baseline`` each row also carries its ratio to the matching row
+of an earlier report, so a change can be checked against the last run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+import numpy as np
+
+from stylemail.benchmarks.upstream import RedisStandIn, ThreadedServer, UpstreamProfile, free_port, upstream_app
+
+ENDPOINTS = ("seed", "generate", "nudge-email", "nudge-summary")
+# Endpoints whose work depends on how many style samples the user has
+CORPUS_ENDPOINTS = ("generate", "generate/stream")
+STREAM_ENDPOINTS = ("generate/stream", "nudge-email/stream")
+REPO_ROOT = Path(__file__).resolve().parents[2]
+# Samples per /seed request, both for corpus setup and for the /seed benchmark
+SEED_BATCH = 20
+SETUP_BATCH = 500
+
+
+def summarize(latencies: Sequence[float], wall: float, errors: int) -> dict:
+    """Latency percentiles (ms) and throughput for one run."""
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+        "mean_ms": round(float(ms.mean()), 2) if len(ms) else None,
+        "rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+    }
+
+
+def sample_text(i: int) -> str:
+    topics = ("the quarterly plan", "next week's rota", "the onboarding checklist", "our budget review", "the patient survey")
+    return (
+        f"Hi team, quick note {i} on {topics[i % len(topics)]}. "
+        f"I'd like us to close out the open items by Thursday and flag anything blocked. "
+        f"Thanks for pulling this together so quickly. Best, Sam"
+    )
+
+
+class ServerProcess:
+    """server.py under uvicorn in a subprocess, configured through its environment."""
+
+    def __init__(self, env: Dict[str, str], log_path: Optional[str] = None, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.env = {**os.environ, **env}
+        self.log_path = log_path
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0) -> "ServerProcess":
+        log = open(self.log_path, "ab") if self.log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=REPO_ROOT,
+            env=self.env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server.py exited with status {self.process.returncode}")
+            try:
+                httpx.get(f"{self.url}/cache/stats", timeout=1.0)
+                return self
+            except httpx.TransportError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError(f"server.py did not start within {timeout} seconds")
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+async def drive(client: httpx.AsyncClient, path: str, body: Callable[[int], dict], requests: int, concurrency: int) -> dict:
+    """Send ``requests`` POSTs to ``path`` from ``concurrency`` workers and summarise them."""
+    latencies: List[float] = []
+    first_bytes: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+    stream = path.lstrip("/") in STREAM_ENDPOINTS
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                if stream:
+                    first_byte = None
+                    async with client.stream("POST", path, json=body(i)) as response:
+                        async for _ in response.aiter_bytes():
+                            if first_byte is None:
+                                first_byte = time.perf_counter() - start
+                        ok = response.status_code == 200
+                    if ok and first_byte is not None:
+                        first_bytes.append(first_byte)
+                else:
+                    response = await client.post(path, json=body(i))
+                    ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - start, errors)
+    if stream and first_bytes:
+        result["first_byte_p50_ms"] = round(float(np.percentile(np.asarray(first_bytes) * 1000, 50)), 2)
+    return result
+
+
+async def seed_corpus(client: httpx.AsyncClient, user_id: str, size: int) -> None:
+    for start in range(0, size, SETUP_BATCH):
+        samples = [sample_text(i) for i in range(start, min(size, start + SETUP_BATCH))]
+        response = await client.post("/seed", json={"user_id": user_id, "samples": samples})
+        response.raise_for_status()
+
+
+def _bodies(run_id: str, endpoint: str, user_id: str, tag: str) -> Callable[[int], dict]:
+    nudge_request = {"prompt": "Write a short check-in email", "email": "bench@example.com", "password": "bench"}
+    if endpoint == "seed":
+        return lambda i: {"user_id": f"{run_id}-seed", "samples": [sample_text(i * SEED_BATCH + j) + f" ({tag})" for j in range(SEED_BATCH)]}
+    if endpoint.startswith("generate"):
+        return lambda i: {"user_id": user_id, "subject": f"Update {i}", "prompt": f"Follow up on proposal {tag}-{i}"}
+    return lambda i: {**nudge_request, "user_id": user_id, "employee_id": f"{run_id}-{tag}-{i}"}
+
+
+async def _run(
+    server_url: str,
+    endpoints: Sequence[str],
+    concurrency: Sequence[int],
+    requests: int,
+    corpus: Sequence[int],
+    progress: Callable[[dict], None],
+) -> List[dict]:
+    run_id = uuid.uuid4().hex[:8]
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency) * 2, max_keepalive_connections=max(concurrency) * 2)
+    async with httpx.AsyncClient(base_url=server_url, timeout=300.0, limits=limits) as client:
+        for size in corpus:
+            await seed_corpus(client, f"{run_id}-corpus-{size}", size)
+        for endpoint in endpoints:
+            sizes = corpus if endpoint in CORPUS_ENDPOINTS else [None]
+            for size in sizes:
+                user_id = f"{run_id}-corpus-{size if size is not None else corpus[0]}"
+                for level in concurrency:
+                    # Tags end up in employee ids, which the nudge API takes as a path segment
+                    tag = f"{endpoint.replace('/', '_')}-{size}-{level}"
+                    row = {"endpoint": f"/{endpoint}", "concurrency": level, "corpus": size}
+                    row.update(await drive(client, f"/{endpoint}", _bodies(run_id, endpoint, user_id, tag), requests, level))
+                    progress(row)
+                    results.append(row)
+    return results
+
+
+def _row_key(row: dict) -> tuple:
+    return row["endpoint"], row["concurrency"], row["corpus"]
+
+
+def compare(results: List[dict], baseline: dict) -> List[dict]:
+    """Annotate rows with their p50/p99/rps ratio to the matching rows of a previous report."""
+    previous = {_row_key(row): row for row in baseline.get("results", [])}
+    for row in results:
+        before = previous.get(_row_key(row))
+        if not before:
+            continue
+        for metric in ("p50_ms", "p99_ms", "rps"):
+            if row.get(metric) and before.get(metric):
+                row[f"{metric}_vs_baseline"] = round(row[metric] / before[metric], 3)
+    return results
+
+
+def run(
+    endpoints: Sequence[str] = ENDPOINTS,
+    concurrency: Sequence[int] = (1, 8, 32),
+    requests: int = 100,
+    corpus: Sequence[int] = (100, 2000),
+    profile: Optional[UpstreamProfile] = None,
+    redis: Optional[str] = None,
+    server_log: Optional[str] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Start the stand-ins and server.py, benchmark ``endpoints`` and return the report.
+
+    Args:
+        endpoints: Endpoint paths without the leading slash (see ENDPOINTS and STREAM_ENDPOINTS).
+        concurrency: In-flight request levels to measure.
+        requests (int): Requests per endpoint, concurrency level and corpus size.
+        corpus: Style sample counts seeded before the corpus-dependent endpoints run.
+        profile (UpstreamProfile): Simulated OpenAI and nudge API latencies.
+        redis (str): ``host:port`` of a real Redis to use instead of the in-process one.
+        server_log (str): File that receives server.py's output (discarded by default).
+        progress: Called with each result row as it completes.
+    """
+    profile = profile or UpstreamProfile()
+    upstream = ThreadedServer(upstream_app(profile)).start()
+    redis_standin = None
+    if redis:
+        redis_host, redis_port = redis.rsplit(":", 1)
+    else:
+        redis_standin = RedisStandIn().start()
+        redis_host, redis_port = redis_standin.address
+    db_dir = tempfile.TemporaryDirectory()
+    env = {
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"{upstream.url}/v1",
+        "NUDGE_API_BASE_URL": upstream.url,
+        "REDIS_HOST": str(redis_host),
+        "REDIS_PORT": str(redis_port),
+        "SUMMARY_DB_PATH": os.path.join(db_dir.name, "summaries.db"),
+        # The stand-in has no rate limits, so the client-side budgets should not throttle either
+        "CHAT_REQUESTS_PER_MINUTE": "1000000000",
+        "CHAT_TOKENS_PER_MINUTE": "1000000000",
+        "EMBEDDING_REQUESTS_PER_MINUTE": "1000000000",
+        "EMBEDDING_TOKENS_PER_MINUTE": "1000000000",
+    }
+    server = ServerProcess(env, log_path=server_log)
+    try:
+        server.start()
+        results = asyncio.run(_run(server.url, endpoints, concurrency, requests, corpus, progress or (lambda row: None)))
+    finally:
+        server.stop()
+        upstream.stop()
+        if redis_standin:
+            redis_standin.stop()
+        db_dir.cleanup()
+    return {
+        "profile": vars(profile),
+        "redis": "external" if redis else "in-process",
+        "requests_per_run": requests,
+        "upstream_calls": dict(upstream.server.config.app.state.calls),
+        "results": results,
+    }
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--corpus", type=_ints, default=[100, 2000])
+    parser.add_argument("--chat-latency", type=float, default=UpstreamProfile.chat_latency)
+    parser.add_argument("--embedding-latency", type=float, default=UpstreamProfile.embedding_latency)
+    parser.add_argument("--token-delay", type=float, default=UpstreamProfile.token_delay)
+    parser.add_argument("--nudge-latency", type=float, default=UpstreamProfile.nudge_latency)
+    parser.add_argument("--nudges", type=int, default=UpstreamProfile.nudges_per_employee)
+    parser.add_argument("--redis", help="host:port of a real Redis instead of the in-process stand-in")
+    parser.add_argument("--server-log", help="write server.py output to this file")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    profile = UpstreamProfile(
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency,
+        token_delay=args.token_delay,
+        nudge_latency=args.nudge_latency,
+        nudges_per_employee=args.nudges,
+    )
+
+    def progress(row):
+        print(f"[load] {row['endpoint']} c={row['concurrency']} corpus={row['corpus']}: "
+              f"p50={row['p50_ms']}ms p99={row['p99_ms']}ms {row['rps']} req/s errors={row['errors']}", file=sys.stderr)
+
+    report = run(
+        endpoints=[e.strip().lstrip("/") for e in args.endpoints.split(",") if e.strip()],
+        concurrency=args.concurrency,
+        requests=args.requests,
+        corpus=args.corpus,
+        profile=profile,
+        redis=args.redis,
+        server_log=args.server_log,
+        progress=progress,
+    )
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report["results"], json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
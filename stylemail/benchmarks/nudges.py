@@ -0,0 +1,82 @@
+"""
+Parse and cache-key cost for large nudge payloads.
+
+    python -m stylemail.benchmarks.nudges [--nudges 1000] [--repeat 50]
+
+Compares Nudge parsing against the dict-comprehension normaliser it replaced
+(reproduced below), and the summary cache key computed from freshly parsed
+nudges against the same nudges once their canonical JSON is memoised.
+"""
+import argparse
+import json
+import timeit
+
+from stylemail.nudges import parse_nudges
+from stylemail.summary_cache import summary_cache_key
+
+
+def synthetic_payload(count: int) -> dict:
+    return {"data": [
+        {"config": {
+            "message": f"Overtime above target for unit {i % 40}",
+            "metaData": f"Review schedules with the charge nurse and rebalance shifts for unit {i % 40}.",
+            "threshold": 12 + i % 5,
+            "dateRange": {"from": "2024-01-01", "to": "2024-01-31"},
+            "priorDateRange": {"from": "2023-12-01", "to": "2023-12-31"},
+            "metric": "overtime_hours",
+            "unit": "hours",
+            "operator": ">",
+        }}
+        for i in range(count)
+    ]}
+
+
+def legacy_prepare(nudge_data: dict) -> list:
+    return [
+        {
+            "title": nudge.get("config", {}).get("message", "No Title"),
+            "instructions": nudge.get("config", {}).get("metaData", "No Instructions"),
+            "metrics": (
+                f"Threshold: {nudge.get('config', {}).get('threshold', 'N/A')}, "
+                f"Date Range: {nudge.get('config', {}).get('dateRange', {}).get('from', 'N/A')} to {nudge.get('config', {}).get('dateRange', {}).get('to', 'N/A')}, "
+                f"Prior Date Range: {nudge.get('config', {}).get('priorDateRange', {}).get('from', 'N/A')} to {nudge.get('config', {}).get('priorDateRange', {}).get('to', 'N/A')}, "
+                f"Metric: {nudge.get('config', {}).get('metric', 'N/A')}, "
+                f"Unit: {nudge.get('config', {}).get('unit', 'N/A')}, "
+                f"Operator: {nudge.get('config', {}).get('operator', 'N/A')}"
+            )
+        }
+        for nudge in nudge_data.get("data", [])
+    ]
+
+
+def _ms(fn, repeat: int) -> float:
+    return round(min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000, 3)
+
+
+def run(nudges: int = 1000, repeat: int = 50) -> dict:
+    payload = synthetic_payload(nudges)
+    parsed = parse_nudges(payload)
+    legacy = legacy_prepare(payload)
+    assert [dict(n) for n in parsed] == legacy
+    assert summary_cache_key("Summarise", parsed) == summary_cache_key("Summarise", legacy)
+
+    return {
+        "nudges": nudges,
+        "legacy_prepare_ms": _ms(lambda: legacy_prepare(payload), repeat),
+        "parse_nudges_ms": _ms(lambda: parse_nudges(payload), repeat),
+        "cache_key_dicts_ms": _ms(lambda: summary_cache_key("Summarise", legacy), repeat),
+        "cache_key_cold_ms": _ms(lambda: summary_cache_key("Summarise", parse_nudges(payload)), repeat),
+        "cache_key_warm_ms": _ms(lambda: summary_cache_key("Summarise", parsed), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nudges", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(run(args.nudges, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
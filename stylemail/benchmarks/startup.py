@@ -0,0 +1,98 @@
+"""
+Import-time budgets for cold starts of the CLI, the worker and the server.
+
+    python -m stylemail.benchmarks.startup [--repeat 5] [--scale 1.0] [--profile]
+
+Each entry point is imported in a fresh interpreter, several times, and the median
+import time is compared with its budget. The heavy modules that must only load on
+first use (openai, langchain) must not be loaded at all. Exits non-zero when a
+budget is exceeded or a deferred module was imported, so it can gate CI;
+``--scale`` widens every budget on slow machines. ``--profile`` lists the slowest
+modules of each import, from ``python -X importtime``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+# Milliseconds to import each module in a fresh interpreter
+BUDGETS_MS: Dict[str, float] = {
+    "stylemail": 20,
+    "stylemail.config": 50,
+    "stylemail.api": 600,
+    "stylemail.cli": 600,
+    "stylemail.worker": 600,
+    "server": 2000,
+}
+
+# Modules that are only imported when an OpenAI client is first built (or not at all)
+DEFERRED = ("openai", "langchain_community", "langchain_core")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def _root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_root(), os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, *args], cwd=_root(), env=env, capture_output=True, text=True, check=True)
+
+
+def measure(module: str, repeat: int = 5) -> dict:
+    """Median import time of ``module`` over ``repeat`` fresh interpreters, and the deferred modules it loaded."""
+    probes = [json.loads(_run(["-c", _PROBE.format(module=module, deferred=DEFERRED)]).stdout) for _ in range(repeat)]
+    return {
+        "median_ms": round(statistics.median(p["ms"] for p in probes), 1),
+        "min_ms": round(min(p["ms"] for p in probes), 1),
+        "deferred_loaded": probes[0]["loaded"],
+    }
+
+
+def profile(module: str, top: int = 10) -> List[dict]:
+    """The ``top`` modules with the largest self time when importing ``module``."""
+    rows = []
+    for line in _run(["-X", "importtime", "-c", f"import {module}"]).stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:top]
+
+
+def run(modules: Optional[Sequence[str]] = None, repeat: int = 5, scale: float = 1.0, with_profile: bool = False) -> dict:
+    results = {}
+    for module in modules or BUDGETS_MS:
+        result = measure(module, repeat)
+        result["budget_ms"] = BUDGETS_MS.get(module, float("inf")) * scale
+        result["ok"] = result["median_ms"] <= result["budget_ms"] and not result["deferred_loaded"]
+        if with_profile:
+            result["slowest"] = profile(module)
+        results[module] = result
+    return {"python": sys.version.split()[0], "repeat": repeat, "results": results, "ok": all(r["ok"] for r in results.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", default=",".join(BUDGETS_MS), help="Comma-separated modules to import")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, e.g. 2 on a slow CI runner")
+    parser.add_argument("--profile", action="store_true", help="List the slowest modules of each import")
+    args = parser.parse_args()
+    report = run(args.modules.split(","), args.repeat, args.scale, args.profile)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
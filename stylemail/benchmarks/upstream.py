@@ -0,0 +1,197 @@
+"""
+Local stand-ins for the services StyleMail calls: the OpenAI API, Redis and the
+Laudio nudge API.
+
+The OpenAI stand-in speaks enough of the real wire format (base64 embeddings,
+chat completions, SSE streaming, ``usage``) that the stock SDK talks to it through
+``OPENAI_BASE_URL``; the nudge stand-in serves ``/auth/login`` and the employee
+nudge endpoint. Both run in one FastAPI app on a background uvicorn thread, and
+Redis is fakeredis' TCP server, so the whole service can be exercised without
+network access or API keys.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+@dataclass
+class UpstreamProfile:
+    """Simulated upstream behaviour; latencies are in seconds."""
+    embedding_latency: float = 0.05
+    chat_latency: float = 0.3
+    # Delay between streamed chunks, on top of chat_latency before the first one
+    token_delay: float = 0.005
+    completion_words: int = 120
+    nudge_latency: float = 0.02
+    nudges_per_employee: int = 12
+    embedding_dim: int = 1536
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """Deterministic unit vector for ``text``, so identical inputs embed identically."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def fake_nudges(employee_id: str, count: int) -> dict:
+    """A nudge API payload shaped like the real one, varied per employee."""
+    return {"data": [
+        {"config": {
+            "message": f"Follow up with employee {employee_id} on item {i}",
+            "metaData": f"Review the {i % 4 + 1} open shifts and agree next steps before Friday.",
+            "threshold": i * 5,
+            "dateRange": {"from": "2024-01-01", "to": "2024-01-31"},
+            "priorDateRange": {"from": "2023-12-01", "to": "2023-12-31"},
+            "metric": ("overtime", "turnover", "engagement")[i % 3],
+        }}
+        for i in range(count)
+    ]}
+
+
+def _completion_text(words: int) -> str:
+    body = " ".join(f"word{i % 50}" for i in range(words))
+    return f"Subject: Checking in on this week's items\n\nHi,\n\n{body}\n\nThanks"
+
+
+def _usage(prompt_chars: int, completion_chars: int) -> dict:
+    prompt_tokens, completion_tokens = prompt_chars // 4, completion_chars // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def upstream_app(profile: UpstreamProfile) -> FastAPI:
+    """FastAPI app serving the OpenAI (under /v1) and nudge API stand-ins; ``app.state.calls`` counts requests."""
+    app = FastAPI()
+    app.state.calls = {"embeddings": 0, "chat": 0, "login": 0, "nudges": 0}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        payload = await request.json()
+        app.state.calls["embeddings"] += 1
+        inputs = payload["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        await asyncio.sleep(profile.embedding_latency)
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(str(text), profile.embedding_dim)
+            if payload.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        chars = sum(len(str(t)) for t in inputs)
+        return {"object": "list", "data": data, "model": payload.get("model"), "usage": _usage(chars, 0)}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        payload = await request.json()
+        app.state.calls["chat"] += 1
+        prompt_chars = sum(len(m.get("content") or "") for m in payload.get("messages", []))
+        json_mode = (payload.get("response_format") or {}).get("type") == "json_object"
+        # JSON mode gets an empty team result, which exercises the per-employee fallback
+        content = json.dumps({"emails": []}) if json_mode else _completion_text(profile.completion_words)
+        created = int(time.time())
+        await asyncio.sleep(profile.chat_latency)
+
+        if not payload.get("stream"):
+            return {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": created,
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": _usage(prompt_chars, len(content)),
+            }
+
+        async def events():
+            for piece in content.split(" "):
+                chunk = {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": payload.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": piece + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if profile.token_delay:
+                    await asyncio.sleep(profile.token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/auth/login")
+    async def login():
+        app.state.calls["login"] += 1
+        await asyncio.sleep(profile.nudge_latency)
+        return {"data": {"accessToken": "bench-token", "expiresIn": 3600}}
+
+    @app.get("/insight/v1/nudge/employee/{employee_id}")
+    async def nudges(employee_id: str):
+        app.state.calls["nudges"] += 1
+        await asyncio.sleep(profile.nudge_latency)
+        return fake_nudges(employee_id, profile.nudges_per_employee)
+
+    return app
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class ThreadedServer:
+    """Runs an ASGI app with uvicorn on a daemon thread."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: Optional[int] = None):
+        self.host = host
+        self.port = port or free_port(host)
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=self.port, log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> "ThreadedServer":
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"Stand-in server failed to start on {self.url}")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class RedisStandIn:
+    """fakeredis' TCP server on a daemon thread, reachable by any Redis client."""
+
+    def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None):
+        from fakeredis import TcpFakeServer
+
+        self.address: Tuple[str, int] = (host, port or free_port(host))
+        self.server = TcpFakeServer(self.address, server_type="redis")
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> "RedisStandIn":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
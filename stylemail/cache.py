@@ -0,0 +1,133 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+class StyleMatrixCache:
+    """
+    Bounded in-process LRU cache of decoded per-user style matrices.
+
+    Entries are tagged with the user's Redis version counter; a lookup only hits
+    when the caller's current version matches, so writes from any worker process
+    invalidate every other process's copy on its next read.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): Maximum number of users kept in memory.
+            max_bytes (int): Approximate memory cap across all cached matrices. 0 disables caching.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, version: int, matrix: Any) -> None:
+        size = matrix.nbytes
+        if size > self.max_bytes:
+            self.invalidate(user_id)
+            return
+        with self._lock:
+            self._discard(user_id)
+            self._entries[user_id] = (version, matrix, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._discard(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+class EmbeddingCache:
+    """
+    Local LRU tier of a content-addressed embedding cache.
+
+    Keys are sha256 content hashes; the shared Redis tier (with TTL) is read and
+    written by UserVectorStore, which owns the Redis connection. This object keeps
+    the hottest vectors in process and counts hits per tier.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: int = 7 * 24 * 3600):
+        """
+        Args:
+            max_entries (int): Maximum number of vectors kept in process.
+            ttl (int): Expiry in seconds for entries in the shared Redis tier.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        with self._lock:
+            found = []
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    self.local_hits += 1
+                found.append(value)
+            return found
+
+    def put_many(self, keys: Sequence[str], values: Sequence[Any]) -> None:
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, remote_hits: int, misses: int) -> None:
+        with self._lock:
+            self.remote_hits += remote_hits
+            self.misses += misses
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "local_hits": self.local_hits,
+                "remote_hits": self.remote_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
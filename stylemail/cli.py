@@ -1,50 +1,102 @@
-import sys
+import asyncio
+import json
 import os
-from .api import seed_user_style, generate_email, generate_nudge_email, generate_nudge_summary
-from .vectorstore import UserVectorStore
+import sys
+from .api import seed_user_style, import_mailbox, generate_email, generate_nudge_email, generate_nudge_summary
+from .clients import StyleMailClients, AsyncStyleMailClients
+from .config import Config
+from .logs import configure_logging, shutdown_logging
+from .worker import run_worker
+
+
+async def run_summary_batch(config: Config, prompt: str, employee_ids, email: str, password: str):
+    # services lives at the repository root next to server.py
+    from services import AsyncNudgeApiClient
+    from .batch import NudgeSummaryBatch
+
+    def progress(done, total, employee_id, status):
+        print(f"[summary-batch] {done}/{total} employee {employee_id}: {status}", file=sys.stderr)
+
+    clients = AsyncStyleMailClients(config)
+    nudge_api = AsyncNudgeApiClient()
+    try:
+        clients.summaries.create_table()
+        batch = NudgeSummaryBatch(
+            lambda employee_id: nudge_api.fetch_nudges(email, password, employee_id),
+            clients.nudge_summary_generator,
+            repository=clients.summaries,
+            progress=progress,
+        )
+        return await batch.run(employee_ids, prompt)
+    finally:
+        await nudge_api.aclose()
+        await clients.aclose()
+
+
+# Sub-commands served by run_async_command
+ASYNC_COMMANDS = ("summary-batch", "worker")
 
 
 def main():
-    if len(sys.argv) < 3:
+    if len(sys.argv) < 3 and sys.argv[1:] not in (["migrate"], ["worker"]):
         print("Usage:")
         print("  python cli.py seed <user_id> <sample1> [<sample2> ...]")
+        print("  python cli.py import-mail <user_id> [--from=<address>] [--limit=<n>] <mbox|maildir|eml> [...]")
         print("  python cli.py generate <user_id> <subject> <prompt>")
+        print("  python cli.py migrate [<user_id>]")
+        print("  python cli.py summary-batch <prompt> <employee_id> [<employee_id> ...]   (use - to read ids from stdin)")
+        print("  python cli.py worker [--socket=<path>]   (line-delimited JSON requests on stdin or a Unix socket)")
         sys.exit(1)
 
     command = sys.argv[1]
-    user_id = sys.argv[2]
+    user_id = sys.argv[2] if len(sys.argv) > 2 else None
 
-    redis_host = os.getenv("REDIS_HOST", "localhost")
-    redis_port = int(os.getenv("REDIS_PORT", 6379))
-    redis_db = int(os.getenv("REDIS_DB", 0))
-    redis_password = os.getenv("REDIS_PASSWORD", "")
-    openai_api_key = os.getenv("OPENAI_API_KEY", "")
+    config = Config.from_env()
+    configure_logging(config.log_level, config.log_levels, config.prompt_log_sample_rate)
+    try:
+        run(command, user_id, config)
+    finally:
+        shutdown_logging()
 
-    auth_part = f":{redis_password}@" if redis_password else ""
-    redis_url = f"redis://{auth_part}{redis_host}:{redis_port}/{redis_db}"
 
-    store = UserVectorStore(
-        redis_url=redis_url,
-        host=redis_host,
-        port=redis_port,
-        db=redis_db,
-        password=redis_password,
-    )
+def run(command: str, user_id, config: Config):
+    if command in ASYNC_COMMANDS:
+        return run_async_command(command, config)
+    clients = StyleMailClients(config)
+    store = clients.store
 
     if command == "seed":
         samples = sys.argv[3:]
         if not samples:
             print("Please provide at least one writing sample.")
             sys.exit(1)
-        seed_user_style(user_id, samples, store=store, openai_api_key=openai_api_key)
-        print(f"Seeded style for user '{user_id}' with {len(samples)} samples.")
+        stored = seed_user_style(user_id, samples, clients=clients)
+        print(f"Seeded style for user '{user_id}' with {stored} new of {len(samples)} samples.")
+    elif command == "import-mail":
+        paths, senders, limit = [], [], None
+        for arg in sys.argv[3:]:
+            if arg.startswith("--from="):
+                senders.append(arg.split("=", 1)[1])
+            elif arg.startswith("--limit="):
+                limit = int(arg.split("=", 1)[1])
+            else:
+                paths.append(arg)
+        if not paths:
+            print("Please provide at least one mbox file, maildir or .eml path.")
+            sys.exit(1)
+
+        def progress(report):
+            print(f"[import-mail] {report.messages} messages read, {report.samples} samples", file=sys.stderr)
+
+        report = import_mailbox(user_id, paths, clients=clients, sender=senders or None, limit=limit, progress=progress)
+        print(json.dumps(report.as_dict(), indent=2))
     elif command == "generate":
         if len(sys.argv) < 5:
             print("Please provide a subject and a prompt.")
             sys.exit(1)
         subject = sys.argv[3]
         prompt = " ".join(sys.argv[4:])
-        result = generate_email(user_id, subject, prompt, store=store, openai_api_key=openai_api_key)
+        result = generate_email(user_id, subject, prompt, clients=clients)
         print("Generated Email:")
         print("Subject:", result["subject"])
         print("Body:\n", result["body"])
@@ -55,11 +107,11 @@ def main():
         prompt = sys.argv[3]
         nudges = sys.argv[4:]
         if command == "nudge":
-            result = generate_nudge_summary(user_id, prompt, nudges, store=store, openai_api_key=openai_api_key)
+            result = generate_nudge_summary(user_id, prompt, nudges, clients=clients)
             print("Generated Nudge Summary:")
             print("Summary:\n", result["summary"])
         elif command == "nudge-email":
-            result = generate_nudge_email(user_id, prompt, nudges, store=store, openai_api_key=openai_api_key)
+            result = generate_nudge_email(user_id, prompt, nudges, clients=clients)
             print("Generated Nudge Email:")
             print("Subject:", result["subject"])
             print("Body:\n", result["body"])
@@ -71,15 +123,53 @@ def main():
             sys.exit(1)
         prompt = sys.argv[3]
         nudges = sys.argv[4:]
-        result = generate_nudge_email(user_id, prompt, nudges, store=store, openai_api_key=openai_api_key)
+        result = generate_nudge_email(user_id, prompt, nudges, clients=clients)
         print("Generated Nudge Email:")
         print("Subject:", result["subject"])
         print("Body:\n", result["body"])
         store.clear_user_data(user_id)
         print(f"Cleared all cached embeddings for user '{user_id}'.")
+    elif command == "migrate":
+        if user_id:
+            converted = store.migrate_user(user_id)
+            print(f"Migrated {converted} samples for user '{user_id}'.")
+        else:
+            results = store.migrate_all()
+            print(f"Migrated {sum(results.values())} samples across {len(results)} users.")
     else:
         print(f"Unknown command: {command}")
         sys.exit(1)
+    clients.close()
+
+
+def run_async_command(command: str, config: Config):
+    """Commands that build their own AsyncStyleMailClients, so no sync clients are set up for them."""
+    if command == "summary-batch":
+        prompt = sys.argv[2]
+        employee_ids = sys.argv[3:]
+        if employee_ids == ["-"]:
+            employee_ids = sys.stdin.read().split()
+        if not employee_ids:
+            print("Please provide at least one employee id.")
+            sys.exit(1)
+        email, password = os.getenv("NUDGE_API_EMAIL"), os.getenv("NUDGE_API_PASSWORD")
+        if not email or not password:
+            print("Set NUDGE_API_EMAIL and NUDGE_API_PASSWORD to fetch nudge data.")
+            sys.exit(1)
+        report = asyncio.run(run_summary_batch(config, prompt, employee_ids, email, password))
+        print(json.dumps(report.as_dict(), indent=2))
+    elif command == "worker":
+        socket_path = None
+        for arg in sys.argv[2:]:
+            if arg.startswith("--socket="):
+                socket_path = arg.split("=", 1)[1]
+            else:
+                print(f"Unknown worker option: {arg}")
+                sys.exit(1)
+        try:
+            asyncio.run(run_worker(AsyncStyleMailClients(config), socket_path))
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
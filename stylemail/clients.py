@@ -0,0 +1,199 @@
+import redis
+import redis.asyncio
+from functools import cached_property
+from typing import TYPE_CHECKING, Optional
+from stylemail.config import CHAT_MODEL, EMBEDDING_MODEL, Config
+from stylemail.scheduler import OpenAIScheduler, RateLimit
+from stylemail.vectorstore import UserVectorStore, AsyncUserVectorStore
+from stylemail.seeder import StyleSeeder, AsyncStyleSeeder
+from stylemail.summary_cache import NudgeSummaryCache
+from stylemail.summary_store import SummaryRepository
+from stylemail.generator import (
+    EmailGenerator,
+    NudgeSummaryGenerator,
+    NudgeEmailGenerator,
+    AsyncEmailGenerator,
+    AsyncNudgeSummaryGenerator,
+    AsyncNudgeEmailGenerator,
+)
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+
+def _http_limits(config: Config) -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=config.openai_max_connections,
+        max_keepalive_connections=config.openai_max_keepalive_connections,
+        keepalive_expiry=config.openai_keepalive_expiry,
+    )
+
+
+def _scheduler(config: Config) -> OpenAIScheduler:
+    return OpenAIScheduler(
+        {
+            CHAT_MODEL: RateLimit(config.chat_requests_per_minute, config.chat_tokens_per_minute),
+            EMBEDDING_MODEL: RateLimit(config.embedding_requests_per_minute, config.embedding_tokens_per_minute),
+        },
+        max_retries=config.openai_max_retries,
+    )
+
+
+def _ann_kwargs(config: Config) -> dict:
+    return {"ann_min_samples": config.ann_min_samples or None, "ann_probes": config.ann_probes}
+
+
+def _budgeted(generator, config: Config):
+    generator.prompt_token_budget = config.nudge_prompt_token_budget
+    return generator
+
+
+def _redis_pool_kwargs(config: Config) -> dict:
+    kwargs = {
+        "host": config.redis_host,
+        "port": config.redis_port,
+        "password": config.redis_password,
+        "max_connections": config.redis_max_connections,
+    }
+    if config.redis_db is not None:
+        kwargs["db"] = config.redis_db
+    return kwargs
+
+
+class StyleMailClients:
+    """
+    Process-wide registry of long-lived clients.
+
+    Owns one pooled OpenAI client, one Redis connection pool and a single instance of
+    each seeder/generator, so repeated calls reuse warm TLS and Redis connections
+    instead of building new ones per request. Create it once at startup and close it
+    on shutdown. The OpenAI client and generators are built on first use, so
+    Redis-only commands never need an API key or pay for importing openai. Every OpenAI call goes through one
+    OpenAIScheduler, which owns rate limiting and retries (the SDK's own retries are
+    disabled so a 429 is not retried twice).
+    """
+
+    def __init__(self, config: Config, store: Optional[UserVectorStore] = None):
+        self.config = config
+        self.redis_pool = redis.ConnectionPool(**_redis_pool_kwargs(config))
+        self.scheduler = _scheduler(config)
+        self.store = store or UserVectorStore(connection_pool=self.redis_pool, **_ann_kwargs(config))
+
+    @cached_property
+    def openai(self) -> "OpenAI":
+        from openai import DefaultHttpxClient, OpenAI
+
+        return OpenAI(
+            api_key=self.config.openai_api_key,
+            timeout=self.config.openai_timeout,
+            max_retries=0,
+            http_client=DefaultHttpxClient(limits=_http_limits(self.config)),
+        )
+
+    @cached_property
+    def seeder(self) -> StyleSeeder:
+        return StyleSeeder(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler)
+
+    @cached_property
+    def email_generator(self) -> EmailGenerator:
+        return EmailGenerator(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler)
+
+    @cached_property
+    def nudge_email_generator(self) -> NudgeEmailGenerator:
+        return _budgeted(NudgeEmailGenerator(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler), self.config)
+
+    @cached_property
+    def nudge_summary_generator(self) -> NudgeSummaryGenerator:
+        return _budgeted(NudgeSummaryGenerator(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler), self.config)
+
+    @cached_property
+    def summaries(self) -> SummaryRepository:
+        return SummaryRepository(self.config.summary_db_path)
+
+    def close(self) -> None:
+        if "openai" in self.__dict__:
+            self.openai.close()
+        if "summaries" in self.__dict__:
+            self.summaries.close()
+        self.redis_pool.disconnect()
+
+
+class AsyncStyleMailClients:
+    """
+    asyncio counterpart of StyleMailClients, built on AsyncOpenAI and redis.asyncio.
+    """
+
+    def __init__(self, config: Config, store: Optional[AsyncUserVectorStore] = None):
+        self.config = config
+        self.redis_pool = redis.asyncio.ConnectionPool(**_redis_pool_kwargs(config))
+        self.scheduler = _scheduler(config)
+        self.store = store or AsyncUserVectorStore(connection_pool=self.redis_pool, **_ann_kwargs(config))
+
+    @cached_property
+    def openai(self) -> "AsyncOpenAI":
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        return AsyncOpenAI(
+            api_key=self.config.openai_api_key,
+            timeout=self.config.openai_timeout,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=_http_limits(self.config)),
+        )
+
+    @cached_property
+    def seeder(self) -> AsyncStyleSeeder:
+        return AsyncStyleSeeder(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler)
+
+    @cached_property
+    def email_generator(self) -> AsyncEmailGenerator:
+        return AsyncEmailGenerator(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler)
+
+    @cached_property
+    def nudge_email_generator(self) -> AsyncNudgeEmailGenerator:
+        return _budgeted(AsyncNudgeEmailGenerator(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler), self.config)
+
+    @cached_property
+    def nudge_summary_generator(self) -> AsyncNudgeSummaryGenerator:
+        return _budgeted(AsyncNudgeSummaryGenerator(self.config.openai_api_key, self.store, client=self.openai, scheduler=self.scheduler), self.config)
+
+    @cached_property
+    def summaries(self) -> SummaryRepository:
+        return SummaryRepository(self.config.summary_db_path)
+
+    @cached_property
+    def summary_cache(self) -> NudgeSummaryCache:
+        return NudgeSummaryCache(
+            self.summaries,
+            self.nudge_summary_generator,
+            fresh_ttl=self.config.summary_fresh_ttl,
+            stale_ttl=self.config.summary_stale_ttl,
+        )
+
+    async def warm(self):
+        """
+        Build the OpenAI client and open the first pooled Redis connection before any request needs them.
+
+        This is the one connection check made at startup. Returns Redis' reply to PING.
+
+        Raises:
+            redis.exceptions.RedisError: If Redis cannot be reached.
+        """
+        self.openai
+        return await self.store.redis.ping()
+
+    def coalescing_stats(self) -> dict:
+        """Single-flight counters for every generator built so far."""
+        names = ("email_generator", "nudge_email_generator", "nudge_summary_generator")
+        return {name: self.__dict__[name].flights.stats() for name in names if name in self.__dict__}
+
+    async def aclose(self) -> None:
+        if "summary_cache" in self.__dict__:
+            await self.summary_cache.drain()
+        if "openai" in self.__dict__:
+            await self.openai.close()
+        if "summaries" in self.__dict__:
+            self.summaries.close()
+        await self.redis_pool.disconnect()
@@ -1,15 +1,56 @@
+from os import getenv
 from typing import Optional
-from dataclasses import dataclass
-import redis
+from dataclasses import dataclass, field
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHAT_MODEL = "gpt-4o"
+ANN_MIN_SAMPLES = 20000
+ANN_PROBES = 16
+
+
+def _flag(value: Optional[str], default: bool) -> bool:
+    if not value:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
 
 
 @dataclass
 class Config:
-    openai_api_key: str
+    # Secrets are left out of repr() so the config can be logged
+    openai_api_key: str = field(repr=False)
     redis_host: str
     redis_port: int
     redis_db: Optional[int]
-    redis_password: str
+    redis_password: str = field(repr=False)
+    # Connection pool sizing for the long-lived clients in stylemail.clients
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_keepalive_expiry: float = 60.0
+    openai_timeout: float = 60.0
+    redis_max_connections: int = 50
+    # Client-side OpenAI budgets; set them a little under the account's limits
+    chat_requests_per_minute: float = 500
+    chat_tokens_per_minute: float = 30000
+    embedding_requests_per_minute: float = 3000
+    embedding_tokens_per_minute: float = 1000000
+    openai_max_retries: int = 4
+    # Nudge summary persistence and cache lifetimes (seconds)
+    summary_db_path: str = "laudio_client1.db"
+    summary_fresh_ttl: float = 24 * 60 * 60
+    summary_stale_ttl: float = 7 * 24 * 60 * 60
+    # Users with at least this many samples are searched through an IVF index (0 disables it)
+    ann_min_samples: int = ANN_MIN_SAMPLES
+    ann_probes: int = ANN_PROBES
+    # Token budget for an assembled nudge summary/email prompt
+    nudge_prompt_token_budget: int = 3000
+    # Stage timings and token counters for /metrics; OpenTelemetry spans on top when enabled
+    metrics_enabled: bool = True
+    otel_enabled: bool = False
+    # Root log level, per-logger overrides ("stylemail.generator=DEBUG,uvicorn=WARNING")
+    # and the fraction of completion prompts logged in full
+    log_level: str = "INFO"
+    log_levels: str = ""
+    prompt_log_sample_rate: float = 0.0
 
     @staticmethod
     def load(
@@ -18,33 +59,53 @@ class Config:
         redis_port: int,
         redis_db: Optional[int],
         redis_password: str,
+        **settings,
     ) -> "Config":
         """
         Load configuration from provided arguments.
+
+        No connection is opened here; the clients built from the config open the one
+        Redis connection pool, and the server checks it once at startup.
         """
-        config = Config(
+        return Config(
             openai_api_key=openai_api_key,
             redis_host=redis_host,
             redis_port=redis_port,
             redis_db=redis_db,
             redis_password=redis_password,
+            **settings,
         )
 
-        # Attempt Redis connection to validate config
-        try:
-            r = None
-            if redis_db is not None:
-                r = redis.Redis(
-                    host=redis_host,
-                    port=redis_port,
-                    db=redis_db,
-                    password=redis_password,
-                )
-            else:
-                r = redis.Redis(host=redis_host, port=redis_port, password=redis_password)
-            r.ping()
-            print("[config] Redis connection successful.")
-        except Exception as e:
-            print(f"[config] Redis connection failed: {e}")
-
-        return config
+    @staticmethod
+    def from_env() -> "Config":
+        """
+        Build configuration from environment variables without opening any connections.
+        """
+        return Config(
+            openai_api_key=getenv("OPENAI_API_KEY", ""),
+            redis_host=getenv("REDIS_HOST") or "localhost",
+            redis_port=int(getenv("REDIS_PORT") or 6379),
+            redis_db=int(getenv("REDIS_DB")) if getenv("REDIS_DB") else None,
+            redis_password=getenv("REDIS_PASSWORD") or None,
+            openai_max_connections=int(getenv("OPENAI_MAX_CONNECTIONS") or 100),
+            openai_max_keepalive_connections=int(getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS") or 20),
+            openai_keepalive_expiry=float(getenv("OPENAI_KEEPALIVE_EXPIRY") or 60.0),
+            openai_timeout=float(getenv("OPENAI_TIMEOUT") or 60.0),
+            redis_max_connections=int(getenv("REDIS_MAX_CONNECTIONS") or 50),
+            chat_requests_per_minute=float(getenv("CHAT_REQUESTS_PER_MINUTE") or 500),
+            chat_tokens_per_minute=float(getenv("CHAT_TOKENS_PER_MINUTE") or 30000),
+            embedding_requests_per_minute=float(getenv("EMBEDDING_REQUESTS_PER_MINUTE") or 3000),
+            embedding_tokens_per_minute=float(getenv("EMBEDDING_TOKENS_PER_MINUTE") or 1000000),
+            openai_max_retries=int(getenv("OPENAI_MAX_RETRIES") or 4),
+            summary_db_path=getenv("SUMMARY_DB_PATH") or "laudio_client1.db",
+            summary_fresh_ttl=float(getenv("SUMMARY_FRESH_TTL") or 24 * 60 * 60),
+            summary_stale_ttl=float(getenv("SUMMARY_STALE_TTL") or 7 * 24 * 60 * 60),
+            ann_min_samples=int(getenv("ANN_MIN_SAMPLES") or ANN_MIN_SAMPLES),
+            ann_probes=int(getenv("ANN_PROBES") or ANN_PROBES),
+            nudge_prompt_token_budget=int(getenv("NUDGE_PROMPT_TOKEN_BUDGET") or 3000),
+            metrics_enabled=_flag(getenv("METRICS_ENABLED"), True),
+            otel_enabled=_flag(getenv("OTEL_ENABLED"), False),
+            log_level=getenv("LOG_LEVEL") or "INFO",
+            log_levels=getenv("LOG_LEVELS") or "",
+            prompt_log_sample_rate=float(getenv("PROMPT_LOG_SAMPLE_RATE") or 0.0),
+        )
@@ -1,24 +1,117 @@
-from langchain_community.llms import OpenAI
-from openai import OpenAI
+import asyncio
+import json
+import logging
 import numpy as np
-from typing import List, Dict, Any
-from stylemail.vectorstore import UserVectorStore
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Iterator, AsyncIterator, Mapping, Tuple
+from stylemail.config import EMBEDDING_MODEL
+from stylemail.metrics import span
+from stylemail.nudges import NudgePrompt, build_nudge_prompt
+from stylemail.similarity import mmr_select
+from stylemail.tokens import CHARS_PER_TOKEN, estimate_tokens
+from stylemail.vectorstore import StyleMatrix, UserVectorStore, AsyncUserVectorStore
+from stylemail.scheduler import COMPLETION_TOKEN_ESTIMATE, OpenAIScheduler, achat_completion, acreate_embeddings, chat_completion, create_embeddings, default_openai_client
+from stylemail.singleflight import AsyncSingleFlight, SingleFlight, flight_key
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class SubjectLineParser:
+    """
+    Incremental version of NudgeEmailGenerator.parse_email for streamed completions.
+
+    Feed it content deltas as they arrive; it returns ``("subject", text)`` as soon as
+    the first ``Subject:`` line is complete and ``("token", text)`` for body text.
+    Lines starting with ``Subject:`` are dropped from the body, exactly as in
+    parse_email. Only the start of each line is buffered, so body tokens are
+    forwarded with at most a few characters of delay.
+    """
+    PREFIX = "subject:"
+
+    def __init__(self):
+        self.subject: Optional[str] = None
+        self._line = ""
+        self._line_kind: Optional[str] = None  # None = undecided, "subject" or "body"
+        self._emitted_line = False
+
+    def feed(self, delta: str) -> List[tuple]:
+        events = []
+        parts = delta.split("\n")
+        for i, text in enumerate(parts):
+            ends_line = i < len(parts) - 1
+            if self._line_kind == "body":
+                if text:
+                    events.append(("token", text))
+            else:
+                self._line += text
+                self._classify(events, final=ends_line)
+            if ends_line:
+                self._end_line(events)
+        return events
+
+    def finish(self) -> List[tuple]:
+        events = []
+        if self._line_kind is None:
+            self._classify(events, final=True)
+        self._end_line(events)
+        if self.subject is None:
+            self.subject = "No Subject"
+            events.append(("subject", self.subject))
+        return events
+
+    def _classify(self, events: List[tuple], final: bool) -> None:
+        probe = self._line.lower()
+        if probe.startswith(self.PREFIX):
+            self._line_kind = "subject"
+        elif final or not self.PREFIX.startswith(probe):
+            self._line_kind = "body"
+            if self._emitted_line:
+                events.append(("token", "\n"))
+            self._emitted_line = True
+            if self._line:
+                events.append(("token", self._line))
+            self._line = ""
+
+    def _end_line(self, events: List[tuple]) -> None:
+        if self._line_kind == "subject" and self.subject is None:
+            self.subject = self._line.split(":", 1)[1].strip()
+            events.append(("subject", self.subject))
+        self._line = ""
+        self._line_kind = None
+
 
 class EmailGenerator:
-    def __init__(self, openai_api_key: str, vector_store: UserVectorStore):
+    # Style context for prompts: at most style_samples samples, chosen by MMR among the
+    # style_candidates most relevant ones, totalling at most style_token_budget tokens
+    style_samples = 3
+    style_candidates = 20
+    style_token_budget = 600
+    mmr_lambda = 0.5
+
+    def __init__(self, openai_api_key: str, vector_store: UserVectorStore, client: Optional["OpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
         """
         Initialize the EmailGenerator with OpenAI API key and a vector store for user embeddings.
         
         Args:
             openai_api_key (str): The API key for OpenAI.
             vector_store (UserVectorStore): The vector store instance for user embeddings.
+            client (Optional[OpenAI]): A shared OpenAI client; one is created from the API key if omitted.
+            scheduler (Optional[OpenAIScheduler]): Shared rate limiter for OpenAI calls; calls go out unthrottled if omitted.
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        self.client = client or default_openai_client(openai_api_key)
         self.vector_store = vector_store
+        self.scheduler = scheduler
+        # Identical concurrent requests share one upstream completion
+        self.flights = SingleFlight()
 
     def embed_prompt(self, prompt: str) -> List[float]:
         """
         Generate an embedding for the given prompt using the OpenAI API.
+
+        Embeddings are cached by content hash in the vector store's embedding cache,
+        so a prompt that was embedded before skips the API call.
         
         Args:
             prompt (str): The input prompt to embed.
@@ -29,14 +122,16 @@ class EmailGenerator:
         Raises:
             RuntimeError: If the embedding request fails.
         """
+        cached = self.vector_store.get_cached_embeddings([prompt], EMBEDDING_MODEL)[0]
+        if cached is not None:
+            return cached
         try:
-            response = self.client.embeddings.create(
-                input=[prompt],
-                model="text-embedding-ada-002"
-            )
-            return response.data[0].embedding
+            response = create_embeddings(self.client, self.scheduler, [prompt])
+            embedding = response.data[0].embedding
         except Exception as e:
             raise RuntimeError(f"Failed to embed prompt with OpenAI API: {e}")
+        self.vector_store.cache_embeddings([prompt], [embedding], EMBEDDING_MODEL)
+        return embedding
 
     def cosine_similarity(self, a: List[float], b: List[float]) -> float:
         """
@@ -57,13 +152,57 @@ class EmailGenerator:
         """
         Retrieve top-k most similar writing samples from Redis based on prompt embedding.
         """
-        entries = self.vector_store.get_all_embeddings(user_id)
-        scored = [
-            (self.cosine_similarity(prompt_embedding, e["embedding"]), e["text"])
-            for e in entries
-        ]
-        scored.sort(reverse=True)
-        return [text for _, text in scored[:top_k]]
+        return self.retrieve_style_contexts(user_id, [prompt_embedding], top_k)[0]
+
+    def retrieve_style_contexts(self, user_id: str, prompt_embeddings: List[List[float]], top_k: int = 3) -> List[List[str]]:
+        """
+        Retrieve the top-k writing samples for several prompts against one user's style set.
+
+        The user's matrix is loaded once and scored against all prompts with a single
+        matrix product; top-k selection uses argpartition rather than a full sort.
+        Large corpora are searched through the matrix's approximate index instead.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            prompt_embeddings (List[List[float]]): One embedding per prompt.
+            top_k (int): Number of samples to return per prompt.
+
+        Returns:
+            List[List[str]]: The selected sample texts for each prompt, best match first.
+        """
+        with span("generate.load_style"):
+            matrix = self.vector_store.get_style_matrix(user_id)
+        if not len(matrix):
+            return [[] for _ in prompt_embeddings]
+        with span("generate.score"):
+            rows = matrix.nearest(np.asarray(prompt_embeddings, dtype=np.float32), top_k)
+        return [[matrix.texts[i] for i in row] for row in rows]
+
+    def select_style_context(self, user_id: str, prompt_embedding: List[float]) -> List[str]:
+        """
+        Pick relevant but mutually different style samples for a prompt, within the token budget.
+
+        Unlike retrieve_style_context, near-duplicates of an already chosen sample are
+        passed over (maximal marginal relevance), so a few varied samples carry the
+        style instead of several copies of the same one.
+        """
+        with span("generate.load_style"):
+            matrix = self.vector_store.get_style_matrix(user_id)
+        with span("generate.select_context"):
+            return self._select_context(matrix, prompt_embedding)
+
+    def _select_context(self, matrix: StyleMatrix, prompt_embedding: List[float]) -> List[str]:
+        if not len(matrix):
+            return []
+        query = np.asarray(prompt_embedding, dtype=np.float32)
+        pool = matrix.nearest(query[None, :], self.style_candidates)[0]
+        texts = [matrix.texts[i] for i in pool]
+        costs = [estimate_tokens(t) for t in texts]
+        picked = mmr_select(matrix.embeddings[pool], query, self.style_samples, self.mmr_lambda, costs, self.style_token_budget)
+        if not picked:
+            # Every candidate alone exceeds the budget; the opening of the best one still carries the style
+            return [texts[0][:self.style_token_budget * CHARS_PER_TOKEN]]
+        return [texts[i] for i in picked]
 
     def build_prompt(self, context_samples: List[str], user_prompt: str) -> str:
         """
@@ -93,35 +232,93 @@ class EmailGenerator:
         Raises:
             RuntimeError: If no style data is found or the OpenAI API call fails.
         """
+        key = flight_key("generate_email", user_id, subject, user_prompt)
+        return dict(self.flights.do(key, lambda: self._generate_email(user_id, subject, user_prompt)))
+
+    def _generate_email(self, user_id: str, subject: str, user_prompt: str) -> Dict[str, str]:
+        full_prompt = self.prepare_prompt(user_id, subject, user_prompt)
+        try:
+            with span("generate.completion"):
+                response = chat_completion(self.client, self.scheduler, full_prompt)
+            content = response.choices[0].message.content
+            return {"subject": "Generated Email", "body": content}
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate email with OpenAI API: {e}")
+
+    def prepare_prompt(self, user_id: str, subject: str, user_prompt: str) -> str:
+        """
+        Embed the request, retrieve the user's closest style samples and build the LLM prompt.
+
+        Raises:
+            RuntimeError: If no style data is found for the user.
+        """
         full_input = f"Subject: {subject}\n\n{user_prompt}"
-        prompt_embedding = self.embed_prompt(full_input)
-        context = self.retrieve_style_context(user_id, prompt_embedding)
+        with span("generate.embed_prompt"):
+            prompt_embedding = self.embed_prompt(full_input)
+        context = self.select_style_context(user_id, prompt_embedding)
         if not context:
             raise RuntimeError(f"No style data found for user '{user_id}'. Please seed user style first.")
-        full_prompt = self.build_prompt(context, f"Subject: {subject}\n\n{user_prompt}")
-        print("[generate_email] Full prompt sent to OpenAI:\n", full_prompt)
+        return self.build_prompt(context, full_input)
 
+    def stream_email(self, user_id: str, subject: str, user_prompt: str) -> Iterator[tuple]:
+        """
+        Streaming variant of generate_email.
+
+        Yields ``("subject", text)`` once, then ``("token", text)`` for each content
+        delta as the completion arrives.
+        """
+        full_prompt = self.prepare_prompt(user_id, subject, user_prompt)
+        yield ("subject", "Generated Email")
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": full_prompt}],
-                temperature=0.7,
-            )
-            content = response.choices[0].message.content
-            return {"subject": "Generated Email", "body": content}
+            with span("openai.stream_open"):
+                stream = chat_completion(self.client, self.scheduler, full_prompt, stream=True)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield ("token", chunk.choices[0].delta.content)
         except Exception as e:
             raise RuntimeError(f"Failed to generate email with OpenAI API: {e}")
 class NudgeSummaryGenerator:
-    def __init__(self, openai_api_key: str, vector_store: UserVectorStore):
+    # Prompts are trimmed to this many tokens; nudges that do not fit are left out
+    prompt_token_budget = 3000
+    max_instruction_tokens = 300
+
+    def __init__(self, openai_api_key: str, vector_store: UserVectorStore, client: Optional["OpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
         """
         Initialize the NudgeSummaryGenerator with OpenAI API key and a vector store for user embeddings.
         
         Args:
             openai_api_key (str): The API key for OpenAI.
             vector_store (UserVectorStore): The vector store instance for user embeddings.
+            client (Optional[OpenAI]): A shared OpenAI client; one is created from the API key if omitted.
+            scheduler (Optional[OpenAIScheduler]): Shared rate limiter for OpenAI calls; calls go out unthrottled if omitted.
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        self.client = client or default_openai_client(openai_api_key)
         self.vector_store = vector_store
+        self.scheduler = scheduler
+        self.flights = SingleFlight()
+
+    def assemble_prompt(self, prompt: str, nudges: List[Dict[str, str]]) -> NudgePrompt:
+        """
+        Construct the summary prompt from the user prompt and the prepared nudges,
+        compacted and trimmed to ``prompt_token_budget`` (see build_nudge_prompt).
+        """
+        return build_nudge_prompt(
+            lambda block: f"Prompt: {prompt}\n\nNudges:\n{block}",
+            nudges,
+            lambda n: f"Title: {n['title']}, Instructions: {n['instructions']}, Metrics: {n['metrics']}",
+            "\n",
+            self.prompt_token_budget,
+            self.max_instruction_tokens,
+        )
+
+    def build_prompt(self, prompt: str, nudges: List[Dict[str, str]]) -> str:
+        return self.assemble_prompt(prompt, nudges).text
+
+    def _budgeted_prompt(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> str:
+        with span("nudge_summary.prompt"):
+            built = self.assemble_prompt(prompt, nudges)
+        logger.debug("Summary prompt for user %s: %d tokens, %d/%d nudges", user_id, built.tokens, built.included, built.included + built.omitted)
+        return built.text
 
     def generate_summary(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> Dict[str, str]:
         """
@@ -138,34 +335,218 @@ class NudgeSummaryGenerator:
         Raises:
             RuntimeError: If the OpenAI API call fails.
         """
-        # Example implementation, adjust as needed
-        full_prompt = f"Prompt: {prompt}\n\nNudges:\n" + "\n".join(
-            f"Title: {n['title']}, Instructions: {n['instructions']}, Metrics: {n['metrics']}"
-            for n in nudges
-        )
-        print("[generate_summary] Full prompt sent to OpenAI:\n", full_prompt)
+        full_prompt = self._budgeted_prompt(user_id, prompt, nudges)
+        return dict(self.flights.do(flight_key("generate_summary", full_prompt), lambda: self._complete(full_prompt)))
 
+    def _complete(self, full_prompt: str) -> Dict[str, str]:
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": full_prompt}],
-                temperature=0.7,
-            )
+            with span("nudge_summary.completion"):
+                response = chat_completion(self.client, self.scheduler, full_prompt)
             content = response.choices[0].message.content
             return {"summary": content}
         except Exception as e:
             raise RuntimeError(f"Failed to generate summary with OpenAI API: {e}")
 class NudgeEmailGenerator:
-    def __init__(self, openai_api_key: str, vector_store: UserVectorStore):
+    # Prompts are trimmed to this many tokens; nudges that do not fit are left out
+    prompt_token_budget = 3000
+    max_instruction_tokens = 300
+    # Team runs pack up to this many employees into one completion, within the token budget
+    team_batch_size = 5
+    team_prompt_token_budget = 12000
+
+    def __init__(self, openai_api_key: str, vector_store: UserVectorStore, client: Optional["OpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
         """
         Initialize the NudgeEmailGenerator with OpenAI API key and a vector store for user embeddings.
         
         Args:
             openai_api_key (str): The API key for OpenAI.
             vector_store (UserVectorStore): The vector store instance for user embeddings.
+            client (Optional[OpenAI]): A shared OpenAI client; one is created from the API key if omitted.
+            scheduler (Optional[OpenAIScheduler]): Shared rate limiter for OpenAI calls; calls go out unthrottled if omitted.
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        self.client = client or default_openai_client(openai_api_key)
         self.vector_store = vector_store
+        self.scheduler = scheduler
+        self.flights = SingleFlight()
+
+    def assemble_prompt(self, prompt: str, nudges: List[Dict[str, str]]) -> NudgePrompt:
+        """
+        Construct the nudge email prompt from the user prompt and the prepared nudges,
+        compacted and trimmed to ``prompt_token_budget`` (see build_nudge_prompt).
+        """
+        return build_nudge_prompt(
+            lambda nudge_texts: (
+                f"{prompt}\n\n"
+                f"Nudges for the Employee Sally:\n{nudge_texts}\n\n"
+                "Write a complete and polished email to the employee addressing the nudges. "
+                "The email should be professional, concise, and provide clear next steps."
+                "The nudges are things the writer needs to do for their team member and this email is them addressing them and reaching out to their team member."
+            ),
+            nudges,
+            self.render_nudge,
+            "\n\n",
+            self.prompt_token_budget,
+            self.max_instruction_tokens,
+        )
+
+    @staticmethod
+    def render_nudge(nudge: Dict[str, str]) -> str:
+        return f"Title: {nudge['title']}\nInstructions: {nudge['instructions']}\nMetrics: {nudge['metrics']}"
+
+    def build_prompt(self, prompt: str, nudges: List[Dict[str, str]]) -> str:
+        return self.assemble_prompt(prompt, nudges).text
+
+    def _budgeted_prompt(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> str:
+        with span("nudge_email.prompt"):
+            built = self.assemble_prompt(prompt, nudges)
+        logger.debug("Nudge email prompt for user %s: %d tokens, %d/%d nudges", user_id, built.tokens, built.included, built.included + built.omitted)
+        return built.text
+
+    def team_section(self, employee_id: str, nudges: List[Dict[str, str]]) -> NudgePrompt:
+        """One employee's block of a team prompt, compacted and trimmed like a single-employee prompt."""
+        return build_nudge_prompt(
+            lambda nudge_texts: f"Nudges for employee {employee_id}:\n{nudge_texts}",
+            nudges,
+            self.render_nudge,
+            "\n\n",
+            self.prompt_token_budget,
+            self.max_instruction_tokens,
+        )
+
+    def assemble_team_prompt(self, prompt: str, sections: List[Tuple[str, str]]) -> str:
+        """
+        Construct one prompt asking for an email per employee as a JSON object.
+
+        The instructions are sent once for the whole group; ``sections`` are
+        (employee_id, team_section text) pairs.
+        """
+        employee_ids = ", ".join(json.dumps(employee_id) for employee_id, _ in sections)
+        blocks = "\n\n---\n\n".join(text for _, text in sections)
+        return (
+            f"{prompt}\n\n"
+            "Below are nudges for several employees. Write a separate, complete and polished email to each employee addressing their nudges. "
+            "Each email should be professional, concise, and provide clear next steps, and must only mention that employee's nudges. "
+            "The nudges are things the writer needs to do for their team member and each email is them addressing them and reaching out to their team member.\n\n"
+            f"{blocks}\n\n"
+            'Respond with a JSON object of the form {"emails": [{"employee_id": "...", "subject": "...", "body": "..."}]} '
+            f"with exactly one entry for each of these employee ids: {employee_ids}. Do not repeat the subject line in the body."
+        )
+
+    def pack_team(self, prompt: str, team: Mapping[str, List[Dict[str, str]]]) -> List[List[Tuple[str, str]]]:
+        """
+        Group the team's sections into completions of at most ``team_batch_size``
+        employees whose prompt stays within ``team_prompt_token_budget`` tokens.
+        """
+        base = estimate_tokens(self.assemble_team_prompt(prompt, []))
+        groups: List[List[Tuple[str, str]]] = []
+        group: List[Tuple[str, str]] = []
+        used = base
+        for employee_id, nudges in team.items():
+            section = self.team_section(employee_id, nudges)
+            # The section plus its separator and its entry in the id list
+            cost = section.tokens + estimate_tokens(f"\n\n---\n\n{json.dumps(employee_id)}, ")
+            if group and (len(group) >= self.team_batch_size or used + cost > self.team_prompt_token_budget):
+                groups.append(group)
+                group, used = [], base
+            group.append((employee_id, section.text))
+            used += cost
+        if group:
+            groups.append(group)
+        return groups
+
+    @staticmethod
+    def parse_team_emails(content: str, employee_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Split a team completion into {employee_id: {"subject", "body"}}.
+
+        Entries that are malformed, empty or for an employee not in ``employee_ids``
+        are dropped, and content that is not valid JSON yields an empty result, so the
+        caller can fall back to single-employee generation for whoever is missing.
+        """
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            return {}
+        entries = data.get("emails") if isinstance(data, dict) else None
+        if not isinstance(entries, list):
+            return {}
+        wanted = set(employee_ids)
+        emails: Dict[str, Dict[str, str]] = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            employee_id = str(entry.get("employee_id"))
+            subject, body = entry.get("subject"), entry.get("body")
+            if employee_id not in wanted or employee_id in emails:
+                continue
+            if isinstance(subject, str) and subject.strip() and isinstance(body, str) and body.strip():
+                emails[employee_id] = {"subject": subject.strip(), "body": body}
+        return emails
+
+    def _team_prompt(self, user_id: str, prompt: str, group: List[Tuple[str, str]]) -> str:
+        full_prompt = self.assemble_team_prompt(prompt, group)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Team prompt for user %s: %d employees, %d tokens", user_id, len(group), estimate_tokens(full_prompt))
+        return full_prompt
+
+    @staticmethod
+    def _missing(team: Mapping[str, List[Dict[str, str]]], emails: Dict[str, Dict[str, str]]) -> List[str]:
+        missing = [employee_id for employee_id in team if employee_id not in emails]
+        if missing:
+            logger.info("Generating %d of %d team emails one employee at a time", len(missing), len(team))
+        return missing
+
+    def generate_team_emails(self, user_id: str, prompt: str, team: Mapping[str, List[Dict[str, str]]]) -> Dict[str, Dict[str, str]]:
+        """
+        Generate a nudge email for each employee of a team, several per completion.
+
+        Employees are packed into groups (see pack_team) and each group is written in
+        one JSON-mode completion that carries the shared instructions once. Employees
+        whose entry is missing or unparseable, and groups of one, are generated with
+        generate_email instead.
+
+        Args:
+            user_id (str): The user's unique identifier.
+            prompt (str): The prompt for generating the emails.
+            team (Mapping[str, List[Dict[str, str]]]): Prepared nudges by employee id.
+
+        Returns:
+            Dict[str, Dict[str, str]]: Subject and body by employee id, in the order of ``team``.
+
+        Raises:
+            RuntimeError: If the OpenAI API call fails.
+        """
+        emails: Dict[str, Dict[str, str]] = {}
+        for group in self.pack_team(prompt, team):
+            if len(group) > 1:
+                emails.update(self._complete_team(self._team_prompt(user_id, prompt, group), [e for e, _ in group]))
+        for employee_id in self._missing(team, emails):
+            emails[employee_id] = self.generate_email(user_id, prompt, team[employee_id])
+        return {employee_id: emails[employee_id] for employee_id in team}
+
+    def _complete_team(self, full_prompt: str, employee_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        try:
+            with span("nudge_email.team_completion"):
+                response = chat_completion(
+                    self.client, self.scheduler, full_prompt, json_mode=True,
+                    completion_tokens=COMPLETION_TOKEN_ESTIMATE * len(employee_ids),
+                )
+            content = response.choices[0].message.content
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate nudge emails with OpenAI API: {e}")
+        return self.parse_team_emails(content, employee_ids)
+
+    @staticmethod
+    def parse_email(content: str) -> Dict[str, str]:
+        """
+        Split a completion into subject and body.
+        """
+        # Assuming the response content is structured with a subject and body
+        lines = content.split("\n")
+        subject_line = next((line for line in lines if line.lower().startswith("subject:")), "Subject: No Subject")
+        subject = subject_line.split(":", 1)[1].strip() if ":" in subject_line else "No Subject"
+        body = "\n".join(line for line in lines if not line.lower().startswith("subject:"))
+        return {"subject": subject, "body": body}
 
     def generate_email(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> Dict[str, str]:
         """
@@ -182,31 +563,198 @@ class NudgeEmailGenerator:
         Raises:
             RuntimeError: If the OpenAI API call fails.
         """
-        nudge_texts = "\n\n".join(
-            f"Title: {n['title']}\nInstructions: {n['instructions']}\nMetrics: {n['metrics']}"
-            for n in nudges
-        )
-        full_prompt = (
-            f"{prompt}\n\n"
-            f"Nudges for the Employee Sally:\n{nudge_texts}\n\n"
-            "Write a complete and polished email to the employee addressing the nudges. "
-            "The email should be professional, concise, and provide clear next steps."
-            "The nudges are things the writer needs to do for their team member and this email is them addressing them and reaching out to their team member."
-        )
+        full_prompt = self._budgeted_prompt(user_id, prompt, nudges)
+        return dict(self.flights.do(flight_key("generate_nudge_email", full_prompt), lambda: self._complete(full_prompt)))
+
+    def _complete(self, full_prompt: str) -> Dict[str, str]:
+        try:
+            with span("nudge_email.completion"):
+                response = chat_completion(self.client, self.scheduler, full_prompt)
+            content = response.choices[0].message.content
+            return self.parse_email(content)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate nudge email with OpenAI API: {e}")
+
+    def stream_email(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> Iterator[tuple]:
+        """
+        Streaming variant of generate_email.
+
+        Yields ``("subject", text)`` as soon as the model's subject line is complete
+        and ``("token", text)`` for body text, using SubjectLineParser.
+        """
+        full_prompt = self._budgeted_prompt(user_id, prompt, nudges)
+        parser = SubjectLineParser()
+        try:
+            with span("openai.stream_open"):
+                stream = chat_completion(self.client, self.scheduler, full_prompt, stream=True)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield from parser.feed(chunk.choices[0].delta.content)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate nudge email with OpenAI API: {e}")
+        yield from parser.finish()
+
+
+class AsyncEmailGenerator(EmailGenerator):
+    """
+    asyncio variant of EmailGenerator using AsyncOpenAI and an AsyncUserVectorStore.
+
+    Prompt construction and scoring are inherited; every network call is awaited.
+    """
+    def __init__(self, openai_api_key: str, vector_store: AsyncUserVectorStore, client: Optional["AsyncOpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
+        self.client = client or default_openai_client(openai_api_key, asynchronous=True)
+        self.vector_store = vector_store
+        self.scheduler = scheduler
+        self.flights = AsyncSingleFlight()
+
+    async def embed_prompt(self, prompt: str) -> List[float]:
+        cached = (await self.vector_store.get_cached_embeddings([prompt], EMBEDDING_MODEL))[0]
+        if cached is not None:
+            return cached
+        try:
+            response = await acreate_embeddings(self.client, self.scheduler, [prompt])
+            embedding = response.data[0].embedding
+        except Exception as e:
+            raise RuntimeError(f"Failed to embed prompt with OpenAI API: {e}")
+        await self.vector_store.cache_embeddings([prompt], [embedding], EMBEDDING_MODEL)
+        return embedding
+
+    async def retrieve_style_context(self, user_id: str, prompt_embedding: List[float], top_k: int = 3) -> List[str]:
+        return (await self.retrieve_style_contexts(user_id, [prompt_embedding], top_k))[0]
 
-        print("[generate_email] Full prompt sent to OpenAI:\n", full_prompt)
+    async def retrieve_style_contexts(self, user_id: str, prompt_embeddings: List[List[float]], top_k: int = 3) -> List[List[str]]:
+        with span("generate.load_style"):
+            matrix = await self.vector_store.get_style_matrix(user_id)
+        if not len(matrix):
+            return [[] for _ in prompt_embeddings]
+        with span("generate.score"):
+            rows = matrix.nearest(np.asarray(prompt_embeddings, dtype=np.float32), top_k)
+        return [[matrix.texts[i] for i in row] for row in rows]
+
+    async def select_style_context(self, user_id: str, prompt_embedding: List[float]) -> List[str]:
+        with span("generate.load_style"):
+            matrix = await self.vector_store.get_style_matrix(user_id)
+        with span("generate.select_context"):
+            return self._select_context(matrix, prompt_embedding)
+
+    async def prepare_prompt(self, user_id: str, subject: str, user_prompt: str) -> str:
+        full_input = f"Subject: {subject}\n\n{user_prompt}"
+        with span("generate.embed_prompt"):
+            prompt_embedding = await self.embed_prompt(full_input)
+        context = await self.select_style_context(user_id, prompt_embedding)
+        if not context:
+            raise RuntimeError(f"No style data found for user '{user_id}'. Please seed user style first.")
+        return self.build_prompt(context, full_input)
+
+    async def generate_email(self, user_id: str, subject: str, user_prompt: str) -> Dict[str, str]:
+        key = flight_key("generate_email", user_id, subject, user_prompt)
+        return dict(await self.flights.do(key, lambda: self._generate_email(user_id, subject, user_prompt)))
+
+    async def _generate_email(self, user_id: str, subject: str, user_prompt: str) -> Dict[str, str]:
+        full_prompt = await self.prepare_prompt(user_id, subject, user_prompt)
+        try:
+            with span("generate.completion"):
+                response = await achat_completion(self.client, self.scheduler, full_prompt)
+            content = response.choices[0].message.content
+            return {"subject": "Generated Email", "body": content}
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate email with OpenAI API: {e}")
+
+    async def stream_email(self, user_id: str, subject: str, user_prompt: str) -> AsyncIterator[tuple]:
+        full_prompt = await self.prepare_prompt(user_id, subject, user_prompt)
+        yield ("subject", "Generated Email")
+        try:
+            with span("openai.stream_open"):
+                stream = await achat_completion(self.client, self.scheduler, full_prompt, stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield ("token", chunk.choices[0].delta.content)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate email with OpenAI API: {e}")
+
+
+class AsyncNudgeSummaryGenerator(NudgeSummaryGenerator):
+    """
+    asyncio variant of NudgeSummaryGenerator using AsyncOpenAI.
+    """
+    def __init__(self, openai_api_key: str, vector_store: AsyncUserVectorStore, client: Optional["AsyncOpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
+        self.client = client or default_openai_client(openai_api_key, asynchronous=True)
+        self.vector_store = vector_store
+        self.scheduler = scheduler
+        self.flights = AsyncSingleFlight()
+
+    async def generate_summary(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> Dict[str, str]:
+        full_prompt = self._budgeted_prompt(user_id, prompt, nudges)
+        return dict(await self.flights.do(flight_key("generate_summary", full_prompt), lambda: self._complete(full_prompt)))
+
+    async def _complete(self, full_prompt: str) -> Dict[str, str]:
+        try:
+            with span("nudge_summary.completion"):
+                response = await achat_completion(self.client, self.scheduler, full_prompt)
+            content = response.choices[0].message.content
+            return {"summary": content}
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate summary with OpenAI API: {e}")
+
+
+class AsyncNudgeEmailGenerator(NudgeEmailGenerator):
+    """
+    asyncio variant of NudgeEmailGenerator using AsyncOpenAI.
+    """
+    def __init__(self, openai_api_key: str, vector_store: AsyncUserVectorStore, client: Optional["AsyncOpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
+        self.client = client or default_openai_client(openai_api_key, asynchronous=True)
+        self.vector_store = vector_store
+        self.scheduler = scheduler
+        self.flights = AsyncSingleFlight()
+
+    async def generate_email(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> Dict[str, str]:
+        full_prompt = self._budgeted_prompt(user_id, prompt, nudges)
+        return dict(await self.flights.do(flight_key("generate_nudge_email", full_prompt), lambda: self._complete(full_prompt)))
+
+    async def _complete(self, full_prompt: str) -> Dict[str, str]:
+        try:
+            with span("nudge_email.completion"):
+                response = await achat_completion(self.client, self.scheduler, full_prompt)
+            content = response.choices[0].message.content
+            return self.parse_email(content)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate nudge email with OpenAI API: {e}")
+
+    async def generate_team_emails(self, user_id: str, prompt: str, team: Mapping[str, List[Dict[str, str]]]) -> Dict[str, Dict[str, str]]:
+        emails: Dict[str, Dict[str, str]] = {}
+        groups = [group for group in self.pack_team(prompt, team) if len(group) > 1]
+        for result in await asyncio.gather(*(
+            self._complete_team(self._team_prompt(user_id, prompt, group), [e for e, _ in group]) for group in groups
+        )):
+            emails.update(result)
+        missing = self._missing(team, emails)
+        fallback = await asyncio.gather(*(self.generate_email(user_id, prompt, team[employee_id]) for employee_id in missing))
+        emails.update(zip(missing, fallback))
+        return {employee_id: emails[employee_id] for employee_id in team}
+
+    async def _complete_team(self, full_prompt: str, employee_ids: List[str]) -> Dict[str, Dict[str, str]]:
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": full_prompt}],
-                temperature=0.7,
-            )
+            with span("nudge_email.team_completion"):
+                response = await achat_completion(
+                    self.client, self.scheduler, full_prompt, json_mode=True,
+                    completion_tokens=COMPLETION_TOKEN_ESTIMATE * len(employee_ids),
+                )
             content = response.choices[0].message.content
-            # Assuming the response content is structured with a subject and body
-            lines = content.split("\n")
-            subject_line = next((line for line in lines if line.lower().startswith("subject:")), "Subject: No Subject")
-            subject = subject_line.split(":", 1)[1].strip() if ":" in subject_line else "No Subject"
-            body = "\n".join(line for line in lines if not line.lower().startswith("subject:"))
-            return {"subject": subject, "body": body}
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate nudge emails with OpenAI API: {e}")
+        return self.parse_team_emails(content, employee_ids)
+
+    async def stream_email(self, user_id: str, prompt: str, nudges: List[Dict[str, str]]) -> AsyncIterator[tuple]:
+        full_prompt = self._budgeted_prompt(user_id, prompt, nudges)
+        parser = SubjectLineParser()
+        try:
+            with span("openai.stream_open"):
+                stream = await achat_completion(self.client, self.scheduler, full_prompt, stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    for event in parser.feed(chunk.choices[0].delta.content):
+                        yield event
         except Exception as e:
             raise RuntimeError(f"Failed to generate nudge email with OpenAI API: {e}")
+        for event in parser.finish():
+            yield event
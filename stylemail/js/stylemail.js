@@ -1,22 +1,120 @@
 const { spawn } = require("child_process");
 const path = require("path");
+const readline = require("readline");
 
-function runPythonCommand(args, callback) {
-  const script = path.join(__dirname, "../stylemail/cli.py");
-  const proc = spawn("python3", [script, ...args]);
+// Runs `python -m stylemail.cli worker` once and sends every call to it as a line of
+// JSON tagged with a request id. Calls run concurrently in the worker and responses
+// are matched back by id, so only the first call pays interpreter startup and imports.
+class StyleMailWorker {
+  constructor({ python = process.env.STYLEMAIL_PYTHON || "python3", cwd = path.join(__dirname, "../.."), env = process.env } = {}) {
+    this.python = python;
+    this.cwd = cwd;
+    this.env = env;
+    this.proc = null;
+    this.nextId = 1;
+    this.pending = new Map();
+  }
 
-  let output = "";
-  proc.stdout.on("data", (data) => (output += data.toString()));
-  proc.stderr.on("data", (data) => console.error(data.toString()));
-  proc.on("close", () => callback(output.trim()));
+  start() {
+    if (this.proc) return this.proc;
+    const proc = spawn(this.python, ["-m", "stylemail.cli", "worker"], {
+      cwd: this.cwd,
+      env: this.env,
+      stdio: ["pipe", "pipe", "inherit"],
+    });
+    readline.createInterface({ input: proc.stdout }).on("line", (line) => this.onLine(line));
+    proc.on("error", (err) => this.onExit(proc, err));
+    // Writing to a worker that died or never started fails with EPIPE; fail its calls instead of the host
+    proc.stdin.on("error", (err) => this.onExit(proc, err));
+    proc.on("exit", (code, signal) => this.onExit(proc, new Error(`stylemail worker exited (${signal || code})`)));
+    this.proc = proc;
+    return proc;
+  }
+
+  onLine(line) {
+    let response;
+    try {
+      response = JSON.parse(line);
+    } catch (err) {
+      console.error(`stylemail worker sent an unreadable line: ${line}`);
+      return;
+    }
+    const call = this.pending.get(response.id);
+    if (!call) return;
+    this.pending.delete(response.id);
+    if (response.error) {
+      const err = new Error(response.error.message);
+      err.type = response.error.type;
+      call.reject(err);
+    } else {
+      call.resolve(response.result);
+    }
+    this.setIdle();
+  }
+
+  onExit(proc, err) {
+    // A crashed worker fails its calls; the next call starts a fresh one
+    if (this.proc !== proc) return;
+    this.proc = null;
+    for (const call of this.pending.values()) call.reject(err);
+    this.pending.clear();
+  }
+
+  // An idle worker does not keep the Node process alive
+  setIdle() {
+    if (!this.proc) return;
+    const method = this.pending.size ? "ref" : "unref";
+    for (const handle of [this.proc, this.proc.stdin, this.proc.stdout]) handle[method]();
+  }
+
+  call(method, params) {
+    const proc = this.start();
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      this.setIdle();
+      proc.stdin.write(JSON.stringify({ id, method, params }) + "\n");
+      // The worker may already be gone, in which case onExit has run and nothing will answer
+      if (this.proc !== proc && this.pending.delete(id)) reject(new Error("stylemail worker is not running"));
+    });
+  }
+
+  close() {
+    if (this.proc) this.proc.stdin.end();
+  }
+}
+
+let shared = null;
+
+function defaultWorker() {
+  if (!shared) shared = new StyleMailWorker();
+  return shared;
+}
+
+// Returns a promise; a node-style callback(err, result) is also called when given.
+// Breaking change: callbacks used to receive the CLI's printed output as their only
+// argument. They now receive (err, result), with result the parsed JSON object, so a
+// callback written as `(output) => ...` gets null. generateEmail also takes a subject
+// before the prompt, as the Python API does.
+function withCallback(promise, callback) {
+  if (callback) promise.then((result) => callback(null, result), (err) => callback(err));
+  return promise;
 }
 
 function seedUserStyle(userId, samples, callback) {
-  runPythonCommand(["seed", userId, ...samples], callback);
+  return withCallback(defaultWorker().call("seed", { user_id: userId, samples }), callback);
+}
+
+function generateEmail(userId, subject, prompt, callback) {
+  return withCallback(defaultWorker().call("generate", { user_id: userId, subject, prompt }), callback);
+}
+
+function generateNudgeEmail(userId, prompt, nudges, callback) {
+  return withCallback(defaultWorker().call("nudge_email", { user_id: userId, prompt, nudges }), callback);
 }
 
-function generateEmail(userId, prompt, callback) {
-  runPythonCommand(["generate", userId, prompt], callback);
+function generateNudgeSummary(userId, prompt, nudges, callback) {
+  return withCallback(defaultWorker().call("nudge_summary", { user_id: userId, prompt, nudges }), callback);
 }
 
-module.exports = { seedUserStyle, generateEmail };
+module.exports = { StyleMailWorker, seedUserStyle, generateEmail, generateNudgeEmail, generateNudgeSummary };
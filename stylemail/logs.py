@@ -0,0 +1,126 @@
+"""
+Logging setup for the service and the CLI.
+
+Modules log through ``logging.getLogger(__name__)`` with %-style arguments, so a
+message is only formatted when its level is enabled, and never log nudge payloads
+or prompts at INFO. configure_logging() hands records to a QueueHandler; a
+QueueListener thread writes them out, so a request never waits on stderr. Levels
+can be set per logger (``stylemail.generator=DEBUG,uvicorn=WARNING``).
+
+Full prompts are off by default. capture_prompt() writes the prompt of a sampled
+fraction of completions to the ``stylemail.prompts`` logger; with the rate at 0
+it returns after one comparison.
+"""
+import atexit
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, TextIO
+
+PROMPT_LOGGER = "stylemail.prompts"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_prompts = logging.getLogger(PROMPT_LOGGER)
+_prompt_sample_rate = 0.0
+_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+_leveled: List[str] = []
+_atexit_registered = False
+
+
+def _level(name: str) -> int:
+    level = logging.getLevelName(name.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {name!r}")
+    return level
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """
+    Parse per-logger levels such as ``"stylemail.generator=DEBUG, uvicorn=WARNING"``.
+
+    Raises:
+        ValueError: If an entry is not ``logger=LEVEL`` or names an unknown level.
+    """
+    levels: Dict[str, int] = {}
+    for entry in (spec or "").split(","):
+        if not entry.strip():
+            continue
+        name, sep, level = entry.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Log level entries look like logger=LEVEL, got {entry.strip()!r}")
+        levels[name.strip()] = _level(level)
+    return levels
+
+
+def configure_logging(
+    level: str = "INFO",
+    levels: str = "",
+    prompt_sample_rate: float = 0.0,
+    stream: Optional[TextIO] = None,
+) -> None:
+    """
+    Route log records through a background queue and apply the configured levels.
+
+    Calling it again replaces the previous setup.
+
+    Args:
+        level (str): Root log level.
+        levels (str): Per-logger overrides, see parse_levels.
+        prompt_sample_rate (float): Fraction (0-1) of completion prompts to log in full.
+        stream (Optional[TextIO]): Where records are written; stderr by default.
+
+    Raises:
+        ValueError: If a level is unknown or the sample rate is outside 0-1.
+    """
+    global _handler, _listener, _prompt_sample_rate, _atexit_registered
+    if not 0.0 <= prompt_sample_rate <= 1.0:
+        raise ValueError("prompt_sample_rate must be between 0 and 1")
+    root_level = _level(level)
+    overrides = parse_levels(levels)
+
+    shutdown_logging()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, output)
+    _listener.start()
+    _handler = QueueHandler(records)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(root_level)
+    for name, value in overrides.items():
+        logging.getLogger(name).setLevel(value)
+        _leveled.append(name)
+    _prompt_sample_rate = prompt_sample_rate
+
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+
+
+def shutdown_logging() -> None:
+    """Detach the queue handler and flush the records still queued; safe to call twice."""
+    global _handler, _listener, _prompt_sample_rate
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for name in _leveled:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    _leveled.clear()
+    _prompt_sample_rate = 0.0
+
+
+def capture_prompt(prompt: str, model: str) -> None:
+    """Log ``prompt`` in full for a sampled fraction of calls (see configure_logging)."""
+    if _prompt_sample_rate <= 0.0 or not _prompts.isEnabledFor(logging.INFO):
+        return
+    if _prompt_sample_rate < 1.0 and random.random() >= _prompt_sample_rate:
+        return
+    _prompts.info("Prompt sent to %s (%d chars):\n%s", model, len(prompt), prompt)
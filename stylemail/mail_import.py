@@ -0,0 +1,258 @@
+import email
+import html
+import logging
+import mailbox
+import os
+import random
+import re
+from dataclasses import dataclass
+from email.message import Message
+from email.utils import getaddresses
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# (report) -> None, called every ``progress_every`` messages and once at the end
+ImportProgressCallback = Callable[["ImportReport"], None]
+
+# Lines that start the quoted original in a reply or forward; everything after is dropped
+_REPLY_MARKERS = [
+    re.compile(r"^On\b.{0,200}\bwrote:\s*$", re.DOTALL),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Forwarded message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^Begin forwarded message:", re.IGNORECASE),
+    re.compile(r"^_{20,}\s*$"),
+    re.compile(r"^From:\s.+\n(Sent|Date):\s", re.IGNORECASE),
+]
+# Lines that start a signature or client footer
+_SIGNATURE_MARKERS = [
+    re.compile(r"^--\s?$"),
+    re.compile(r"^Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^Get Outlook for \w+", re.IGNORECASE),
+]
+_BLOCK_TAGS = re.compile(r"<\s*(br|/p|/div|/li|/tr|/h\d)\b[^>]*>", re.IGNORECASE)
+_HIDDEN_TAGS = re.compile(r"<(style|script|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TAGS = re.compile(r"<[^>]+>")
+
+
+def strip_quoted_text(text: str) -> str:
+    """
+    Return only what the author wrote in an email body.
+
+    Drops ``>``-quoted lines, cuts at the first reply/forward header (``On ... wrote:``,
+    ``-----Original Message-----``, Outlook ``From:/Sent:`` blocks) and at the
+    signature delimiter or a "Sent from my ..." footer, and collapses blank lines.
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    kept: List[str] = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        # "On <date>, <name> wrote:" is often wrapped onto two lines
+        pair = stripped + ("\n" + lines[i + 1].strip() if i + 1 < len(lines) else "")
+        if any(m.match(stripped) or m.match(pair) for m in _REPLY_MARKERS):
+            break
+        if any(m.match(line.rstrip("\n")) for m in _SIGNATURE_MARKERS):
+            break
+        if stripped.startswith(">"):
+            continue
+        kept.append(line.rstrip())
+    body = "\n".join(kept).strip()
+    return re.sub(r"\n{3,}", "\n\n", body)
+
+
+def html_to_text(markup: str) -> str:
+    """Crude HTML-to-text conversion, enough to recover prose from HTML-only messages."""
+    markup = _HIDDEN_TAGS.sub("", markup)
+    markup = _BLOCK_TAGS.sub("\n", markup)
+    text = html.unescape(_TAGS.sub("", markup))
+    return re.sub(r"[ \t]+", " ", text)
+
+
+def message_body(message: Message) -> Optional[str]:
+    """Return the message's plain-text body, falling back to its HTML part; None if it has neither."""
+    fallback = None
+    for part in message.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type not in ("text/plain", "text/html"):
+            continue
+        payload = part.get_payload(decode=True)
+        if payload is None:
+            continue
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            text = payload.decode(charset, errors="replace")
+        except LookupError:
+            text = payload.decode("utf-8", errors="replace")
+        if content_type == "text/plain":
+            return text
+        if fallback is None:
+            fallback = html_to_text(text)
+    return fallback
+
+
+def _eml_files(directory: str) -> Iterator[str]:
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".eml"):
+                yield os.path.join(root, name)
+
+
+def iter_messages(path: str) -> Iterator[Message]:
+    """
+    Yield messages one at a time from an mbox file, a maildir, a single .eml file
+    or a directory tree of .eml files.
+
+    Messages are parsed as they are reached, so only one is held in memory at a time.
+    """
+    if os.path.isdir(path):
+        if all(os.path.isdir(os.path.join(path, sub)) for sub in ("cur", "new", "tmp")):
+            box = mailbox.Maildir(path, factory=None, create=False)
+            for key in box.iterkeys():
+                yield box.get_message(key)
+            return
+        for filename in _eml_files(path):
+            with open(filename, "rb") as f:
+                yield email.message_from_binary_file(f)
+        return
+    if not os.path.exists(path):
+        raise ValueError(f"Mailbox not found: {path}")
+    if path.lower().endswith(".eml"):
+        with open(path, "rb") as f:
+            yield email.message_from_binary_file(f)
+        return
+    box = mailbox.mbox(path, create=False)
+    try:
+        for key in box.iterkeys():
+            yield box.get_message(key)
+    finally:
+        box.close()
+
+
+@dataclass
+class ImportReport:
+    """Running totals for a mailbox import."""
+    messages: int = 0
+    samples: int = 0
+    skipped: int = 0
+    stored: int = 0
+
+    def as_dict(self) -> dict:
+        return {"messages": self.messages, "samples": self.samples, "skipped": self.skipped, "stored": self.stored}
+
+
+class MailboxImporter:
+    """
+    Seed a user's style from their mail archive.
+
+    Messages are read lazily from each path, bodies are reduced to the text the
+    user actually wrote, and the samples that pass the filters are streamed into
+    the seeder's bulk path, which deduplicates and embeds them in chunks. Memory
+    stays bounded by the seeder's in-flight chunks (or by ``limit`` when sampling).
+    """
+
+    def __init__(
+        self,
+        seeder,
+        sender: Optional[Sequence[str]] = None,
+        min_chars: int = 40,
+        max_chars: int = 4000,
+        limit: Optional[int] = None,
+        progress: Optional[ImportProgressCallback] = None,
+        progress_every: int = 1000,
+        random_seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            seeder: A StyleSeeder (the sync bulk seeding path).
+            sender: Only use messages sent from one of these addresses (e.g. the user's own),
+                so replies received from others do not pollute the style.
+            min_chars (int): Skip bodies shorter than this once quotes and signatures are removed.
+            max_chars (int): Skip bodies longer than this (pasted documents, newsletters).
+            limit (int): Seed a uniform random sample of at most this many bodies instead of all of them.
+            progress: Optional callback receiving the ImportReport as the import advances.
+            progress_every (int): Messages between progress callbacks.
+            random_seed (int): Seed for the sampling, for reproducible imports.
+        """
+        if isinstance(sender, str):
+            sender = [sender]
+        self.seeder = seeder
+        self.senders = {s.lower() for s in sender} if sender else None
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.limit = limit
+        self.progress = progress
+        self.progress_every = max(1, progress_every)
+        self.random = random.Random(random_seed)
+
+    def _accepts(self, message: Message) -> bool:
+        if message.get("Auto-Submitted", "no").lower() != "no":
+            return False
+        if message.get("Precedence", "").lower() in ("bulk", "list", "junk"):
+            return False
+        if self.senders is not None:
+            addresses = {addr.lower() for _, addr in getaddresses(message.get_all("From", []))}
+            if not addresses & self.senders:
+                return False
+        return True
+
+    def _sample(self, message: Message) -> Optional[str]:
+        if not self._accepts(message):
+            return None
+        body = message_body(message)
+        if body is None:
+            return None
+        text = strip_quoted_text(body)
+        if not self.min_chars <= len(text) <= self.max_chars:
+            return None
+        return text
+
+    def samples(self, paths: Iterable[str], report: Optional[ImportReport] = None) -> Iterator[str]:
+        """Yield cleaned writing samples from every message under ``paths``, updating ``report``."""
+        report = report if report is not None else ImportReport()
+        for path in paths:
+            for message in iter_messages(path):
+                report.messages += 1
+                try:
+                    text = self._sample(message)
+                except Exception as e:
+                    # One malformed message should not abort a multi-GB import
+                    logger.warning("Skipping unreadable message in %s: %s", path, e)
+                    text = None
+                if text is None:
+                    report.skipped += 1
+                else:
+                    report.samples += 1
+                    yield text
+                if self.progress and report.messages % self.progress_every == 0:
+                    self.progress(report)
+
+    def _reservoir(self, samples: Iterable[str]) -> List[str]:
+        chosen: List[str] = []
+        for seen, text in enumerate(samples):
+            if len(chosen) < self.limit:
+                chosen.append(text)
+            else:
+                slot = self.random.randint(0, seen)
+                if slot < self.limit:
+                    chosen[slot] = text
+        return chosen
+
+    def run(self, user_id: str, paths: Iterable[str]) -> ImportReport:
+        """
+        Import every message under ``paths`` into the user's style store.
+
+        Raises:
+            ValueError: If a path does not exist.
+            RuntimeError: If embedding fails.
+        """
+        report = ImportReport()
+        samples = self.samples(paths, report)
+        if self.limit:
+            samples = self._reservoir(samples)
+        report.stored = self.seeder.seed_user_style(user_id, samples, streaming=True)
+        if self.progress:
+            self.progress(report)
+        return report
@@ -0,0 +1,261 @@
+"""
+Stage timings and counters, exposed in the Prometheus text format.
+
+Code marks the stages of a request with ``with span("generate.embed_prompt"):``.
+Instrumentation is off until configure() turns it on (the server does this at
+startup); while off, span() hands back one shared no-op object, so an
+instrumented stage costs a function call and nothing else. When OpenTelemetry is
+enabled every span is also opened on the ``stylemail`` tracer; exporting those
+spans is left to whatever OpenTelemetry SDK the process configures.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional; spans are only timed locally
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) for stage timings, from a Redis hit to a slow completion
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter per label combination."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Histogram:
+    """Bucketed distribution per label combination, with sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return state[2] if state else 0
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            values = {k: ([*v[0]], v[1], v[2]) for k, v in self._values.items()}
+        for label_values, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {count}"
+
+
+class _Collected:
+    """Values read from a callback at scrape time, for counters other components already keep."""
+
+    def __init__(self, name: str, help: str, kind: str, labels: Sequence[str], collect: Callable[[], Dict[tuple, float]]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def lines(self) -> Iterator[str]:
+        for label_values, value in sorted(self.collect().items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class MetricsRegistry:
+    """Named metrics plus the switches that decide whether spans record anything."""
+
+    def __init__(self):
+        self.enabled = False
+        self.tracer = None
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def collector(self, name: str, help: str, kind: str, labels: Sequence[str], collect: Callable[[], Dict[tuple, float]]) -> None:
+        """Expose values computed by ``collect`` on every scrape; replaces any collector of the same name."""
+        with self._lock:
+            self._metrics[name] = _Collected(name, help, kind, labels, collect)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out: List[str] = []
+        for metric in metrics:
+            try:
+                lines = list(metric.lines())
+            except Exception as e:
+                # A failing collector must not take the whole scrape down
+                logger.warning("Metrics collector %s failed: %s", metric.name, e)
+                continue
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("stylemail_stage_seconds", "Time spent in each stage of a request.", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("stylemail_stage_errors_total", "Stages that ended with an exception.", ("stage",))
+OPENAI_TOKENS = REGISTRY.counter("stylemail_openai_tokens_total", "Tokens reported by the OpenAI API.", ("model", "kind"))
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("stage", "start", "otel")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.otel = None
+
+    def __enter__(self):
+        if REGISTRY.tracer is not None:
+            self.otel = REGISTRY.tracer.start_as_current_span(self.stage)
+            self.otel.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if REGISTRY.enabled:
+            STAGE_SECONDS.observe(time.perf_counter() - self.start, self.stage)
+            if exc_type is not None:
+                STAGE_ERRORS.inc(self.stage)
+        if self.otel is not None:
+            self.otel.__exit__(exc_type, exc, tb)
+        return False
+
+
+def span(stage: str):
+    """Context manager timing ``stage``; a shared no-op while instrumentation is off."""
+    if not REGISTRY.enabled and REGISTRY.tracer is None:
+        return _NOOP
+    return _Span(stage)
+
+
+def record_usage(model: str, response) -> None:
+    """Count the prompt and completion tokens an OpenAI response reports (streams report none)."""
+    if not REGISTRY.enabled:
+        return
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    if prompt_tokens:
+        OPENAI_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+    if completion_tokens:
+        OPENAI_TOKENS.inc(model, "completion", amount=completion_tokens)
+
+
+def configure(enabled: bool = True, otel: bool = False) -> None:
+    """
+    Turn stage timings and token counters on or off, and optionally mirror spans to OpenTelemetry.
+
+    Raises:
+        ValueError: If ``otel`` is requested but opentelemetry-api is not installed.
+    """
+    if otel and trace is None:
+        raise ValueError("OpenTelemetry export requires the opentelemetry-api package")
+    REGISTRY.enabled = enabled
+    REGISTRY.tracer = trace.get_tracer("stylemail") if otel else None
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def stats_collector(sources: Dict[str, Callable[[], Dict[str, float]]], keys: Optional[Sequence[str]] = None) -> Callable[[], Dict[Tuple[str, str], float]]:
+    """
+    Adapt ``stats()`` methods into a collector keyed by (source, key).
+
+    ``sources`` maps a label to a zero-argument callable returning a stats dict;
+    only numeric entries (and only ``keys`` when given) are exported.
+    """
+    def collect():
+        values = {}
+        for source, stats in sources.items():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and (keys is None or key in keys):
+                    values[(source, key)] = value
+        return values
+    return collect
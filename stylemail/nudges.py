@@ -0,0 +1,241 @@
+import json
+from json.encoder import encode_basestring
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from stylemail.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# "Key: value" fields inside a prepared metrics string; values may themselves contain commas
+_METRIC_FIELD = re.compile(r", (?=[A-Z][A-Za-z ]*: )")
+NO_INSTRUCTIONS = "No Instructions"
+
+
+class Nudge(Mapping):
+    """
+    One prepared nudge, parsed once from the nudge API payload.
+
+    Behaves as a read-only ``{"title", "instructions", "metrics"}`` mapping, so it
+    can go anywhere a prepared nudge dict is accepted, but keeps the structured
+    fields and memoises its canonical JSON, which both prompt compaction and the
+    summary cache key reuse instead of re-serialising.
+    """
+
+    __slots__ = (
+        "title", "instructions", "threshold", "date_from", "date_to",
+        "prior_from", "prior_to", "metric", "unit", "operator", "metrics", "_canonical",
+    )
+    KEYS = ("title", "instructions", "metrics")
+
+    def __init__(
+        self,
+        title: str = "No Title",
+        instructions: str = NO_INSTRUCTIONS,
+        threshold: Any = "N/A",
+        date_from: Any = "N/A",
+        date_to: Any = "N/A",
+        prior_from: Any = "N/A",
+        prior_to: Any = "N/A",
+        metric: Any = "N/A",
+        unit: Any = "N/A",
+        operator: Any = "N/A",
+    ):
+        self.title = title
+        self.instructions = instructions
+        self.threshold = threshold
+        self.date_from = date_from
+        self.date_to = date_to
+        self.prior_from = prior_from
+        self.prior_to = prior_to
+        self.metric = metric
+        self.unit = unit
+        self.operator = operator
+        self.metrics = (
+            f"Threshold: {threshold}, Date Range: {date_from} to {date_to}, "
+            f"Prior Date Range: {prior_from} to {prior_to}, "
+            f"Metric: {metric}, Unit: {unit}, Operator: {operator}"
+        )
+        self._canonical: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, nudge: dict) -> "Nudge":
+        """Parse one entry of the nudge API's ``data`` list."""
+        config = nudge.get("config") or {}
+        get = config.get
+        date_range = get("dateRange") or {}
+        prior = get("priorDateRange") or {}
+        return cls(
+            get("message", "No Title"),
+            get("metaData", NO_INSTRUCTIONS),
+            get("threshold", "N/A"),
+            date_range.get("from", "N/A"),
+            date_range.get("to", "N/A"),
+            prior.get("from", "N/A"),
+            prior.get("to", "N/A"),
+            get("metric", "N/A"),
+            get("unit", "N/A"),
+            get("operator", "N/A"),
+        )
+
+    def __getitem__(self, key: str) -> str:
+        if key in self.KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"Nudge(title={self.title!r}, instructions={self.instructions!r}, metrics={self.metrics!r})"
+
+    def canonical(self) -> str:
+        """Sorted-key compact JSON of the mapping, identical to canonical_json(dict(self))."""
+        if self._canonical is None:
+            if isinstance(self.title, str) and isinstance(self.instructions, str):
+                # Hand-assembled in sorted key order; the C string encoder is what json.dumps uses
+                self._canonical = (
+                    f'{{"instructions":{encode_basestring(self.instructions)},'
+                    f'"metrics":{encode_basestring(self.metrics)},'
+                    f'"title":{encode_basestring(self.title)}}}'
+                )
+            else:
+                self._canonical = canonical_json(dict(self))
+        return self._canonical
+
+
+def canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def canonical_nudge(nudge: Mapping) -> str:
+    """Canonical JSON of a prepared nudge, memoised for Nudge instances."""
+    if isinstance(nudge, Nudge):
+        return nudge.canonical()
+    return canonical_json(dict(nudge))
+
+
+def parse_nudges(nudge_data: dict) -> List[Nudge]:
+    """Parse the nudge API payload in a single pass."""
+    return [Nudge.from_api(nudge) for nudge in nudge_data.get("data") or ()]
+
+
+def prepare_nudges(nudge_data: dict) -> List[Nudge]:
+    """Flatten the nudge API payload into title/instructions/metrics mappings for the generators."""
+    return parse_nudges(nudge_data)
+
+
+def nudge_snippet(nudges: List[Dict[str, str]]) -> str:
+    """The comparison key stored alongside a summary; a changed snippet means the summary is stale."""
+    return ", ".join([nudge.get("title", "No Title") for nudge in nudges])
+
+
+@dataclass
+class NudgePrompt:
+    """An assembled nudge prompt and what went into it."""
+    text: str
+    tokens: int
+    included: int
+    omitted: int
+
+
+def _metric_fields(metrics: str) -> List[Tuple[str, str]]:
+    fields = []
+    for part in _METRIC_FIELD.split(metrics):
+        key, sep, value = part.partition(": ")
+        fields.append((key, value) if sep else ("", part))
+    return fields
+
+
+def _join_fields(fields: List[Tuple[str, str]]) -> str:
+    return ", ".join(f"{key}: {value}" if key else value for key, value in fields)
+
+
+def compact_nudges(nudges: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], str]:
+    """
+    Shrink prepared nudges without losing information the model needs.
+
+    Exact duplicates are dropped and ``N/A`` metric fields removed. Metric fields
+    identical across every nudge (typically the date ranges) are hoisted into one
+    shared line, and instructions repeated verbatim from an earlier nudge are
+    replaced by a reference to it. Nudges with instructions come before those
+    without; order is otherwise kept.
+
+    Returns:
+        The compacted nudges and the shared metrics line ("" when there is none).
+    """
+    unique = list({canonical_nudge(n): n for n in nudges}.values())
+    unique.sort(key=lambda n: n.get("instructions", NO_INSTRUCTIONS) in ("", NO_INSTRUCTIONS))
+    fields = [[f for f in _metric_fields(n.get("metrics", "")) if f[1] != "N/A"] for n in unique]
+
+    shared: List[Tuple[str, str]] = []
+    if len(unique) > 1:
+        shared = [f for f in fields[0] if f[0] and all(f in other for other in fields[1:])]
+        fields = [[f for f in own if f not in shared] for own in fields]
+
+    compacted = []
+    first_title: Dict[str, str] = {}
+    for nudge, own in zip(unique, fields):
+        instructions = nudge.get("instructions", NO_INSTRUCTIONS)
+        if instructions in first_title and instructions != NO_INSTRUCTIONS:
+            instructions = f'Same as "{first_title[instructions]}"'
+        else:
+            first_title.setdefault(instructions, nudge.get("title", "No Title"))
+        compacted.append({
+            "title": nudge.get("title", "No Title"),
+            "instructions": instructions,
+            "metrics": _join_fields(own) if own else ("see shared metrics" if shared else "N/A"),
+        })
+    return compacted, _join_fields(shared)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * CHARS_PER_TOKEN].rstrip() + "..."
+
+
+def build_nudge_prompt(
+    assemble: Callable[[str], str],
+    nudges: List[Dict[str, str]],
+    render: Callable[[Dict[str, str]], str],
+    separator: str,
+    budget: int,
+    max_instruction_tokens: int,
+) -> NudgePrompt:
+    """
+    Assemble a nudge prompt that fits in ``budget`` tokens.
+
+    Nudges are compacted (see compact_nudges), overly long instructions are cut to
+    ``max_instruction_tokens``, and nudges are then added in rank order while they
+    fit; the first one is always kept. A closing line tells the model how many were
+    left out.
+
+    Args:
+        assemble: Wraps the joined nudge block in the rest of the prompt.
+        nudges: Prepared nudges (see prepare_nudges).
+        render: Formats one nudge.
+        separator: Joins rendered nudges.
+        budget (int): Token budget for the whole prompt.
+        max_instruction_tokens (int): Cap on a single nudge's instructions.
+    """
+    compacted, shared = compact_nudges(nudges)
+    header = [f"Shared metrics for all nudges: {shared}"] if shared else []
+    entries = [render(dict(n, instructions=_truncate(n["instructions"], max_instruction_tokens))) for n in compacted]
+
+    used = estimate_tokens(assemble(separator.join(header)))
+    kept = []
+    for entry in entries:
+        cost = estimate_tokens(entry + separator)
+        if kept and used + cost > budget:
+            continue
+        kept.append(entry)
+        used += cost
+    omitted = len(entries) - len(kept)
+    footer = [f"({omitted} more nudges omitted for length)"] if omitted else []
+
+    text = assemble(separator.join(header + kept + footer))
+    return NudgePrompt(text=text, tokens=estimate_tokens(text), included=len(kept), omitted=omitted)
@@ -0,0 +1,427 @@
+import asyncio
+import heapq
+import itertools
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from stylemail.config import CHAT_MODEL, EMBEDDING_MODEL
+from stylemail.logs import capture_prompt
+from stylemail.metrics import record_usage, span
+from stylemail.tokens import estimate_batch_tokens, estimate_tokens
+
+# Lower values are served first
+INTERACTIVE = 0
+BATCH = 10
+
+_priority: ContextVar[int] = ContextVar("openai_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """
+    Run OpenAI calls made inside the block (and in asyncio tasks started from it) at ``priority``.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    requests_per_minute: float
+    tokens_per_minute: float
+
+
+class RateLimitedError(RuntimeError):
+    """OpenAI kept answering 429 after every retry; ``retry_after`` is the last suggested wait."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills continuously at ``per_minute / 60`` per second up to ``per_minute``."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        # May go negative when actual usage exceeds the estimate; later callers wait it off
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _Lane:
+    """Budgets and wait queue for one model."""
+
+    def __init__(self, limit: Optional[RateLimit]):
+        self.requests = TokenBucket(limit.requests_per_minute) if limit else None
+        self.tokens = TokenBucket(limit.tokens_per_minute) if limit else None
+        self.queue: List[Tuple[int, int]] = []
+        self.paused_until = 0.0
+        self.head_wait = 0.0
+
+
+class OpenAIScheduler:
+    """
+    Client-side RPM/TPM budgeting for OpenAI calls, shared by every generator and seeder.
+
+    Each model gets a request bucket and a token bucket. Callers pass an estimate of
+    the tokens a call will consume; they queue by priority (see request_priority)
+    and then FIFO, and only the head of a model's queue may draw from its buckets,
+    so a large batch cannot starve interactive requests. Once a response reports
+    its usage the token bucket is corrected to the actual count. 429s, 5xx and
+    connection errors are retried with jittered exponential backoff, waiting at
+    least as long as the Retry-After header asks and pausing the whole model
+    meanwhile. Models without a configured limit are not throttled but still retried.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        max_retries: int = 4,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Args:
+            limits (Dict[str, RateLimit]): Budget per model name.
+            max_retries (int): Retries after the first attempt for retryable failures.
+            backoff (float): Base delay in seconds for exponential backoff.
+            max_backoff (float): Cap on a single backoff delay.
+        """
+        self.limits = dict(limits or {})
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lanes: Dict[str, _Lane] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rate_limited = 0
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _Lane(self.limits.get(model))
+        return lane
+
+    def _enqueue(self, model: str) -> Tuple[int, int]:
+        ticket = (_priority.get(), next(self._seq))
+        with self._lock:
+            heapq.heappush(self._lane(model).queue, ticket)
+        return ticket
+
+    def _dequeue(self, model: str, ticket: Tuple[int, int]) -> None:
+        with self._lock:
+            lane = self._lane(model)
+            if ticket in lane.queue:
+                lane.queue.remove(ticket)
+                heapq.heapify(lane.queue)
+
+    def _try_acquire(self, model: str, ticket: Tuple[int, int], tokens: int) -> float:
+        """Take budget for ``ticket`` and return 0, or return how long to wait before asking again."""
+        with self._lock:
+            lane = self._lane(model)
+            if lane.queue[0] != ticket:
+                # Wake no sooner than the head could, but recheck in case it was cancelled
+                return min(max(lane.head_wait, 0.01), 1.0)
+            now = time.monotonic()
+            wait = lane.paused_until - now
+            if lane.requests is not None:
+                wait = max(wait, lane.requests.wait_time(1, now), lane.tokens.wait_time(tokens, now))
+            if wait > 0:
+                lane.head_wait = wait
+                return wait
+            if lane.requests is not None:
+                lane.requests.take(1)
+                lane.tokens.take(tokens)
+            heapq.heappop(lane.queue)
+            lane.head_wait = 0.0
+            return 0.0
+
+    def _acquire(self, model: str, tokens: int) -> None:
+        ticket = self._enqueue(model)
+        waited = False
+        try:
+            while True:
+                wait = self._try_acquire(model, ticket, tokens)
+                if not wait:
+                    break
+                waited = True
+                time.sleep(wait)
+        except BaseException:
+            self._dequeue(model, ticket)
+            raise
+        self.throttled += waited
+
+    async def _aacquire(self, model: str, tokens: int) -> None:
+        ticket = self._enqueue(model)
+        waited = False
+        try:
+            while True:
+                wait = self._try_acquire(model, ticket, tokens)
+                if not wait:
+                    break
+                waited = True
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._dequeue(model, ticket)
+            raise
+        self.throttled += waited
+
+    def _reconcile(self, model: str, tokens: int, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if not isinstance(actual, int):
+            return
+        with self._lock:
+            lane = self._lane(model)
+            if lane.tokens is not None:
+                lane.tokens.take(actual - tokens)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000.0
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def _retry_delay(self, model: str, error: Exception, attempt: int) -> Optional[float]:
+        """Delay before retrying ``error``, or None if it should not be retried."""
+        status = getattr(error, "status_code", None)
+        # An OpenAI connection error means openai is already imported; never import it just to check
+        openai = sys.modules.get("openai")
+        connection_error = openai is not None and isinstance(error, openai.APIConnectionError)
+        if not (status == 429 or (status is not None and status >= 500) or connection_error):
+            return None
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt)) * (0.5 + random.random())
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if status == 429:
+            self.rate_limited += 1
+            with self._lock:
+                lane = self._lane(model)
+                lane.paused_until = max(lane.paused_until, time.monotonic() + delay)
+        return delay
+
+    def _rate_limited(self, error: Exception, model: str) -> Optional[RateLimitedError]:
+        if getattr(error, "status_code", None) == 429:
+            return RateLimitedError(f"OpenAI rate limit exceeded for {model}: {error}", self._retry_after(error))
+        return None
+
+    def call(self, fn: Callable[[], Any], model: str, tokens: int) -> Any:
+        """
+        Run ``fn`` (one OpenAI request) once budget allows, retrying retryable failures.
+
+        Args:
+            fn: Zero-argument callable making the request.
+            model (str): Model the request is billed against.
+            tokens (int): Estimated tokens the request will consume (prompt plus expected output).
+
+        Raises:
+            RateLimitedError: If the request was still rate limited after every retry.
+        """
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            with span("openai.wait"):
+                self._acquire(model, tokens)
+            try:
+                response = fn()
+            except Exception as e:
+                delay = self._retry_delay(model, e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    limited = self._rate_limited(e, model)
+                    if limited is not None:
+                        raise limited from e
+                    raise
+                self.retries += 1
+                time.sleep(delay)
+            else:
+                self._reconcile(model, tokens, response)
+                return response
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], model: str, tokens: int) -> Any:
+        """asyncio variant of call; ``fn`` returns an awaitable."""
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            with span("openai.wait"):
+                await self._aacquire(model, tokens)
+            try:
+                response = await fn()
+            except Exception as e:
+                delay = self._retry_delay(model, e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    limited = self._rate_limited(e, model)
+                    if limited is not None:
+                        raise limited from e
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                self._reconcile(model, tokens, response)
+                return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = {model: len(lane.queue) for model, lane in self._lanes.items()}
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+            "queued": queued,
+        }
+
+
+# Completions are budgeted before their length is known; this is a typical email/summary
+COMPLETION_TOKEN_ESTIMATE = 500
+
+
+def default_openai_client(openai_api_key: str, asynchronous: bool = False):
+    """
+    A standalone OpenAI (or AsyncOpenAI) client for callers that were not handed a shared one.
+
+    openai takes about a second to import, so it is only imported here and in
+    stylemail.clients, when a client is first built.
+    """
+    if asynchronous:
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=openai_api_key)
+    from openai import OpenAI
+    return OpenAI(api_key=openai_api_key)
+
+
+def _completion_options(stream: bool, json_mode: bool) -> Dict[str, Any]:
+    extra: Dict[str, Any] = {"stream": True} if stream else {}
+    if json_mode:
+        extra["response_format"] = {"type": "json_object"}
+    return extra
+
+
+def chat_completion(
+    client,
+    scheduler: Optional[OpenAIScheduler],
+    prompt: str,
+    stream: bool = False,
+    json_mode: bool = False,
+    completion_tokens: int = COMPLETION_TOKEN_ESTIMATE,
+) -> Any:
+    """
+    Send ``prompt`` as a single user message, through ``scheduler`` when one is given.
+
+    ``json_mode`` asks the model for a single JSON object, and ``completion_tokens``
+    is the expected completion size charged to the token budget up front.
+    """
+    extra = _completion_options(stream, json_mode)
+    capture_prompt(prompt, CHAT_MODEL)
+
+    def request():
+        return client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            **extra,
+        )
+
+    if scheduler is None:
+        response = request()
+    else:
+        response = scheduler.call(request, CHAT_MODEL, estimate_tokens(prompt, CHAT_MODEL) + completion_tokens)
+    if not stream:
+        record_usage(CHAT_MODEL, response)
+    return response
+
+
+async def achat_completion(
+    client,
+    scheduler: Optional[OpenAIScheduler],
+    prompt: str,
+    stream: bool = False,
+    json_mode: bool = False,
+    completion_tokens: int = COMPLETION_TOKEN_ESTIMATE,
+) -> Any:
+    """asyncio variant of chat_completion for an AsyncOpenAI client."""
+    extra = _completion_options(stream, json_mode)
+    capture_prompt(prompt, CHAT_MODEL)
+
+    def request():
+        return client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            **extra,
+        )
+
+    if scheduler is None:
+        response = await request()
+    else:
+        response = await scheduler.acall(request, CHAT_MODEL, estimate_tokens(prompt, CHAT_MODEL) + completion_tokens)
+    if not stream:
+        record_usage(CHAT_MODEL, response)
+    return response
+
+
+def create_embeddings(client, scheduler: Optional[OpenAIScheduler], texts: List[str]) -> Any:
+    """Embed ``texts`` in one request, through ``scheduler`` when one is given."""
+    def request():
+        return client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+
+    if scheduler is None:
+        response = request()
+    else:
+        response = scheduler.call(request, EMBEDDING_MODEL, estimate_batch_tokens(texts, EMBEDDING_MODEL))
+    record_usage(EMBEDDING_MODEL, response)
+    return response
+
+
+async def acreate_embeddings(client, scheduler: Optional[OpenAIScheduler], texts: List[str]) -> Any:
+    """asyncio variant of create_embeddings for an AsyncOpenAI client."""
+    def request():
+        return client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+
+    if scheduler is None:
+        response = await request()
+    else:
+        response = await scheduler.acall(request, EMBEDDING_MODEL, estimate_batch_tokens(texts, EMBEDDING_MODEL))
+    record_usage(EMBEDDING_MODEL, response)
+    return response
@@ -1,27 +1,229 @@
-from openai import OpenAI
-from typing import List
-from stylemail.vectorstore import UserVectorStore
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import TYPE_CHECKING, AsyncIterable, Iterable, List, Optional, Set, Tuple, Union
+from stylemail.config import EMBEDDING_MODEL
+from stylemail.metrics import span
+from stylemail.scheduler import OpenAIScheduler, acreate_embeddings, create_embeddings, default_openai_client
+from stylemail.tokens import estimate_tokens
+from stylemail.vectorstore import UserVectorStore, AsyncUserVectorStore, hash_text
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+# OpenAI accepts at most 2048 inputs per embeddings request; the token cap keeps a
+# single request well inside the per-request limit and the TPM budget.
+MAX_CHUNK_INPUTS = 2048
+MAX_CHUNK_TOKENS = 100_000
+DEFAULT_CONCURRENCY = 4
+
+
+class _Chunker:
+    """
+    Groups a stream of samples into embedding-request-sized chunks.
+
+    Empty samples and samples already seen earlier in the stream (by doc id) are
+    dropped. Only doc ids are remembered, so memory stays proportional to the
+    number of distinct samples rather than their size.
+    """
+
+    def __init__(self, max_inputs: int = MAX_CHUNK_INPUTS, max_tokens: int = MAX_CHUNK_TOKENS):
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.seen: Set[str] = set()
+        self.chunk: List[str] = []
+        self.tokens = 0
+
+    def add(self, text: str) -> Optional[List[str]]:
+        """Add one sample; return the previous chunk when this one would overflow it."""
+        if not isinstance(text, str):
+            raise ValueError("samples must be a list of non-empty strings")
+        if not text:
+            return None
+        doc_id = hash_text(text)
+        if doc_id in self.seen:
+            return None
+        self.seen.add(doc_id)
+        tokens = estimate_tokens(text, EMBEDDING_MODEL)
+        full = None
+        if self.chunk and (len(self.chunk) >= self.max_inputs or self.tokens + tokens > self.max_tokens):
+            full = self.flush()
+        self.chunk.append(text)
+        self.tokens += tokens
+        return full
+
+    def flush(self) -> Optional[List[str]]:
+        chunk, self.chunk, self.tokens = self.chunk, [], 0
+        return chunk or None
+
+
+def chunk_samples(samples: Iterable[str], max_inputs: int = MAX_CHUNK_INPUTS, max_tokens: int = MAX_CHUNK_TOKENS) -> Iterable[List[str]]:
+    """Lazily split samples into deduplicated chunks of at most max_inputs samples and max_tokens tokens."""
+    chunker = _Chunker(max_inputs, max_tokens)
+    for text in samples:
+        chunk = chunker.add(text)
+        if chunk:
+            yield chunk
+    chunk = chunker.flush()
+    if chunk:
+        yield chunk
 
 
 class StyleSeeder:
-    def __init__(self, openai_api_key: str, vector_store: UserVectorStore):
-        self.client = OpenAI(api_key=openai_api_key)
+    # Per-request chunk limits; override on an instance to tune bulk seeding
+    chunk_inputs = MAX_CHUNK_INPUTS
+    chunk_tokens = MAX_CHUNK_TOKENS
+
+    def __init__(self, openai_api_key: str, vector_store: UserVectorStore, client: Optional["OpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
+        self.client = client or default_openai_client(openai_api_key)
         self.vector_store = vector_store
+        self.scheduler = scheduler
 
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, reusing cached embeddings by content hash.
+
+        Only texts missing from the embedding cache (deduplicated) are sent to the API.
+        """
+        embeddings, missing, fresh = self._embed_missing(texts)
+        if missing:
+            self.vector_store.cache_embeddings(missing, fresh, EMBEDDING_MODEL)
+        return embeddings
+
+    def _embed_missing(self, texts: List[str]) -> Tuple[List[List[float]], List[str], List[List[float]]]:
+        """Return (embeddings for texts, texts that were not cached, their new embeddings) without caching them."""
+        embeddings = self.vector_store.get_cached_embeddings(texts, EMBEDDING_MODEL)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        if not missing:
+            return embeddings, [], []
+
         try:
-            response = self.client.embeddings.create(
-                input=texts,
-                model="text-embedding-ada-002"
-            )
-            return [d.embedding for d in response.data]
+            with span("seed.embed"):
+                response = create_embeddings(self.client, self.scheduler, missing)
+            fresh = dict(zip(missing, (d.embedding for d in response.data)))
         except Exception as e:
             raise RuntimeError(f"Failed to embed texts with OpenAI API: {e}")
+        return [e if e is not None else fresh[t] for t, e in zip(texts, embeddings)], missing, [fresh[t] for t in missing]
+
+    def _seed_chunk(self, user_id: str, chunk: List[str]) -> int:
+        with span("seed.chunk"):
+            stored = self.vector_store.existing_doc_ids(user_id, [hash_text(t) for t in chunk])
+            texts = [t for t in chunk if hash_text(t) not in stored]
+            if not texts:
+                return 0
+            embeddings, missing, fresh = self._embed_missing(texts)
+            self.vector_store.store_embeddings(user_id, texts, embeddings, cache=(missing, fresh, EMBEDDING_MODEL))
+            return len(texts)
 
-    def seed_user_style(self, user_id: str, samples: List[str]) -> None:
+    def seed_user_style(self, user_id: str, samples: Iterable[str], streaming: bool = False, concurrency: int = DEFAULT_CONCURRENCY) -> int:
         """
         Embed and store a user's writing samples in the Redis vector store.
+
+        Samples are deduplicated by doc id, both within the input and against what is
+        already stored for the user, then split into token-bounded chunks that are
+        embedded concurrently and written with one Redis round trip per chunk.
+
+        Args:
+            user_id (str): The user to seed.
+            samples (Iterable[str]): Writing samples. With ``streaming=True`` any iterator
+                is accepted and consumed lazily, at most ``concurrency`` chunks ahead.
+            streaming (bool): Consume ``samples`` lazily instead of reading it up front.
+            concurrency (int): Chunks embedded and stored at the same time.
+
+        Returns:
+            int: Number of new samples stored.
         """
-        embeddings = self.embed_texts(samples)
-        for text, emb in zip(samples, embeddings):
-            self.vector_store.store_embedding(user_id, text, emb)
+        if not streaming:
+            samples = list(samples)
+        stored = 0
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            pending = set()
+            try:
+                for chunk in chunk_samples(samples, self.chunk_inputs, self.chunk_tokens):
+                    if len(pending) >= concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        stored += sum(f.result() for f in done)
+                    # Pool threads start with an empty context; carry over the caller's request_priority
+                    pending.add(pool.submit(copy_context().run, self._seed_chunk, user_id, chunk))
+                stored += sum(f.result() for f in pending)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        return stored
+
+
+class AsyncStyleSeeder(StyleSeeder):
+    """
+    asyncio variant of StyleSeeder using AsyncOpenAI and an AsyncUserVectorStore.
+    """
+    def __init__(self, openai_api_key: str, vector_store: AsyncUserVectorStore, client: Optional["AsyncOpenAI"] = None, scheduler: Optional[OpenAIScheduler] = None):
+        self.client = client or default_openai_client(openai_api_key, asynchronous=True)
+        self.vector_store = vector_store
+        self.scheduler = scheduler
+
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        embeddings, missing, fresh = await self._embed_missing(texts)
+        if missing:
+            await self.vector_store.cache_embeddings(missing, fresh, EMBEDDING_MODEL)
+        return embeddings
+
+    async def _embed_missing(self, texts: List[str]) -> Tuple[List[List[float]], List[str], List[List[float]]]:
+        embeddings = await self.vector_store.get_cached_embeddings(texts, EMBEDDING_MODEL)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        if not missing:
+            return embeddings, [], []
+
+        try:
+            with span("seed.embed"):
+                response = await acreate_embeddings(self.client, self.scheduler, missing)
+            fresh = dict(zip(missing, (d.embedding for d in response.data)))
+        except Exception as e:
+            raise RuntimeError(f"Failed to embed texts with OpenAI API: {e}")
+        return [e if e is not None else fresh[t] for t, e in zip(texts, embeddings)], missing, [fresh[t] for t in missing]
+
+    async def _seed_chunk(self, user_id: str, chunk: List[str]) -> int:
+        with span("seed.chunk"):
+            stored = await self.vector_store.existing_doc_ids(user_id, [hash_text(t) for t in chunk])
+            texts = [t for t in chunk if hash_text(t) not in stored]
+            if not texts:
+                return 0
+            embeddings, missing, fresh = await self._embed_missing(texts)
+            await self.vector_store.store_embeddings(user_id, texts, embeddings, cache=(missing, fresh, EMBEDDING_MODEL))
+            return len(texts)
+
+    async def _chunks(self, samples: Union[Iterable[str], AsyncIterable[str]]):
+        chunker = _Chunker(self.chunk_inputs, self.chunk_tokens)
+        if hasattr(samples, "__aiter__"):
+            async for text in samples:
+                chunk = chunker.add(text)
+                if chunk:
+                    yield chunk
+        else:
+            for text in samples:
+                chunk = chunker.add(text)
+                if chunk:
+                    yield chunk
+        chunk = chunker.flush()
+        if chunk:
+            yield chunk
+
+    async def seed_user_style(self, user_id: str, samples: Union[Iterable[str], AsyncIterable[str]], streaming: bool = False, concurrency: int = DEFAULT_CONCURRENCY) -> int:
+        """Async variant of StyleSeeder.seed_user_style; ``samples`` may also be an async iterable."""
+        if not streaming and not hasattr(samples, "__aiter__"):
+            samples = list(samples)
+        stored = 0
+        pending = set()
+        try:
+            async for chunk in self._chunks(samples):
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    stored += sum(t.result() for t in done)
+                pending.add(asyncio.ensure_future(self._seed_chunk(user_id, chunk)))
+            if pending:
+                stored += sum(await asyncio.gather(*pending))
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        return stored
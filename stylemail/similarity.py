@@ -0,0 +1,96 @@
+import numpy as np
+from typing import List, Optional, Sequence
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Scale each row (or a single vector) to unit L2 norm as float32.
+
+    Zero vectors are left untouched so they simply score 0 against everything.
+    """
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return the indices of the k highest scores along the last axis, best first.
+
+    Uses argpartition so only the selected k entries are sorted. Accepts a 1-D
+    score vector or a 2-D (queries x samples) score matrix.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def cosine_scores(matrix: np.ndarray, queries) -> np.ndarray:
+    """
+    Score pre-normalized sample rows against one or many queries.
+
+    Args:
+        matrix (np.ndarray): (n_samples, dim) unit-norm embeddings.
+        queries: a single (dim,) embedding or a (n_queries, dim) batch.
+
+    Returns:
+        np.ndarray: (n_samples,) scores for a single query, else (n_queries, n_samples).
+    """
+    return normalize_rows(queries) @ matrix.T
+
+
+def mmr_select(
+    embeddings: np.ndarray,
+    query,
+    k: int,
+    lambda_mult: float = 0.5,
+    costs: Optional[Sequence[int]] = None,
+    budget: Optional[int] = None,
+) -> List[int]:
+    """
+    Pick up to k rows by maximal marginal relevance, best first.
+
+    Each step takes the row maximising ``lambda_mult * relevance - (1 - lambda_mult) *
+    max similarity to rows already picked``, so near-duplicates of a chosen row lose
+    out to slightly less relevant but different ones. Pairwise similarities are
+    computed once as a single matrix product. With ``costs`` and ``budget`` only rows
+    that still fit in the remaining budget are considered.
+
+    Args:
+        embeddings (np.ndarray): (n, dim) unit-norm candidate rows.
+        query: (dim,) query embedding.
+        k (int): Maximum rows to pick.
+        lambda_mult (float): 1.0 is pure relevance, 0.0 pure diversity.
+        costs: Per-row cost (e.g. tokens), aligned with ``embeddings``.
+        budget (int): Maximum total cost of the picked rows.
+    """
+    n = len(embeddings)
+    if n == 0 or k <= 0:
+        return []
+    relevance = cosine_scores(embeddings, query)
+    pairwise = embeddings @ embeddings.T
+    remaining = np.inf if budget is None else float(budget)
+    costs = np.zeros(n) if costs is None else np.asarray(costs, dtype=np.float64)
+    redundancy = np.full(n, -np.inf)
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    while len(picked) < k:
+        candidates = available & (costs <= remaining)
+        if not candidates.any():
+            break
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = np.where(candidates, lambda_mult * relevance - (1 - lambda_mult) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        remaining -= costs[best]
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return picked
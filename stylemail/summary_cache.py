@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Set
+
+from stylemail.config import CHAT_MODEL
+from stylemail.nudges import canonical_json, canonical_nudge, nudge_snippet
+from stylemail.scheduler import BATCH, request_priority
+from stylemail.singleflight import AsyncSingleFlight
+from stylemail.summary_store import SummaryRepository
+
+logger = logging.getLogger(__name__)
+
+
+def summary_cache_key(prompt: str, nudges: List[Dict[str, str]], model: str = CHAT_MODEL) -> str:
+    """
+    Hash of everything that determines a summary: the full prepared nudges, the prompt and the model.
+
+    Nudges are serialised with sorted keys and fixed separators so the same payload always
+    hashes the same regardless of dict ordering. The document is assembled from each
+    nudge's canonical JSON, which Nudge objects compute only once.
+    """
+    # Same bytes as canonical_json({"model": ..., "nudges": [...], "prompt": ...})
+    canonical = (
+        f'{{"model":{canonical_json(model)},'
+        f'"nudges":[{",".join(canonical_nudge(n) for n in nudges)}],'
+        f'"prompt":{canonical_json(prompt)}}}'
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class NudgeSummaryCache:
+    """
+    Stale-while-revalidate cache of nudge summaries on top of SummaryRepository.
+
+    A stored summary whose content hash matches and which is younger than
+    ``fresh_ttl`` is returned as-is. One that is older, or whose nudges have
+    changed since, is still returned while it is younger than ``stale_ttl``, and
+    a replacement is generated in the background, so readers only wait on the
+    model when there is nothing usable stored. Concurrent requests for the same
+    employee and content share one generation.
+    """
+
+    def __init__(
+        self,
+        repository: SummaryRepository,
+        generator,
+        fresh_ttl: float = 24 * 60 * 60,
+        stale_ttl: float = 7 * 24 * 60 * 60,
+        model: str = CHAT_MODEL,
+    ):
+        """
+        Args:
+            repository (SummaryRepository): Durable summary storage.
+            generator: An AsyncNudgeSummaryGenerator (or anything with the same generate_summary).
+            fresh_ttl (float): Seconds a matching summary is served without a refresh.
+            stale_ttl (float): Seconds any stored summary may be served while a refresh runs.
+            model (str): Chat model folded into the cache key.
+        """
+        self.repository = repository
+        self.generator = generator
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.model = model
+        self._flights = AsyncSingleFlight()
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    async def get_summary(self, employee_id: str, prompt: str, nudges: List[Dict[str, str]]) -> Dict[str, str]:
+        """
+        Return {"summary": ...} for the employee's current nudges, generating only when needed.
+
+        With no nudges there is nothing new to summarise, so the stored summary is
+        served as long as it is within ``stale_ttl``.
+
+        Raises:
+            ValueError: If the prompt is empty, or the nudges are empty and no usable summary is stored.
+            RuntimeError: If generation fails and there is no stored summary to fall back on.
+        """
+        if not prompt or not isinstance(prompt, str):
+            raise ValueError("prompt must be a non-empty string")
+
+        record = await asyncio.to_thread(self.repository.get_record, employee_id)
+        if not nudges:
+            age = record.age() if record is not None else None
+            if age is not None and age < self.stale_ttl:
+                if age < self.fresh_ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                return {"summary": record.summary}
+            raise ValueError("nudges must be a list of dictionaries with 'title', 'instructions', and 'metrics' keys")
+
+        key = summary_cache_key(prompt, nudges, self.model)
+        if record is not None:
+            age = record.age()
+            if record.content_hash == key and age < self.fresh_ttl:
+                self.hits += 1
+                return {"summary": record.summary}
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh(employee_id, key, prompt, nudges)
+                return {"summary": record.summary}
+
+        self.misses += 1
+        summary = await asyncio.shield(self._generation(employee_id, key, prompt, nudges))
+        return {"summary": summary}
+
+    def _generation(self, employee_id: str, key: str, prompt: str, nudges: List[Dict[str, str]]) -> asyncio.Task:
+        return self._flights.start((employee_id, key), lambda: self._generate_and_store(employee_id, key, prompt, nudges))
+
+    async def _generate_and_store(self, employee_id: str, key: str, prompt: str, nudges: List[Dict[str, str]]) -> str:
+        result = await self.generator.generate_summary(employee_id, prompt, nudges)
+        await asyncio.to_thread(self.repository.upsert, employee_id, result["summary"], nudge_snippet(nudges), key)
+        return result["summary"]
+
+    def _refresh(self, employee_id: str, key: str, prompt: str, nudges: List[Dict[str, str]]) -> None:
+        if self._flights.inflight((employee_id, key)):
+            return
+        self.refreshes += 1
+        # Nobody is waiting on a background refresh, so it yields to interactive calls
+        with request_priority(BATCH):
+            task = self._generation(employee_id, key, prompt, nudges)
+        self._background.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background summary refresh failed: %s", task.exception())
+
+    async def drain(self) -> None:
+        """Wait for background refreshes to finish (used on shutdown and in tests)."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "coalesced": self._flights.coalesced,
+            "inflight": self._flights.stats()["inflight"],
+        }
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+DB_PATH = "laudio_client1.db"
+
+# Statements are module constants so sqlite3's per-connection statement cache
+# compiles each one once and reuses the prepared statement afterwards.
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS employee_nudge_summary (
+        employee_id INT PRIMARY KEY,
+        created_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        summary TEXT,
+        nudge_snippet TEXT,
+        content_hash TEXT
+    );
+'''
+SELECT_SQL = "SELECT summary, nudge_snippet, content_hash, created_date FROM employee_nudge_summary WHERE employee_id = ?"
+UPSERT_SQL = '''
+    INSERT INTO employee_nudge_summary (employee_id, created_date, summary, nudge_snippet, content_hash)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(employee_id) DO UPDATE SET
+        created_date = excluded.created_date,
+        summary = excluded.summary,
+        nudge_snippet = excluded.nudge_snippet,
+        content_hash = excluded.content_hash
+'''
+# Stay well under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+
+class SummaryRecord(NamedTuple):
+    summary: str
+    nudge_snippet: Optional[str]
+    content_hash: Optional[str]
+    created_date: Optional[str]
+
+    def age(self) -> float:
+        """Seconds since the summary was written; infinite if the timestamp is missing or unreadable."""
+        try:
+            return (datetime.now() - datetime.fromisoformat(str(self.created_date))).total_seconds()
+        except ValueError:
+            return float("inf")
+
+
+class SummaryRepository:
+    """
+    Persistence for employee_nudge_summary.
+
+    Each thread gets its own long-lived connection (sqlite3 connections must not be
+    shared across threads mid-transaction), opened in WAL mode so readers never
+    block the writer. Use it from asyncio code through ``asyncio.to_thread``; the
+    executor's worker threads then each keep one warm connection.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, timeout: float = 30.0):
+        """
+        Args:
+            db_path (str): SQLite database file.
+            timeout (float): Seconds to wait on a locked database before raising.
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread is off only so close() can run from any thread
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def create_table(self) -> None:
+        """Create the employee_nudge_summary table if it doesn't exist."""
+        conn = self._connect()
+        with conn:
+            conn.execute(CREATE_TABLE_SQL)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(employee_nudge_summary)")}
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE employee_nudge_summary ADD COLUMN content_hash TEXT")
+
+    def get_record(self, employee_id: str) -> Optional[SummaryRecord]:
+        """Return the full stored row for an employee, or None."""
+        row = self._connect().execute(SELECT_SQL, (employee_id,)).fetchone()
+        return SummaryRecord(*row) if row else None
+
+    def get(self, employee_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Return the stored (summary, nudge_snippet) for an employee, or None."""
+        record = self.get_record(employee_id)
+        return (record.summary, record.nudge_snippet) if record else None
+
+    def _lookup(self, column: str, employee_ids: Sequence[str]) -> Dict[str, str]:
+        conn = self._connect()
+        values = {}
+        for start in range(0, len(employee_ids), LOOKUP_CHUNK):
+            chunk = list(employee_ids[start:start + LOOKUP_CHUNK])
+            placeholders = ", ".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT employee_id, {column} FROM employee_nudge_summary WHERE employee_id IN ({placeholders})",
+                chunk,
+            )
+            values.update((str(employee_id), value) for employee_id, value in rows)
+        return values
+
+    def get_snippets(self, employee_ids: Sequence[str]) -> Dict[str, str]:
+        """Return {employee_id: nudge_snippet} for every listed employee that already has a summary."""
+        return self._lookup("nudge_snippet", employee_ids)
+
+    def get_content_hashes(self, employee_ids: Sequence[str]) -> Dict[str, Optional[str]]:
+        """Return {employee_id: content_hash} for every listed employee that already has a summary."""
+        return self._lookup("content_hash", employee_ids)
+
+    def upsert(self, employee_id: str, summary: str, nudge_snippet: str, content_hash: Optional[str] = None) -> None:
+        """Insert or replace an employee's summary."""
+        self.upsert_many([(employee_id, summary, nudge_snippet, content_hash)])
+
+    def upsert_many(self, rows: Iterable[Tuple[str, str, str, Optional[str]]]) -> None:
+        """Write (employee_id, summary, nudge_snippet, content_hash) rows in a single transaction."""
+        now = datetime.now().isoformat(" ")
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                UPSERT_SQL,
+                [(employee_id, now, summary, snippet, content_hash) for employee_id, summary, snippet, content_hash in rows],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,57 @@
+import fakeredis
+import numpy as np
+from stylemail.ann import IVFIndex
+from stylemail.benchmarks.ann import synthetic_corpus
+from stylemail.similarity import cosine_scores, top_k_indices
+from stylemail.vectorstore import UserVectorStore
+
+
+def test_ivf_recall_on_clustered_data():
+    corpus = synthetic_corpus(3000, 32, topics=30, spread=0.5)
+    matrix, queries = corpus[:2900], corpus[2900:]
+    index, order = IVFIndex.build(matrix, n_probe=8)
+    matrix = matrix[order]
+
+    found = index.search(matrix, queries, 5)
+    exact = top_k_indices(cosine_scores(matrix, queries), 5)
+
+    recall = np.mean([len(set(f) & set(e)) / 5 for f, e in zip(found, exact)])
+    assert recall >= 0.9
+
+
+def test_ivf_probes_enough_lists_for_k():
+    corpus = synthetic_corpus(200, 8, topics=4)
+    index, order = IVFIndex.build(corpus, n_lists=50, n_probe=1)
+
+    result = index.search(corpus[order], corpus[:3], 20)
+
+    assert result.shape == (3, 20)
+    assert all(len(set(row)) == 20 for row in result)
+    assert index.search(corpus[order], corpus[:1], 500).shape == (1, 200)
+
+
+def test_store_indexes_large_matrices_and_keeps_rows_aligned():
+    store = UserVectorStore(ann_min_samples=100, ann_probes=4)
+    store.redis = fakeredis.FakeRedis()
+    corpus = synthetic_corpus(150, 16, topics=5, spread=0.3)
+    texts = [f"sample {i}" for i in range(150)]
+    store.store_embeddings("u1", texts, corpus)
+
+    matrix = store.get_style_matrix("u1")
+
+    assert matrix.index is not None
+    assert store.get_style_matrix("u1") is matrix
+    for text, row in zip(matrix.texts, matrix.embeddings):
+        assert np.allclose(row, corpus[int(text.split()[1])], atol=1e-6)
+    assert matrix.texts[matrix.nearest(corpus[7:8], 1)[0][0]] == "sample 7"
+
+
+def test_small_matrices_use_exact_search():
+    store = UserVectorStore(ann_min_samples=100)
+    store.redis = fakeredis.FakeRedis()
+    store.store_embeddings("u1", ["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+
+    matrix = store.get_style_matrix("u1")
+
+    assert matrix.index is None
+    assert matrix.nearest(np.array([[0.1, 0.9]], dtype=np.float32), 1).tolist() == [[1]]
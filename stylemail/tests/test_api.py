@@ -1,42 +1,49 @@
-import os
+import fakeredis
 import pytest
-from stylemail.api import seed_user_style, generate_email
+from stylemail.api import seed_user_style, generate_email, generate_nudge_email, generate_nudge_summary
+from stylemail.benchmarks.upstream import ThreadedServer, UpstreamProfile, fake_nudges, upstream_app
+from stylemail.clients import StyleMailClients
 from stylemail.config import Config
+from stylemail.nudges import prepare_nudges
+from stylemail.vectorstore import UserVectorStore
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    """The benchmark OpenAI stand-in, so calls go through the real SDK and wire format."""
+    profile = UpstreamProfile(embedding_latency=0, chat_latency=0, token_delay=0, nudge_latency=0, embedding_dim=16)
+    server = ThreadedServer(upstream_app(profile)).start()
+    yield server
+    server.stop()
 
 
 @pytest.fixture
-def config():
-    return Config.load(
-        redis_url=os.getenv("REDIS_URL", "redis://localhost:6379"),
-        openai_api_key=os.getenv("OPENAI_API_KEY", "sk-test")
-    )
+def clients(upstream, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{upstream.url}/v1")
+    store = UserVectorStore()
+    store.redis = fakeredis.FakeRedis()
+    clients = StyleMailClients(Config.from_env(), store=store)
+    yield clients
+    clients.close()
 
 
-def test_seed_and_generate(monkeypatch, config):
+def test_seed_and_generate(clients):
     """Test happy path for seeding and generating an email."""
-    user_id = "test_user"
     samples = ["Hi there!", "Thanks for your message."]
-    prompt = "Follow up on the proposal"
 
-    # Mock OpenAI embedding and chat
-    monkeypatch.setattr("openai.Embedding.create", lambda **kwargs: {
-        "data": [{"embedding": [0.1] * 1536} for _ in kwargs["input"]]
-    })
-    monkeypatch.setattr("openai.ChatCompletion.create", lambda **kwargs: {
-        "choices": [{"message": {"content": "This is a test email."}}]
-    })
+    assert seed_user_style("test_user", samples, clients=clients) == 2
+    assert seed_user_style("test_user", samples, clients=clients) == 0
+    result = generate_email("test_user", "Proposal", "Follow up on the proposal", clients=clients)
+
+    assert result["subject"] == "Generated Email"
+    assert "word1" in result["body"]
 
-    # Mock Redis vector store methods
-    monkeypatch.setattr("stylemail.vectorstore.UserVectorStore.store_embedding", lambda self, uid, text, emb: None)
-    monkeypatch.setattr("stylemail.vectorstore.UserVectorStore.get_all_embeddings", lambda self, uid: [
-        {"text": s, "embedding": [0.1] * 1536} for s in samples
-    ])
 
-    seed_user_style(user_id, samples, config=config)
-    result = generate_email(user_id, prompt, config=config)
+def test_seed_accepts_a_generator(clients):
+    samples = (text for text in ["Hi there!", "Thanks for your message."])
 
-    assert "body" in result
-    assert "test email" in result["body"].lower()
+    assert seed_user_style("test_user", samples, clients=clients) == 2
 
 
 def test_invalid_inputs():
@@ -45,16 +52,23 @@ def test_invalid_inputs():
     with pytest.raises(ValueError):
         seed_user_style("user", [])
     with pytest.raises(ValueError):
-        generate_email("", "prompt")
+        generate_email("", "subject", "prompt")
     with pytest.raises(ValueError):
-        generate_email("user", "")
-
+        generate_email("user", "", "prompt")
+    with pytest.raises(ValueError):
+        generate_email("user", "subject", "")
 
-def test_missing_style(monkeypatch, config):
-    monkeypatch.setattr("openai.Embedding.create", lambda **kwargs: {
-        "data": [{"embedding": [0.1] * 1536}]
-    })
-    monkeypatch.setattr("stylemail.vectorstore.UserVectorStore.get_all_embeddings", lambda self, uid: [])
 
+def test_missing_style(clients):
     with pytest.raises(RuntimeError, match="No style data found"):
-        generate_email("user123", "prompt", config=config)
+        generate_email("user123", "Subject", "prompt", clients=clients)
+
+
+def test_nudge_email_and_summary(clients):
+    nudges = prepare_nudges(fake_nudges("e1", 3))
+
+    email = generate_nudge_email("test_user", "Write a check-in", nudges, clients=clients)
+    summary = generate_nudge_summary("test_user", "Summarise", nudges, clients=clients)
+
+    assert email["subject"] == "Checking in on this week's items"
+    assert summary["summary"].startswith("Subject:")
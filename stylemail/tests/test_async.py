@@ -0,0 +1,95 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from stylemail.api import aseed_user_style, agenerate_email
+from stylemail.generator import AsyncEmailGenerator, AsyncNudgeEmailGenerator
+from stylemail.vectorstore import AsyncUserVectorStore
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, content="Subject: Hello\nBody text"):
+        self.embedding_calls = 0
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+        self.content = content
+
+    async def _embed(self, input, model):
+        self.embedding_calls += 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, float(len(t) % 3)]) for t in input])
+
+    async def _complete(self, model, messages, temperature):
+        await asyncio.sleep(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+
+@pytest.fixture
+def store():
+    s = AsyncUserVectorStore()
+    s.redis = fakeredis.FakeAsyncRedis()
+    return s
+
+
+def test_async_store_round_trip(store):
+    async def scenario():
+        await store.store_embedding("u1", "Hi there!", [0.0, 2.0])
+        matrix = await store.get_style_matrix("u1")
+        await store.clear_user_data("u1")
+        return matrix, await store.get_style_matrix("u1")
+
+    matrix, cleared = asyncio.run(scenario())
+
+    assert matrix.texts == ["Hi there!"]
+    assert matrix.embeddings.tolist() == [[0.0, 1.0]]
+    assert len(cleared) == 0
+
+
+def test_async_seed_and_generate(store, monkeypatch):
+    client = FakeAsyncOpenAI()
+    monkeypatch.setattr("openai.AsyncOpenAI", lambda api_key: client)
+
+    async def scenario():
+        await aseed_user_style("u1", ["Hi there!", "Thanks!"], store=store, openai_api_key="sk-test")
+        return await agenerate_email("u1", "Hello", "Follow up", store=store, openai_api_key="sk-test")
+
+    result = asyncio.run(scenario())
+
+    assert result == {"subject": "Generated Email", "body": "Subject: Hello\nBody text"}
+    assert client.embedding_calls == 2
+
+
+def test_async_generate_requires_style(store):
+    generator = AsyncEmailGenerator("sk-test", store)
+    generator.client = FakeAsyncOpenAI()
+
+    with pytest.raises(RuntimeError, match="No style data found"):
+        asyncio.run(generator.generate_email("nobody", "Hello", "Follow up"))
+
+
+def test_async_nudge_email_parses_subject(store):
+    generator = AsyncNudgeEmailGenerator("sk-test", store)
+    generator.client = FakeAsyncOpenAI()
+    nudges = [{"title": "T", "instructions": "I", "metrics": "M"}]
+
+    result = asyncio.run(generator.generate_email("u1", "Write it", nudges))
+
+    assert result == {"subject": "Hello", "body": "Body text"}
+
+
+def test_async_team_emails_share_one_completion(store):
+    generator = AsyncNudgeEmailGenerator("sk-test", store)
+    calls = []
+
+    async def complete(model, messages, temperature, response_format=None):
+        calls.append(response_format)
+        content = json.dumps({"emails": [{"employee_id": f"e{i}", "subject": f"S{i}", "body": f"B{i}"} for i in range(3)]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    generator.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=complete)))
+    team = {f"e{i}": [{"title": f"T{i}", "instructions": "I", "metrics": "M"}] for i in range(3)}
+
+    emails = asyncio.run(generator.generate_team_emails("u1", "Write it", team))
+
+    assert emails == {f"e{i}": {"subject": f"S{i}", "body": f"B{i}"} for i in range(3)}
+    assert calls == [{"type": "json_object"}]
@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+from stylemail.batch import NudgeSummaryBatch, RateLimiter
+from stylemail.nudges import nudge_snippet, prepare_nudges
+from stylemail.summary_cache import summary_cache_key
+from stylemail.summary_store import SummaryRepository
+
+
+def payload(*titles):
+    return {"data": [{"config": {"message": title}} for title in titles]}
+
+
+class FakeNudgeApi:
+    def __init__(self, payloads, failing=()):
+        self.payloads = payloads
+        self.failing = set(failing)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def fetch(self, employee_id):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if employee_id in self.failing:
+            raise RuntimeError("nudge API unavailable")
+        return self.payloads.get(employee_id, payload())
+
+
+class FakeSummaryGenerator:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def generate_summary(self, user_id, prompt, nudges):
+        self.calls.append(user_id)
+        if user_id in self.failing:
+            raise RuntimeError("completion failed")
+        return {"summary": f"summary for {user_id}: {len(nudges)} nudges"}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repository = SummaryRepository(str(tmp_path / "summaries.db"))
+    repository.create_table()
+    yield repository
+    repository.close()
+
+
+def run(batch, employee_ids, prompt="Summarise"):
+    return asyncio.run(batch.run(employee_ids, prompt))
+
+
+def test_batch_generates_skips_and_reports_failures(repo):
+    repo.upsert_many([("1", "old summary", "A", summary_cache_key("Summarise", prepare_nudges(payload("A"))))])
+    api = FakeNudgeApi(
+        {"1": payload("A"), "2": payload("A", "B"), "3": payload("C"), "4": payload("D"), "5": payload()},
+        failing={"3"},
+    )
+    generator = FakeSummaryGenerator(failing={"4"})
+    progress = []
+    batch = NudgeSummaryBatch(api.fetch, generator, repository=repo, requests_per_minute=60000,
+                              progress=lambda done, total, e, status: progress.append((done, total, status)))
+
+    report = run(batch, ["1", "2", "3", "4", "5", "2"])
+
+    assert report.total == 5
+    assert report.unchanged == ["1"]
+    assert report.generated == ["2"]
+    assert report.no_nudges == ["5"]
+    assert sorted((f["employee_id"], f["stage"]) for f in report.failures) == [("3", "fetch"), ("4", "generate")]
+    assert sorted(generator.calls) == ["2", "4"]
+    assert repo.get("2") == ("summary for 2: 2 nudges", "A, B")
+    assert [p[0] for p in progress] == [1, 2, 3, 4, 5]
+
+
+def test_batch_replaces_stale_summaries(repo):
+    repo.upsert_many([("7", "old summary", "B", "stale-hash")])
+    batch = NudgeSummaryBatch(FakeNudgeApi({"7": payload("B")}).fetch, FakeSummaryGenerator(),
+                              repository=repo, requests_per_minute=60000)
+
+    report = run(batch, ["7"])
+
+    assert report.generated == ["7"]
+    assert repo.get("7") == ("summary for 7: 1 nudges", "B")
+
+
+def test_batch_bounds_fetch_concurrency_and_writes_in_chunks(repo):
+    ids = [str(i) for i in range(20)]
+    api = FakeNudgeApi({i: payload(f"N{i}") for i in ids})
+    batch = NudgeSummaryBatch(api.fetch, FakeSummaryGenerator(), repository=repo,
+                              fetch_concurrency=3, requests_per_minute=60000, write_batch_size=6)
+
+    report = run(batch, ids)
+
+    assert api.peak <= 3
+    assert sorted(report.generated, key=int) == ids
+    assert repo.get_snippets(ids) == {i: f"N{i}" for i in ids}
+
+
+def test_batch_reports_write_failures(repo, monkeypatch):
+    def locked(rows):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(repo, "upsert_many", locked)
+    batch = NudgeSummaryBatch(FakeNudgeApi({"1": payload("A")}).fetch, FakeSummaryGenerator(),
+                              repository=repo, requests_per_minute=60000)
+
+    report = run(batch, ["1"])
+
+    assert report.generated == []
+    assert report.failures == [{"employee_id": "1", "stage": "write", "error": "database is locked"}]
+
+
+def test_batch_rejects_empty_input(repo):
+    batch = NudgeSummaryBatch(FakeNudgeApi({}).fetch, FakeSummaryGenerator(), repository=repo)
+
+    with pytest.raises(ValueError):
+        run(batch, [], "Summarise")
+    with pytest.raises(ValueError):
+        run(batch, ["1"], "")
+
+
+def test_rate_limiter_spaces_calls():
+    async def scenario():
+        limiter = RateLimiter(per_minute=60 * 50)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 4 / 50 - 0.01
+
+
+def test_nudge_snippet_matches_prepared_titles():
+    assert nudge_snippet(prepare_nudges(payload("A", "B"))) == "A, B"
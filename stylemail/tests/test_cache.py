@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from stylemail.cache import StyleMatrixCache
+from stylemail.generator import EmailGenerator
+from stylemail.seeder import StyleSeeder
+from stylemail.vectorstore import UserVectorStore
+
+
+class Sized:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_version_mismatch_is_a_miss():
+    cache = StyleMatrixCache()
+    cache.put("u1", 1, Sized(10))
+
+    assert cache.get("u1", 2) is None
+    assert cache.get("u1", 1) is not None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = StyleMatrixCache(max_bytes=25)
+    cache.put("a", 1, Sized(10))
+    cache.put("b", 1, Sized(10))
+    cache.get("a", 1)
+    cache.put("c", 1, Sized(10))
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+
+
+def test_evicts_by_entry_count():
+    cache = StyleMatrixCache(max_entries=1)
+    cache.put("a", 1, Sized(1))
+    cache.put("b", 1, Sized(1))
+
+    assert cache.stats()["entries"] == 1
+    assert cache.get("a", 1) is None
+
+
+def test_oversized_matrix_is_not_cached():
+    cache = StyleMatrixCache(max_bytes=5)
+    cache.put("a", 1, Sized(10))
+
+    assert cache.stats()["entries"] == 0
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t)), 1.0]) for t in input])
+
+
+@pytest.fixture
+def store():
+    s = UserVectorStore()
+    s.redis = fakeredis.FakeRedis()
+    return s
+
+
+def fake_client():
+    return SimpleNamespace(embeddings=FakeEmbeddings())
+
+
+def test_prompt_embedding_cached_across_generators(store):
+    first, second = EmailGenerator("sk-test", store), EmailGenerator("sk-test", store)
+    first.client = fake_client()
+    second.client = fake_client()
+
+    prompt = "Subject: Hi\n\nFollow up"
+    first.embed_prompt(prompt)
+    store.embedding_cache._entries.clear()
+    embedding = second.embed_prompt(prompt)
+
+    assert embedding.tolist() == [float(len(prompt)), 1.0]
+    assert second.client.embeddings.calls == []
+    assert store.embedding_cache.stats()["remote_hits"] == 1
+
+
+def test_seeding_skips_duplicate_samples(store):
+    seeder = StyleSeeder("sk-test", store)
+    seeder.client = fake_client()
+
+    seeder.seed_user_style("u1", ["Hi there!", "Thanks!", "Hi there!"])
+    seeder.seed_user_style("u2", ["Thanks!", "Cheers"])
+
+    assert seeder.client.embeddings.calls == [["Hi there!", "Thanks!"], ["Cheers"]]
+    assert len(store.get_style_matrix("u2")) == 2
+
+
+def test_redis_tier_entries_expire(store):
+    store.cache_embeddings(["Hi"], [[1.0, 0.0]], "model")
+
+    assert 0 < store.redis.ttl(store._embedding_key("model", "Hi")) <= store.embedding_cache.ttl
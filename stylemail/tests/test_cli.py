@@ -1,39 +1,56 @@
-import subprocess
 import sys
-import os
+import fakeredis
 import pytest
+from stylemail import cli
+from stylemail.benchmarks.upstream import ThreadedServer, UpstreamProfile, upstream_app
+from stylemail.clients import StyleMailClients
+from stylemail.vectorstore import UserVectorStore
 
 
-import shutil
+@pytest.fixture
+def upstream():
+    profile = UpstreamProfile(embedding_latency=0, chat_latency=0, token_delay=0, nudge_latency=0, embedding_dim=16)
+    server = ThreadedServer(upstream_app(profile)).start()
+    yield server
+    server.stop()
 
-@pytest.mark.skipif(
-    shutil.which("python3") is None or not os.getenv("OPENAI_API_KEY"),
-    reason="Requires real OpenAI key and python3 in PATH"
-)
-def test_cli_seed_and_generate(monkeypatch, tmp_path):
+
+def test_cli_seed_and_generate(upstream, monkeypatch, capsys):
     monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
-    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379")
-
-    # Mock OpenAI
-    monkeypatch.setattr("openai.Embedding.create", lambda **kwargs: {
-        "data": [{"embedding": [0.1] * 1536} for _ in kwargs["input"]]
-    })
-    monkeypatch.setattr("openai.ChatCompletion.create", lambda **kwargs: {
-        "choices": [{"message": {"content": "CLI test email."}}]
-    })
-
-    # Mock Redis
-    monkeypatch.setattr("stylemail.vectorstore.UserVectorStore.store_embedding", lambda self, uid, text, emb: None)
-    monkeypatch.setattr("stylemail.vectorstore.UserVectorStore.get_all_embeddings", lambda self, uid: [
-        {"text": "Thanks!", "embedding": [0.1] * 1536}
-    ])
-
-    result = subprocess.run(
-        [sys.executable, "-m", "stylemail.cli", "generate", "cli_user", "Follow up"],
-        capture_output=True,
-        text=True,
-        cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
-    )
-
-    assert "Generated Email" in result.stdout
-    assert "CLI test email" in result.stdout
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{upstream.url}/v1")
+    redis = fakeredis.FakeRedis()
+
+    def clients(config):
+        store = UserVectorStore()
+        store.redis = redis
+        return StyleMailClients(config, store=store)
+
+    monkeypatch.setattr(cli, "StyleMailClients", clients)
+
+    monkeypatch.setattr(sys, "argv", ["cli", "seed", "cli_user", "Thanks!", "See you soon."])
+    cli.main()
+    monkeypatch.setattr(sys, "argv", ["cli", "generate", "cli_user", "Proposal", "Follow", "up"])
+    cli.main()
+
+    out = capsys.readouterr().out
+    assert "with 2 new of 2 samples" in out
+    assert "Subject: Generated Email" in out
+    assert "word1" in out
+
+
+def test_cli_worker_builds_only_async_clients(monkeypatch):
+    started = []
+
+    def no_sync_clients(config):
+        raise AssertionError("the worker must not build sync clients")
+
+    async def fake_worker(clients, socket_path):
+        started.append((type(clients).__name__, socket_path))
+
+    monkeypatch.setattr(cli, "StyleMailClients", no_sync_clients)
+    monkeypatch.setattr(cli, "run_worker", fake_worker)
+    monkeypatch.setattr(sys, "argv", ["cli", "worker", "--socket=/tmp/w.sock"])
+
+    cli.main()
+
+    assert started == [("AsyncStyleMailClients", "/tmp/w.sock")]
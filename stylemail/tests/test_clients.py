@@ -0,0 +1,56 @@
+import asyncio
+from stylemail.clients import StyleMailClients, AsyncStyleMailClients
+from stylemail.config import Config
+
+
+def make_config(**overrides):
+    settings = {
+        "openai_api_key": "sk-test",
+        "redis_host": "localhost",
+        "redis_port": 6379,
+        "redis_db": None,
+        "redis_password": None,
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def test_clients_share_one_openai_client_and_redis_pool():
+    clients = StyleMailClients(make_config(redis_max_connections=7))
+
+    assert clients.email_generator.client is clients.openai
+    assert clients.seeder.client is clients.openai
+    assert clients.nudge_summary_generator.client is clients.nudge_email_generator.client
+    assert clients.email_generator is clients.email_generator
+    assert clients.store.redis.connection_pool is clients.redis_pool
+    assert clients.redis_pool.max_connections == 7
+    clients.close()
+
+
+def test_openai_client_is_created_lazily():
+    clients = StyleMailClients(make_config(openai_api_key=""))
+
+    assert "openai" not in clients.__dict__
+    clients.close()
+
+
+def test_async_clients_share_one_openai_client():
+    async def scenario():
+        clients = AsyncStyleMailClients(make_config())
+        shared = clients.email_generator.client is clients.seeder.client is clients.openai
+        await clients.aclose()
+        return shared
+
+    assert asyncio.run(scenario())
+
+
+def test_config_from_env(monkeypatch):
+    monkeypatch.setenv("REDIS_PORT", "6380")
+    monkeypatch.setenv("OPENAI_MAX_CONNECTIONS", "12")
+    monkeypatch.delenv("REDIS_DB", raising=False)
+
+    config = Config.from_env()
+
+    assert config.redis_port == 6380
+    assert config.redis_db is None
+    assert config.openai_max_connections == 12
@@ -0,0 +1,10 @@
+from stylemail.benchmarks.load import STREAM_ENDPOINTS, run
+from stylemail.benchmarks.upstream import UpstreamProfile
+
+
+def test_load_harness_drives_stream_endpoints_without_errors():
+    profile = UpstreamProfile(embedding_latency=0, chat_latency=0, token_delay=0, nudge_latency=0, embedding_dim=16)
+    report = run(endpoints=STREAM_ENDPOINTS, concurrency=(2,), requests=4, corpus=(10,), profile=profile)
+
+    assert {row["endpoint"] for row in report["results"]} == {f"/{endpoint}" for endpoint in STREAM_ENDPOINTS}
+    assert all(row["errors"] == 0 for row in report["results"]), report["results"]
@@ -0,0 +1,87 @@
+import io
+import logging
+from types import SimpleNamespace
+import pytest
+from stylemail import logs
+from stylemail.api import generate_nudge_email
+from stylemail.config import Config
+from stylemail.generator import NudgeEmailGenerator
+from stylemail.logs import configure_logging, parse_levels, shutdown_logging
+from stylemail.scheduler import chat_completion
+
+
+@pytest.fixture
+def stream():
+    out = io.StringIO()
+    yield out
+    shutdown_logging()
+
+
+def fake_client(content="Subject: Hi\nBody"):
+    response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+
+
+def test_parse_levels():
+    assert parse_levels(" stylemail.generator=debug, uvicorn=WARNING,") == {
+        "stylemail.generator": logging.DEBUG,
+        "uvicorn": logging.WARNING,
+    }
+    assert parse_levels("") == {}
+    with pytest.raises(ValueError):
+        parse_levels("stylemail.generator")
+    with pytest.raises(ValueError):
+        parse_levels("stylemail=LOUD")
+
+
+def test_records_go_through_the_queue_with_per_module_levels(stream):
+    configure_logging("WARNING", "stylemail.test_logs=DEBUG", stream=stream)
+
+    logging.getLogger("stylemail.test_logs").debug("kept %s", "here")
+    logging.getLogger("stylemail.other").info("dropped")
+    shutdown_logging()
+
+    output = stream.getvalue()
+    assert "DEBUG stylemail.test_logs: kept here" in output
+    assert "dropped" not in output
+    assert logging.getLogger("stylemail.test_logs").level == logging.NOTSET
+
+
+def test_prompts_are_only_captured_when_sampled(stream, monkeypatch):
+    configure_logging("INFO", stream=stream)
+    chat_completion(fake_client(), None, "secret prompt 1")
+
+    configure_logging("INFO", prompt_sample_rate=1.0, stream=stream)
+    chat_completion(fake_client(), None, "sampled prompt 2")
+
+    configure_logging("INFO", prompt_sample_rate=0.5, stream=stream)
+    monkeypatch.setattr(logs.random, "random", lambda: 0.9)
+    chat_completion(fake_client(), None, "secret prompt 3")
+    shutdown_logging()
+
+    output = stream.getvalue()
+    assert "stylemail.prompts: Prompt sent to gpt-4o (16 chars):\nsampled prompt 2" in output
+    assert "secret" not in output
+    with pytest.raises(ValueError):
+        configure_logging(prompt_sample_rate=2)
+
+
+def test_requests_do_not_log_payloads(stream):
+    configure_logging("DEBUG", stream=stream)
+    generator = NudgeEmailGenerator("sk-test", None, client=fake_client())
+    nudges = [{"title": "Overtime", "instructions": "Private detail", "metrics": "42 hours"}]
+
+    generate_nudge_email("u1", "Write a private check-in", nudges, clients=SimpleNamespace(nudge_email_generator=generator))
+    shutdown_logging()
+
+    output = stream.getvalue()
+    assert "generate_nudge_email user=u1 nudges=1" in output
+    assert "Private detail" not in output
+    assert "private check-in" not in output
+
+
+def test_config_repr_hides_secrets():
+    config = Config(openai_api_key="sk-secret", redis_host="localhost", redis_port=6379, redis_db=None, redis_password="hunter2")
+
+    assert "sk-secret" not in repr(config)
+    assert "hunter2" not in repr(config)
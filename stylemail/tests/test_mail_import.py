@@ -0,0 +1,116 @@
+import mailbox
+from email.message import EmailMessage
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from stylemail.mail_import import MailboxImporter, iter_messages, message_body, strip_quoted_text
+from stylemail.seeder import StyleSeeder
+from stylemail.vectorstore import UserVectorStore
+
+BODY = "Thanks for sending the figures over, I will review them tonight and get back to you."
+
+
+def make_message(body, sender="me@example.com", html=None, **headers):
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = "you@example.com"
+    message["Subject"] = "Figures"
+    for name, value in headers.items():
+        message[name.replace("_", "-")] = value
+    message.set_content(body)
+    if html is not None:
+        message.add_alternative(html, subtype="html")
+    return message
+
+
+class RecordingSeeder:
+    def __init__(self):
+        self.samples = []
+
+    def seed_user_style(self, user_id, samples, streaming=False):
+        self.samples.extend(samples)
+        return len(self.samples)
+
+
+def test_strips_quoted_reply_and_signature():
+    text = (
+        "Sounds good to me.\n\nSee you Monday.\n-- \nJane Doe\nCEO\n\n"
+        "On Mon, 1 Jan 2024 at 10:00, Bob <bob@example.com>\nwrote:\n> Shall we meet?\n"
+    )
+    assert strip_quoted_text(text) == "Sounds good to me.\n\nSee you Monday."
+    assert strip_quoted_text("Yes.\n> quoted\nAgreed.\n-----Original Message-----\nFrom: x") == "Yes.\nAgreed."
+    assert strip_quoted_text("Done.\n\nSent from my iPhone") == "Done."
+
+
+def test_html_only_message_falls_back_to_text():
+    message = EmailMessage()
+    message.set_content("<html><style>p {}</style><p>Hello&nbsp;there</p><p>Bye</p></html>", subtype="html")
+
+    assert message_body(message).split() == ["Hello", "there", "Bye"]
+    assert message_body(make_message(BODY, html="<p>ignored</p>")).strip() == BODY
+
+
+def test_reads_mbox_maildir_and_eml_tree(tmp_path):
+    box = mailbox.mbox(str(tmp_path / "sent.mbox"))
+    box.add(make_message(BODY))
+    box.add(make_message("Second"))
+    box.close()
+    maildir = mailbox.Maildir(str(tmp_path / "Maildir"))
+    maildir.add(make_message(BODY))
+    (tmp_path / "eml" / "nested").mkdir(parents=True)
+    (tmp_path / "eml" / "nested" / "a.eml").write_bytes(make_message(BODY).as_bytes())
+    (tmp_path / "eml" / "notes.txt").write_text("not mail")
+
+    assert len(list(iter_messages(str(tmp_path / "sent.mbox")))) == 2
+    assert len(list(iter_messages(str(tmp_path / "Maildir")))) == 1
+    assert len(list(iter_messages(str(tmp_path / "eml")))) == 1
+
+
+def test_importer_filters_senders_automated_and_short_mail(tmp_path):
+    box = mailbox.mbox(str(tmp_path / "all.mbox"))
+    box.add(make_message(BODY))
+    box.add(make_message(BODY + " From someone else.", sender="other@example.com"))
+    box.add(make_message(BODY + " Auto.", Auto_Submitted="auto-replied"))
+    box.add(make_message("Ok"))
+    box.close()
+    seeder = RecordingSeeder()
+    reports = []
+
+    report = MailboxImporter(seeder, sender="Me@Example.com", progress=reports.append, progress_every=2).run("u1", [str(tmp_path / "all.mbox")])
+
+    assert seeder.samples == [BODY]
+    assert report.as_dict() == {"messages": 4, "samples": 1, "skipped": 3, "stored": 1}
+    assert len(reports) == 3
+
+
+def test_limit_seeds_a_bounded_sample(tmp_path):
+    box = mailbox.mbox(str(tmp_path / "sent.mbox"))
+    for i in range(20):
+        box.add(make_message(f"{BODY} Item {i}."))
+    box.close()
+    seeder = RecordingSeeder()
+
+    MailboxImporter(seeder, limit=5, random_seed=1).run("u1", [str(tmp_path / "sent.mbox")])
+
+    assert len(seeder.samples) == 5
+    assert len(set(seeder.samples)) == 5
+
+
+def test_import_streams_into_the_style_store(tmp_path):
+    from stylemail.api import import_mailbox
+
+    store = UserVectorStore()
+    store.redis = fakeredis.FakeRedis()
+    for i in range(3):
+        (tmp_path / f"{i}.eml").write_bytes(make_message(f"{BODY} Number {i}.").as_bytes())
+    (tmp_path / "dupe.eml").write_bytes(make_message(f"{BODY} Number 0.").as_bytes())
+    seeder = StyleSeeder("sk-test", store, client=SimpleNamespace(embeddings=SimpleNamespace(
+        create=lambda input, model: SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0]) for _ in input])
+    )))
+
+    report = import_mailbox("u1", [str(tmp_path)], clients=SimpleNamespace(seeder=seeder))
+
+    assert report.stored == 3
+    assert len(store.get_style_matrix("u1")) == 3
+    with pytest.raises(ValueError, match="not found"):
+        import_mailbox("u1", [str(tmp_path / "missing.mbox")], clients=SimpleNamespace(seeder=seeder))
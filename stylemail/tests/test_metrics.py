@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+import pytest
+from stylemail import metrics
+from stylemail.generator import NudgeEmailGenerator
+from stylemail.metrics import MetricsRegistry, OPENAI_TOKENS, STAGE_ERRORS, STAGE_SECONDS, span
+
+
+@pytest.fixture
+def enabled():
+    metrics.configure(enabled=True)
+    yield
+    metrics.configure(enabled=False)
+
+
+def test_disabled_spans_are_a_shared_no_op():
+    metrics.configure(enabled=False)
+    before = STAGE_SECONDS.count("test.disabled")
+
+    with span("test.disabled"):
+        pass
+
+    assert span("a") is span("b")
+    assert STAGE_SECONDS.count("test.disabled") == before
+
+
+def test_spans_time_stages_and_count_errors(enabled):
+    with span("test.stage"):
+        pass
+    with pytest.raises(KeyError):
+        with span("test.stage"):
+            raise KeyError("boom")
+
+    assert STAGE_SECONDS.count("test.stage") == 2
+    assert STAGE_ERRORS.value("test.stage") == 1
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("h_seconds", "A histogram.", ("stage",), buckets=(0.1, 1.0))
+    counter = registry.counter("c_total", "A counter.", ("name",))
+    histogram.observe(0.05, 'say "hi"')
+    histogram.observe(0.5, 'say "hi"')
+    counter.inc("x", amount=3)
+    registry.collector("broken_total", "Fails.", "counter", (), lambda: 1 / 0)
+    registry.collector("stats_total", "From stats.", "counter", ("source", "key"), metrics.stats_collector({"cache": lambda: {"hits": 4, "name": "x"}}))
+
+    text = registry.render()
+
+    assert "# TYPE h_seconds histogram" in text
+    assert 'h_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 1' in text
+    assert 'h_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 2' in text
+    assert 'h_seconds_count{stage="say \\"hi\\""} 2' in text
+    assert 'c_total{name="x"} 3' in text
+    assert 'stats_total{source="cache",key="hits"} 4' in text
+    assert "broken_total" not in text
+
+
+def test_completions_record_stage_and_token_usage(enabled):
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30, total_tokens=150)
+    message = SimpleNamespace(content="Subject: Hi\nBody")
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+    )))
+    generator = NudgeEmailGenerator("sk-test", None, client=client)
+    completions = STAGE_SECONDS.count("nudge_email.completion")
+    prompt_tokens = OPENAI_TOKENS.value("gpt-4o", "prompt")
+
+    generator.generate_email("u1", "Write it", [{"title": "T", "instructions": "I", "metrics": "M"}])
+
+    assert STAGE_SECONDS.count("nudge_email.completion") == completions + 1
+    assert OPENAI_TOKENS.value("gpt-4o", "prompt") == prompt_tokens + 120
+
+
+def test_opentelemetry_spans_are_optional():
+    pytest.importorskip("opentelemetry")
+
+    metrics.configure(enabled=False, otel=True)
+    try:
+        with span("test.otel") as active:
+            pass
+        assert active is not span("other")
+    finally:
+        metrics.configure(enabled=False)
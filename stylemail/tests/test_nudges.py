@@ -0,0 +1,178 @@
+import hashlib
+import json
+import pytest
+from types import SimpleNamespace
+from stylemail.benchmarks.nudges import legacy_prepare
+from stylemail.generator import NudgeEmailGenerator, NudgeSummaryGenerator
+from stylemail.nudges import Nudge, build_nudge_prompt, canonical_nudge, compact_nudges, parse_nudges, prepare_nudges
+from stylemail.summary_cache import summary_cache_key
+from stylemail.tokens import estimate_tokens
+
+
+def payload(count, instructions=lambda i: f"Coach on item {i}", date_from="2024-01-01"):
+    return {"data": [
+        {"config": {
+            "message": f"Nudge {i}",
+            "metaData": instructions(i),
+            "threshold": i,
+            "dateRange": {"from": date_from, "to": "2024-01-31"},
+            "priorDateRange": {"from": "2023-12-01", "to": "2023-12-31"},
+            "metric": "overtime",
+        }}
+        for i in range(count)
+    ]}
+
+
+def test_compaction_hoists_shared_fields_and_dedupes_instructions():
+    nudges = prepare_nudges(payload(3, instructions=lambda i: "Same long guidance"))
+
+    compacted, shared = compact_nudges(nudges + nudges[:1])
+
+    assert len(compacted) == 3
+    assert shared == "Date Range: 2024-01-01 to 2024-01-31, Prior Date Range: 2023-12-01 to 2023-12-31, Metric: overtime"
+    assert [n["metrics"] for n in compacted] == ["Threshold: 0", "Threshold: 1", "Threshold: 2"]
+    assert compacted[0]["instructions"] == "Same long guidance"
+    assert compacted[2]["instructions"] == 'Same as "Nudge 0"'
+
+
+def test_single_nudge_keeps_its_metrics():
+    nudges = [{"title": "T", "instructions": "I", "metrics": "M"}]
+
+    assert compact_nudges(nudges) == (nudges, "")
+
+
+def test_metrics_only_point_at_a_shared_line_that_exists():
+    single = [{"title": "T", "instructions": "I", "metrics": "Threshold: N/A"}]
+    distinct = [
+        {"title": "A", "instructions": "I", "metrics": "Threshold: 1"},
+        {"title": "B", "instructions": "I", "metrics": "Threshold: N/A"},
+    ]
+
+    assert compact_nudges(single) == ([{"title": "T", "instructions": "I", "metrics": "N/A"}], "")
+    compacted, shared = compact_nudges(distinct)
+    assert shared == ""
+    assert [n["metrics"] for n in compacted] == ["Threshold: 1", "N/A"]
+
+
+def test_prompt_fits_budget_and_reports_omissions():
+    nudges = prepare_nudges(payload(200, instructions=lambda i: f"Coach on item {i} " * 20))
+    generator = NudgeSummaryGenerator("sk-test", None, client=object())
+    generator.prompt_token_budget = 1000
+
+    built = generator.assemble_prompt("Summarise", nudges)
+
+    assert built.tokens <= 1000
+    assert built.tokens == estimate_tokens(built.text)
+    assert built.included + built.omitted == 200
+    assert f"({built.omitted} more nudges omitted for length)" in built.text
+
+
+def test_long_instructions_are_truncated():
+    nudges = [{"title": "T", "instructions": "word " * 2000, "metrics": "M"}]
+
+    built = build_nudge_prompt(lambda b: b, nudges, lambda n: n["instructions"], "\n", 10000, max_instruction_tokens=50)
+
+    assert built.included == 1
+    assert estimate_tokens(built.text) <= 55
+
+
+def test_email_prompt_keeps_its_instructions():
+    generator = NudgeEmailGenerator("sk-test", None, client=object())
+
+    text = generator.build_prompt("Write it", [{"title": "T", "instructions": "I", "metrics": "M"}])
+
+    assert text.startswith("Write it\n\nNudges for the Employee Sally:\nTitle: T\nInstructions: I\nMetrics: M\n\n")
+
+
+def test_parsed_nudges_match_the_legacy_dicts():
+    data = payload(3)
+    data["data"].append({"config": {"message": "Ünïcode", "dateRange": None}})
+    data["data"].append({})
+
+    nudges = parse_nudges(data)
+
+    assert [dict(n) for n in nudges[:3]] == legacy_prepare(payload(3))
+    assert nudges[3]["metrics"].startswith("Threshold: N/A, Date Range: N/A to N/A")
+    assert nudges[4]["title"] == "No Title"
+    assert not hasattr(nudges[0], "__dict__")
+
+
+def test_nudge_behaves_as_a_read_only_mapping():
+    nudge = Nudge("T", "I", threshold=5)
+
+    assert nudge["title"] == "T" and nudge.get("missing", "x") == "x"
+    assert list(nudge) == ["title", "instructions", "metrics"]
+    with pytest.raises(KeyError):
+        nudge["threshold"]
+
+
+def test_canonical_json_is_memoised_and_matches_json_dumps():
+    nudge = parse_nudges({"data": [{"config": {"message": 'Quote " and ü', "metaData": "Line\nbreak"}}]})[0]
+    expected = json.dumps(dict(nudge), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    assert nudge.canonical() == expected == canonical_nudge(dict(nudge))
+    assert nudge.canonical() is nudge.canonical()
+    assert summary_cache_key("P", [nudge]) == summary_cache_key("P", [dict(nudge)])
+    # Hashes already stored in the summary table must stay valid
+    document = {"model": "gpt-4o", "prompt": "P", "nudges": [dict(nudge)]}
+    legacy = hashlib.sha256(json.dumps(document, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")).hexdigest()
+    assert summary_cache_key("P", [nudge]) == legacy
+
+
+class FakeTeamOpenAI:
+    """Answers JSON-mode requests with ``team_content`` and plain requests with a single email."""
+
+    def __init__(self, team_content):
+        self.team_content = team_content
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _complete(self, model, messages, temperature, response_format=None):
+        self.requests.append(response_format)
+        content = self.team_content if response_format else "Subject: Single\nSingle body"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def team(count):
+    return {f"e{i}": [{"title": f"Nudge {i}", "instructions": "I", "metrics": "M"}] for i in range(count)}
+
+
+def test_team_is_packed_by_size_and_budget():
+    generator = NudgeEmailGenerator("sk-test", None, client=object())
+    generator.team_batch_size = 3
+
+    assert [len(g) for g in generator.pack_team("Write", team(7))] == [3, 3, 1]
+
+    generator.team_prompt_token_budget = estimate_tokens(generator.assemble_team_prompt("Write", [])) + 40
+    groups = generator.pack_team("Write", team(4))
+    assert all(len(g) < 3 for g in groups) and sum(len(g) for g in groups) == 4
+
+
+def test_team_emails_split_and_fall_back_for_bad_entries():
+    content = json.dumps({"emails": [
+        {"employee_id": "e1", "subject": "For one", "body": "Body one"},
+        {"employee_id": "e0", "subject": "", "body": "no subject"},
+        {"employee_id": "stranger", "subject": "S", "body": "B"},
+        {"employee_id": "e2", "subject": "For two", "body": "Body two"},
+    ]})
+    client = FakeTeamOpenAI(content)
+    generator = NudgeEmailGenerator("sk-test", None, client=client)
+
+    emails = generator.generate_team_emails("u1", "Write", team(3))
+
+    assert list(emails) == ["e0", "e1", "e2"]
+    assert emails["e1"] == {"subject": "For one", "body": "Body one"}
+    assert emails["e0"] == {"subject": "Single", "body": "Single body"}
+    assert client.requests == [{"type": "json_object"}, None]
+    prompt_ids = generator.assemble_team_prompt("Write", [("e0", "x"), ("e1", "y")])
+    assert 'employee ids: "e0", "e1"' in prompt_ids
+
+
+def test_unparseable_team_completion_falls_back_to_single_emails():
+    client = FakeTeamOpenAI("Subject: not json")
+    generator = NudgeEmailGenerator("sk-test", None, client=client)
+
+    emails = generator.generate_team_emails("u1", "Write", team(2))
+
+    assert all(e == {"subject": "Single", "body": "Single body"} for e in emails.values())
+    assert client.requests == [{"type": "json_object"}, None, None]
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from stylemail.scheduler import BATCH, OpenAIScheduler, RateLimit, RateLimitedError, request_priority
+from stylemail.tokens import estimate_tokens
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def flaky(failures, result="ok"):
+    state = {"calls": 0}
+
+    def fn():
+        state["calls"] += 1
+        if failures:
+            raise failures.pop(0)
+        return result
+
+    return fn, state
+
+
+def test_token_budget_throttles_calls():
+    scheduler = OpenAIScheduler({"m": RateLimit(requests_per_minute=6000, tokens_per_minute=60000)})
+
+    scheduler.call(lambda: None, "m", 60000)
+    start = time.monotonic()
+    scheduler.call(lambda: None, "m", 50)
+
+    assert time.monotonic() - start >= 0.04
+    assert scheduler.stats()["throttled"] == 1
+
+
+def test_unlimited_model_is_not_throttled():
+    scheduler = OpenAIScheduler()
+    start = time.monotonic()
+
+    for _ in range(100):
+        scheduler.call(lambda: None, "m", 10 ** 9)
+
+    assert time.monotonic() - start < 0.5
+
+
+def test_interactive_calls_jump_ahead_of_batch():
+    scheduler = OpenAIScheduler({"m": RateLimit(requests_per_minute=60000, tokens_per_minute=60000)})
+    order = []
+
+    async def call(name, priority):
+        with request_priority(priority):
+            async def request():
+                order.append(name)
+            await scheduler.acall(request, "m", 100)
+
+    async def scenario():
+        await scheduler.acall(lambda: asyncio.sleep(0), "m", 60000)
+        batch = [asyncio.ensure_future(call(f"batch{i}", BATCH)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(call("interactive", 0))
+        await asyncio.gather(*batch, interactive)
+
+    asyncio.run(scenario())
+
+    assert order.index("interactive") <= 1
+
+
+def test_retries_429_honouring_retry_after():
+    scheduler = OpenAIScheduler(backoff=0.001)
+    fn, state = flaky([FakeStatusError(429, {"retry-after": "0.05"})])
+    start = time.monotonic()
+
+    assert scheduler.call(fn, "m", 10) == "ok"
+    assert time.monotonic() - start >= 0.05
+    assert state["calls"] == 2
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_retries_server_errors_with_backoff():
+    scheduler = OpenAIScheduler(backoff=0.001)
+    fn, state = flaky([FakeStatusError(500), FakeStatusError(503)])
+
+    assert scheduler.call(fn, "m", 10) == "ok"
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_gives_up_with_rate_limited_error():
+    scheduler = OpenAIScheduler(max_retries=1, backoff=0.001)
+    fn, _ = flaky([FakeStatusError(429, {"retry-after-ms": "5"}), FakeStatusError(429, {"retry-after-ms": "5"})])
+
+    with pytest.raises(RateLimitedError) as exc:
+        scheduler.call(fn, "m", 10)
+
+    assert exc.value.retry_after == pytest.approx(0.005)
+
+
+def test_client_errors_are_not_retried():
+    scheduler = OpenAIScheduler(backoff=0.001)
+    fn, state = flaky([FakeStatusError(400)])
+
+    with pytest.raises(FakeStatusError):
+        scheduler.call(fn, "m", 10)
+    assert state["calls"] == 1
+
+
+def test_actual_usage_is_charged():
+    scheduler = OpenAIScheduler({"m": RateLimit(requests_per_minute=1000, tokens_per_minute=10000)})
+    response = SimpleNamespace(usage=SimpleNamespace(total_tokens=4000))
+
+    scheduler.call(lambda: response, "m", 1000)
+
+    assert scheduler._lanes["m"].tokens.level == pytest.approx(6000, abs=5)
+
+
+def test_token_estimate_is_positive_and_grows():
+    assert estimate_tokens("") == 0
+    assert 0 < estimate_tokens("Hello there") < estimate_tokens("Hello there " * 50)
+
+
+def test_server_maps_exhausted_rate_limit_to_429():
+    import server
+
+    try:
+        try:
+            raise RateLimitedError("OpenAI rate limit exceeded", retry_after=2.5)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate email with OpenAI API: {e}")
+    except RuntimeError as wrapped:
+        error = server.http_error(wrapped)
+
+    assert error.status_code == 429
+    assert error.headers == {"Retry-After": "3"}
+    assert server.http_error(ValueError("bad")).status_code == 400
@@ -0,0 +1,136 @@
+import asyncio
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from stylemail import scheduler
+from stylemail.scheduler import BATCH, request_priority
+from stylemail.seeder import AsyncStyleSeeder, StyleSeeder, chunk_samples
+from stylemail.vectorstore import AsyncUserVectorStore, UserVectorStore
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t)), 1.0]) for t in input])
+
+
+class FakeAsyncEmbeddings(FakeEmbeddings):
+    async def create(self, input, model):
+        await asyncio.sleep(0)
+        return FakeEmbeddings.create(self, input, model)
+
+
+@pytest.fixture
+def store():
+    s = UserVectorStore()
+    s.redis = fakeredis.FakeRedis()
+    return s
+
+
+def test_chunks_respect_input_and_token_limits():
+    chunks = list(chunk_samples([f"sample {i}" for i in range(5)], max_inputs=2))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+
+    chunks = list(chunk_samples(["a" * 40, "b" * 40, "c" * 40], max_tokens=20))
+    assert [len(c) for c in chunks] == [2, 1]
+
+
+def test_chunks_drop_duplicates_and_empty_samples():
+    assert list(chunk_samples(["Hi", "", "Hi", "Bye", "Hi"])) == [["Hi", "Bye"]]
+
+
+def test_chunks_reject_non_strings():
+    with pytest.raises(ValueError):
+        list(chunk_samples(["Hi", 3]))
+
+
+def test_seeding_writes_each_chunk_in_one_round_trip(store):
+    seeder = StyleSeeder("sk-test", store, client=SimpleNamespace(embeddings=FakeEmbeddings()))
+    seeder.chunk_inputs = 2
+    executed = []
+    pipeline = store.redis.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+        pipe.execute = lambda *a, **k: executed.append(kwargs.get("transaction")) or execute(*a, **k)
+        return pipe
+
+    store.redis.pipeline = counting_pipeline
+    samples = ["one", "two", "three", "four", "two"]
+
+    assert seeder.seed_user_style("u1", samples) == 4
+    assert executed.count(True) == 2
+    assert sorted(store.get_style_matrix("u1").texts) == ["four", "one", "three", "two"]
+    assert store.get_version("u1") == 2
+
+
+def test_reseeding_makes_no_api_calls(store):
+    embeddings = FakeEmbeddings()
+    seeder = StyleSeeder("sk-test", store, client=SimpleNamespace(embeddings=embeddings))
+    seeder.seed_user_style("u1", ["Hi there!", "Thanks!"])
+    store.embedding_cache._entries.clear()
+
+    assert seeder.seed_user_style("u1", ["Thanks!", "Hi there!"]) == 0
+    assert len(embeddings.calls) == 1
+
+
+def test_streaming_consumes_samples_lazily(store):
+    seeder = StyleSeeder("sk-test", store, client=SimpleNamespace(embeddings=FakeEmbeddings()))
+    seeder.chunk_inputs = 2
+    consumed = []
+
+    def samples():
+        for i in range(100):
+            consumed.append(i)
+            if i == 5:
+                raise RuntimeError("stop")
+            yield f"sample {i}"
+
+    with pytest.raises(RuntimeError, match="stop"):
+        seeder.seed_user_style("u1", samples(), streaming=True, concurrency=1)
+
+    assert len(consumed) == 6
+    assert len(store.get_style_matrix("u1")) >= 2
+
+
+def test_async_streaming_accepts_async_iterables():
+    store = AsyncUserVectorStore()
+    store.redis = fakeredis.FakeAsyncRedis()
+    embeddings = FakeAsyncEmbeddings()
+    seeder = AsyncStyleSeeder("sk-test", store, client=SimpleNamespace(embeddings=embeddings))
+    seeder.chunk_inputs = 3
+
+    async def samples():
+        for i in range(10):
+            yield f"sample {i % 7}"
+
+    async def scenario():
+        stored = await seeder.seed_user_style("u1", samples(), streaming=True)
+        return stored, await store.get_style_matrix("u1")
+
+    stored, matrix = asyncio.run(scenario())
+
+    assert stored == 7
+    assert len(matrix) == 7
+    assert sorted(len(c) for c in embeddings.calls) == [1, 3, 3]
+
+
+def test_chunks_keep_the_callers_request_priority(store):
+    priorities = []
+
+    class RecordingEmbeddings(FakeEmbeddings):
+        def create(self, input, model):
+            priorities.append(scheduler._priority.get())
+            return super().create(input, model)
+
+    seeder = StyleSeeder("sk-test", store, client=SimpleNamespace(embeddings=RecordingEmbeddings()))
+    seeder.chunk_inputs = 1
+
+    with request_priority(BATCH):
+        seeder.seed_user_style("u1", ["one", "two", "three"], concurrency=3)
+
+    assert priorities == [BATCH] * 3
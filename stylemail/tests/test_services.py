@@ -0,0 +1,152 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from services import AsyncNudgeApiClient, NudgeApiClient
+
+
+class StandInNudgeApi(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Laudio auth and nudge endpoints."""
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        state = self.state
+        if state["failures"]:
+            state["failures"] -= 1
+            return self._send(503, {"error": "unavailable"})
+        state["logins"] += 1
+        claims = {"exp": time.time() + state["token_ttl"], "n": state["logins"]}
+        token = "h." + base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=") + ".s"
+        state["valid"].add(token)
+        self._send(200, {"data": {"accessToken": token}})
+
+    def do_GET(self):
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token not in self.state["valid"]:
+            return self._send(401, {"error": "unauthorized"})
+        employee_id = self.path.split("/")[-1].split("?")[0]
+        self._send(200, {"data": [{"config": {"message": f"Nudge for {employee_id}"}}]})
+
+
+@pytest.fixture
+def api():
+    state = {"logins": 0, "failures": 0, "token_ttl": 3600, "valid": set()}
+    handler = type("Handler", (StandInNudgeApi,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", state
+    server.shutdown()
+
+
+def test_token_is_cached_across_requests(api):
+    base_url, state = api
+    client = NudgeApiClient(base_url=base_url)
+
+    first = client.fetch_nudges("a@b.c", "pw", "1")
+    client.fetch_nudges("a@b.c", "pw", "2")
+
+    assert first["data"][0]["config"]["message"] == "Nudge for 1"
+    assert state["logins"] == 1
+    client.close()
+
+
+def test_token_refreshed_before_expiry(api):
+    base_url, state = api
+    state["token_ttl"] = 30
+    client = NudgeApiClient(base_url=base_url)
+
+    client.fetch_nudges("a@b.c", "pw", "1")
+    client.fetch_nudges("a@b.c", "pw", "1")
+
+    assert state["logins"] == 2
+    client.close()
+
+
+def test_rejected_token_triggers_relogin(api):
+    base_url, state = api
+    client = NudgeApiClient(base_url=base_url)
+    client.fetch_nudges("a@b.c", "pw", "1")
+    state["valid"].clear()
+
+    client.fetch_nudges("a@b.c", "pw", "1")
+
+    assert state["logins"] == 2
+    client.close()
+
+
+def test_retries_server_errors(api):
+    base_url, state = api
+    state["failures"] = 2
+    client = NudgeApiClient(base_url=base_url, backoff=0.01)
+
+    assert client.get_auth_token("a@b.c", "pw")
+    client.close()
+
+
+def test_gives_up_after_max_retries(api):
+    base_url, state = api
+    state["failures"] = 5
+    client = NudgeApiClient(base_url=base_url, max_retries=1, backoff=0.01)
+
+    with pytest.raises(Exception):
+        client.get_auth_token("a@b.c", "pw")
+    client.close()
+
+
+def test_async_client_shares_one_login(api):
+    base_url, state = api
+
+    async def scenario():
+        client = AsyncNudgeApiClient(base_url=base_url)
+        results = await asyncio.gather(*(client.fetch_nudges("a@b.c", "pw", str(i)) for i in range(5)))
+        await client.aclose()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [r["data"][0]["config"]["message"] for r in results] == [f"Nudge for {i}" for i in range(5)]
+    assert state["logins"] == 1
+
+
+def test_concurrent_fetches_for_one_employee_share_a_request(api):
+    base_url, state = api
+    state["gets"] = 0
+    original = StandInNudgeApi.do_GET
+
+    def counting_get(handler):
+        state["gets"] += 1
+        time.sleep(0.05)
+        original(handler)
+
+    async def scenario():
+        client = AsyncNudgeApiClient(base_url=base_url)
+        await client.get_auth_token("a@b.c", "pw")
+        results = await asyncio.gather(*(client.fetch_nudges("a@b.c", "pw", "7") for _ in range(5)))
+        await client.aclose()
+        return results, client.flights.stats()
+
+    StandInNudgeApi.do_GET = counting_get
+    try:
+        results, stats = asyncio.run(scenario())
+    finally:
+        StandInNudgeApi.do_GET = original
+
+    assert state["gets"] == 1
+    assert len(results) == 5
+    assert stats["coalesced"] == 4
@@ -0,0 +1,84 @@
+import fakeredis
+import numpy as np
+import pytest
+from stylemail.generator import EmailGenerator
+from stylemail.similarity import cosine_scores, mmr_select, normalize_rows, top_k_indices
+from stylemail.vectorstore import UserVectorStore
+
+
+def test_top_k_indices_matches_full_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.standard_normal((4, 50))
+
+    result = top_k_indices(scores, 5)
+
+    assert result.tolist() == np.argsort(-scores, axis=1)[:, :5].tolist()
+
+
+def test_top_k_indices_k_larger_than_n():
+    assert top_k_indices(np.array([0.1, 0.9, 0.5]), 10).tolist() == [1, 2, 0]
+
+
+def test_cosine_scores_single_and_batch():
+    matrix = normalize_rows([[1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
+
+    single = cosine_scores(matrix, [2.0, 0.0])
+    batch = cosine_scores(matrix, [[2.0, 0.0], [0.0, 5.0]])
+
+    assert single == pytest.approx([1.0, 0.7071, 0.0], abs=1e-4)
+    assert batch.shape == (2, 3)
+    assert batch[1] == pytest.approx([0.0, 0.7071, 1.0], abs=1e-4)
+
+
+@pytest.fixture
+def generator():
+    store = UserVectorStore()
+    store.redis = fakeredis.FakeRedis()
+    store.store_embedding("u1", "north", [0.0, 1.0])
+    store.store_embedding("u1", "east", [1.0, 0.0])
+    store.store_embedding("u1", "north-east", [1.0, 1.0])
+    return EmailGenerator("sk-test", store)
+
+
+def test_retrieve_style_context(generator):
+    assert generator.retrieve_style_context("u1", [0.1, 1.0], top_k=2) == ["north", "north-east"]
+
+
+def test_retrieve_style_contexts_batch(generator):
+    result = generator.retrieve_style_contexts("u1", [[0.0, 1.0], [1.0, 0.0]], top_k=1)
+
+    assert result == [["north"], ["east"]]
+
+
+def test_retrieve_style_context_unknown_user(generator):
+    assert generator.retrieve_style_context("nobody", [1.0, 0.0]) == []
+
+
+def test_mmr_skips_near_duplicates():
+    rows = normalize_rows([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.7, 0.0, 0.7]])
+
+    assert mmr_select(rows, [1.0, 0.0, 0.2], 2) == [0, 2]
+    assert mmr_select(rows, [1.0, 0.0, 0.2], 2, lambda_mult=1.0) == [0, 1]
+
+
+def test_mmr_respects_token_budget():
+    rows = normalize_rows([[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]])
+
+    assert mmr_select(rows, [1.0, 0.1], 3, costs=[50, 10, 10], budget=30) == [2, 1]
+    assert mmr_select(rows, [1.0, 0.1], 3, costs=[50, 50, 50], budget=30) == []
+
+
+def test_style_context_is_diverse_and_budgeted():
+    store = UserVectorStore()
+    store.redis = fakeredis.FakeRedis()
+    store.store_embeddings(
+        "u1",
+        ["Cheers, talk soon", "Cheers, talk soon!", "Best regards and thanks", "x" * 4000],
+        [[1.0, 0.0, 0.0], [0.99, 0.0, 0.14], [0.6, 0.8, 0.0], [0.9, 0.3, 0.0]],
+    )
+    generator = EmailGenerator("sk-test", store)
+    generator.style_samples = 2
+
+    assert generator.select_style_context("u1", [1.0, 0.3, 0.0]) == ["Cheers, talk soon", "Best regards and thanks"]
+    generator.style_token_budget = 2
+    assert generator.select_style_context("u1", [1.0, 0.0, 0.0]) == ["Cheers, "]
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from stylemail.generator import AsyncNudgeSummaryGenerator, NudgeEmailGenerator
+from stylemail.singleflight import AsyncSingleFlight, SingleFlight, flight_key
+
+NUDGES = [{"title": "T", "instructions": "I", "metrics": "M"}]
+
+
+def test_sync_calls_are_coalesced():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        started.set()
+        release.wait()
+        return {"value": 42}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flights.do("k", slow))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flights.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader, *followers]:
+        t.join()
+
+    assert runs == [1]
+    assert results == [{"value": 42}] * 4
+    assert flights.stats() == {"calls": 1, "coalesced": 3, "inflight": 0}
+
+
+def test_sync_errors_reach_every_caller_and_are_not_cached():
+    flights = SingleFlight()
+
+    with pytest.raises(RuntimeError):
+        flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+
+    assert flights.do("k", lambda: "ok") == "ok"
+
+
+def test_async_calls_are_coalesced_and_survive_cancellation():
+    flights = AsyncSingleFlight()
+    runs = []
+
+    async def slow():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def scenario():
+        cancelled = asyncio.ensure_future(flights.do("k", slow))
+        others = [asyncio.ensure_future(flights.do("k", slow)) for _ in range(3)]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(scenario()) == ["done"] * 3
+    assert runs == [1]
+    assert flights.stats()["coalesced"] == 3
+
+
+def test_flight_key_is_order_independent_for_dicts():
+    assert flight_key("x", {"a": 1, "b": 2}) == flight_key("x", {"b": 2, "a": 1})
+    assert flight_key("x", "a") != flight_key("y", "a")
+
+
+class CountingClient:
+    def __init__(self, content="Subject: Hi\nBody", delay=0.01, is_async=False):
+        self.calls = 0
+        self.content = content
+        self.delay = delay
+        create = self._acreate if is_async else self._create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    def _response(self):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+    def _create(self, model, messages, temperature):
+        time.sleep(self.delay)
+        return self._response()
+
+    async def _acreate(self, model, messages, temperature):
+        await asyncio.sleep(self.delay)
+        return self._response()
+
+
+def test_async_generator_merges_identical_requests():
+    client = CountingClient(content="A summary", is_async=True)
+    generator = AsyncNudgeSummaryGenerator("sk-test", None, client=client)
+
+    async def scenario():
+        same = [generator.generate_summary(str(i), "Summarise", NUDGES) for i in range(4)]
+        different = generator.generate_summary("9", "Summarise differently", NUDGES)
+        return await asyncio.gather(*same, different)
+
+    results = asyncio.run(scenario())
+
+    assert client.calls == 2
+    assert all(r == {"summary": "A summary"} for r in results)
+    assert results[0] is not results[1]
+    assert generator.flights.stats()["coalesced"] == 3
+
+
+def test_sync_generator_merges_identical_requests():
+    client = CountingClient(delay=0.05)
+    generator = NudgeEmailGenerator("sk-test", None, client=client)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(generator.generate_email("u1", "Write it", NUDGES)))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert client.calls == 1
+    assert results == [{"subject": "Hi", "body": "Body"}] * 4
@@ -0,0 +1,14 @@
+from stylemail.benchmarks.startup import measure
+
+
+def test_entry_points_do_not_import_deferred_modules():
+    for module in ("stylemail", "stylemail.cli", "stylemail.worker"):
+        assert measure(module, repeat=1)["deferred_loaded"] == [], module
+
+
+def test_package_exports_load_on_first_access():
+    import stylemail
+    from stylemail.api import generate_email
+
+    assert stylemail.generate_email is generate_email
+    assert "agenerate_team_nudge_emails" in dir(stylemail)
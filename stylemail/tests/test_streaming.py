@@ -0,0 +1,137 @@
+import asyncio
+import random
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from stylemail.generator import AsyncNudgeEmailGenerator, NudgeEmailGenerator, SubjectLineParser
+
+COMPLETIONS = [
+    "Subject: Quarterly check-in\n\nHi Sally,\nLet's talk.\n",
+    "Hello\nSubject: Late subject\nBody\n",
+    "No subject at all",
+    "Sub\nsubject: first\nSubject: second\nend\n\n",
+    "",
+]
+
+
+def chunks(text, rng):
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 6)
+        yield text[i:i + n]
+        i += n
+
+
+def run_parser(deltas):
+    parser = SubjectLineParser()
+    events = [e for d in deltas for e in parser.feed(d)] + parser.finish()
+    return events
+
+
+@pytest.mark.parametrize("content", COMPLETIONS)
+def test_parser_matches_parse_email(content):
+    rng = random.Random(0)
+    expected = NudgeEmailGenerator.parse_email(content)
+    for _ in range(50):
+        events = run_parser(chunks(content, rng))
+        assert [d for e, d in events if e == "subject"] == [expected["subject"]]
+        assert "".join(d for e, d in events if e == "token") == expected["body"]
+
+
+def test_subject_emitted_before_body_completes():
+    parser = SubjectLineParser()
+
+    assert parser.feed("Subject: Hel") == []
+    assert parser.feed("lo\nDear") == [("subject", "Hello"), ("token", "Dear")]
+
+
+def stream_chunks(content):
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + 4]))])
+        for i in range(0, len(content), 4)
+    ]
+
+
+class FakeStreamingClient:
+    def __init__(self, content):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.content = content
+
+    def _create(self, model, messages, temperature, stream=False):
+        assert stream
+        return iter(stream_chunks(self.content))
+
+
+class FakeAsyncStreamingClient(FakeStreamingClient):
+    async def _create(self, model, messages, temperature, stream=False):
+        async def gen():
+            for chunk in stream_chunks(self.content):
+                yield chunk
+        return gen()
+
+
+NUDGES = [{"title": "T", "instructions": "I", "metrics": "M"}]
+
+
+def test_nudge_stream_email():
+    generator = NudgeEmailGenerator("sk-test", None, client=FakeStreamingClient(COMPLETIONS[0]))
+
+    events = list(generator.stream_email("u1", "Write it", NUDGES))
+
+    assert events[0] == ("subject", "Quarterly check-in")
+    assert "".join(d for e, d in events if e == "token") == "\nHi Sally,\nLet's talk.\n"
+
+
+def test_async_nudge_stream_email():
+    generator = AsyncNudgeEmailGenerator("sk-test", None, client=FakeAsyncStreamingClient(COMPLETIONS[0]))
+
+    async def collect():
+        return [e async for e in generator.stream_email("u1", "Write it", NUDGES)]
+
+    events = asyncio.run(collect())
+
+    assert events[0] == ("subject", "Quarterly check-in")
+
+
+def test_nudge_email_sse_endpoint(monkeypatch):
+    import server
+
+    class FakeNudgeApi:
+        async def fetch_nudges(self, email, password, employee_id):
+            return {"data": [{"config": {"message": "Review schedule"}}]}
+
+    fake_clients = SimpleNamespace(
+        nudge_email_generator=AsyncNudgeEmailGenerator("sk-test", None, client=FakeAsyncStreamingClient(COMPLETIONS[0]))
+    )
+    monkeypatch.setattr(server, "nudge_api", FakeNudgeApi())
+    monkeypatch.setattr(server, "clients", fake_clients)
+    body = {"user_id": "u1", "prompt": "Write it", "email": "a@b.c", "password": "pw", "employee_id": "1"}
+
+    response = TestClient(server.app).post("/nudge-email/stream", json=body)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.strip().split("\n\n")
+    assert frames[0] == 'event: subject\ndata: "Quarterly check-in"'
+    assert frames[-1] == 'event: done\ndata: ""'
+
+
+def test_nudge_email_sse_endpoint_reports_failures_as_http_errors(monkeypatch):
+    import server
+
+    class FakeNudgeApi:
+        async def fetch_nudges(self, email, password, employee_id):
+            return {"data": [{"config": {"message": "Review schedule"}}]}
+
+    def fail(**kwargs):
+        raise ConnectionError("OpenAI is down")
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fail)))
+    fake_clients = SimpleNamespace(nudge_email_generator=AsyncNudgeEmailGenerator("sk-test", None, client=client))
+    monkeypatch.setattr(server, "nudge_api", FakeNudgeApi())
+    monkeypatch.setattr(server, "clients", fake_clients)
+    body = {"user_id": "u1", "prompt": "Write it", "email": "a@b.c", "password": "pw", "employee_id": "1"}
+
+    response = TestClient(server.app).post("/nudge-email/stream", json=body)
+
+    assert response.status_code == 400
+    assert "OpenAI is down" in response.json()["detail"]
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from stylemail.summary_cache import NudgeSummaryCache, summary_cache_key
+from stylemail.summary_store import SummaryRepository
+
+NUDGES = [{"title": "T", "instructions": "I", "metrics": "Threshold: 5"}]
+
+
+class SlowSummaryGenerator:
+    def __init__(self, delay=0.01, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def generate_summary(self, user_id, prompt, nudges):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("Failed to generate summary with OpenAI API")
+        return {"summary": f"summary {self.calls} for {user_id}"}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repository = SummaryRepository(str(tmp_path / "summaries.db"))
+    repository.create_table()
+    yield repository
+    repository.close()
+
+
+def test_key_covers_metrics_prompt_and_model():
+    base = summary_cache_key("Summarise", NUDGES)
+    changed_metric = [{**NUDGES[0], "metrics": "Threshold: 6"}]
+    reordered = [{"metrics": "Threshold: 5", "title": "T", "instructions": "I"}]
+
+    assert summary_cache_key("Summarise", reordered) == base
+    assert summary_cache_key("Summarise", changed_metric) != base
+    assert summary_cache_key("Summarise briefly", NUDGES) != base
+    assert summary_cache_key("Summarise", NUDGES, model="gpt-4o-mini") != base
+
+
+def test_concurrent_misses_share_one_generation(repo):
+    generator = SlowSummaryGenerator()
+    cache = NudgeSummaryCache(repo, generator)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_summary("1", "Summarise", NUDGES) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+
+    assert generator.calls == 1
+    assert {r["summary"] for r in results} == {"summary 1 for 1"}
+    assert repo.get_record("1").content_hash == summary_cache_key("Summarise", NUDGES)
+
+
+def test_fresh_hit_skips_generation(repo):
+    generator = SlowSummaryGenerator()
+    cache = NudgeSummaryCache(repo, generator)
+
+    async def scenario():
+        await cache.get_summary("1", "Summarise", NUDGES)
+        return await cache.get_summary("1", "Summarise", NUDGES)
+
+    assert asyncio.run(scenario()) == {"summary": "summary 1 for 1"}
+    assert generator.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_changed_nudges_serve_stale_and_refresh_in_background(repo):
+    repo.upsert("1", "old summary", "T", "old-hash")
+    generator = SlowSummaryGenerator()
+    cache = NudgeSummaryCache(repo, generator)
+
+    async def scenario():
+        served = await cache.get_summary("1", "Summarise", NUDGES)
+        await cache.drain()
+        return served
+
+    assert asyncio.run(scenario()) == {"summary": "old summary"}
+    assert generator.calls == 1
+    assert repo.get("1")[0] == "summary 1 for 1"
+
+
+def test_expired_summary_blocks_on_generation(repo):
+    repo.upsert("1", "ancient summary", "T", summary_cache_key("Summarise", NUDGES))
+    cache = NudgeSummaryCache(repo, SlowSummaryGenerator(), fresh_ttl=0, stale_ttl=0)
+
+    assert asyncio.run(cache.get_summary("1", "Summarise", NUDGES)) == {"summary": "summary 1 for 1"}
+
+
+def test_failed_background_refresh_keeps_stale_summary(repo):
+    repo.upsert("1", "old summary", "T", "old-hash")
+    cache = NudgeSummaryCache(repo, SlowSummaryGenerator(fail=True))
+
+    async def scenario():
+        served = await cache.get_summary("1", "Summarise", NUDGES)
+        await cache.drain()
+        return served
+
+    assert asyncio.run(scenario()) == {"summary": "old summary"}
+    assert repo.get("1")[0] == "old summary"
+
+
+def test_rejects_empty_nudges(repo):
+    cache = NudgeSummaryCache(repo, SlowSummaryGenerator())
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_summary("1", "Summarise", []))
+
+
+def test_empty_nudges_serve_the_stored_summary(repo):
+    repo.upsert("1", "last summary", "T", summary_cache_key("Summarise", NUDGES))
+    generator = SlowSummaryGenerator()
+    cache = NudgeSummaryCache(repo, generator)
+
+    assert asyncio.run(cache.get_summary("1", "Summarise", [])) == {"summary": "last summary"}
+    assert generator.calls == 0
+
+    expired = NudgeSummaryCache(repo, generator, fresh_ttl=0, stale_ttl=0)
+    with pytest.raises(ValueError):
+        asyncio.run(expired.get_summary("1", "Summarise", []))
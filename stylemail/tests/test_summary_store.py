@@ -0,0 +1,73 @@
+import sqlite3
+import threading
+import pytest
+from stylemail.summary_store import SummaryRepository
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repository = SummaryRepository(str(tmp_path / "summaries.db"))
+    repository.create_table()
+    yield repository
+    repository.close()
+
+
+def test_get_missing_returns_none(repo):
+    assert repo.get("1") is None
+
+
+def test_upsert_replaces_existing_summary(repo):
+    repo.upsert("1", "first", "A")
+    repo.upsert("1", "second", "A, B")
+
+    assert repo.get("1") == ("second", "A, B")
+    count = sqlite3.connect(repo.db_path).execute("SELECT COUNT(*) FROM employee_nudge_summary").fetchone()[0]
+    assert count == 1
+
+
+def test_upsert_many_and_snippet_lookup(repo):
+    repo.upsert_many([(str(i), f"summary {i}", f"S{i}", None) for i in range(1200)])
+
+    snippets = repo.get_snippets([str(i) for i in range(0, 1300, 100)])
+
+    assert snippets == {str(i): f"S{i}" for i in range(0, 1200, 100)}
+
+
+def test_database_uses_wal(repo):
+    assert repo._connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_connection_per_thread_is_reused(repo):
+    seen = []
+
+    def worker():
+        first = repo._connect()
+        repo.upsert(threading.current_thread().name, "s", "x")
+        seen.append(first is repo._connect())
+
+    threads = [threading.Thread(target=worker, name=str(i)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert seen == [True] * 4
+    assert len(repo._connections) == 5
+    assert len(repo.get_snippets(["0", "1", "2", "3"])) == 4
+
+
+def test_create_table_adds_content_hash_to_existing_tables(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE employee_nudge_summary (employee_id INT PRIMARY KEY, created_date DATETIME, summary TEXT, nudge_snippet TEXT)")
+    legacy.execute("INSERT INTO employee_nudge_summary VALUES (1, '2024-01-01 00:00:00', 'old', 'A')")
+    legacy.commit()
+    legacy.close()
+    repo = SummaryRepository(path)
+
+    repo.create_table()
+    record = repo.get_record("1")
+
+    assert (record.summary, record.content_hash) == ("old", None)
+    assert record.age() > 0
+    repo.close()
@@ -0,0 +1,112 @@
+import json
+import fakeredis
+import numpy as np
+import pytest
+from stylemail.vectorstore import UserVectorStore, hash_text
+
+
+@pytest.fixture
+def store():
+    s = UserVectorStore()
+    s.redis = fakeredis.FakeRedis()
+    return s
+
+
+def test_store_and_load_matrix(store):
+    store.store_embedding("u1", "Hi there!", [1.0, 0.0, 0.0])
+    store.store_embedding("u1", "Thanks!", [0.0, 3.0, 4.0])
+
+    matrix = store.get_style_matrix("u1")
+
+    assert len(matrix) == 2
+    assert matrix.embeddings.dtype == np.float32
+    assert matrix.embeddings.shape == (2, 3)
+    rows = dict(zip(matrix.texts, matrix.embeddings.tolist()))
+    assert rows["Thanks!"] == pytest.approx([0.0, 0.6, 0.8])
+    assert matrix.doc_ids[matrix.texts.index("Hi there!")] == hash_text("Hi there!")
+
+
+def test_duplicate_sample_overwrites(store):
+    store.store_embedding("u1", "Hi there!", [0.1, 0.2])
+    store.store_embedding("u1", "Hi there!", [0.3, 0.4])
+
+    assert len(store.get_style_matrix("u1")) == 1
+
+
+def test_empty_user(store):
+    assert len(store.get_style_matrix("nobody")) == 0
+    assert store.get_all_embeddings("nobody") == []
+
+
+def test_clear_user_data(store):
+    store.store_embedding("u1", "Hi there!", [0.1, 0.2])
+    store.get_style_matrix("u1")
+    store.clear_user_data("u1")
+
+    assert not store.redis.exists(store._user_key("u1"), store._texts_key("u1"))
+    assert len(store.get_style_matrix("u1")) == 0
+
+
+def test_legacy_json_is_migrated_in_place(store):
+    key = store._user_key("legacy")
+    for text, emb in [("Old one", [1.0, 0.0]), ("Old two", [0.0, 1.0])]:
+        store.redis.hset(key, hash_text(text), json.dumps({"text": text, "embedding": emb}))
+
+    assert store.migrate_all() == {"legacy": 2}
+    assert store.migrate_user("legacy") == 0
+
+    entries = {e["text"]: list(e["embedding"]) for e in store.get_all_embeddings("legacy")}
+    assert entries == {"Old one": [1.0, 0.0], "Old two": [0.0, 1.0]}
+
+
+def test_legacy_user_migrated_on_read(store):
+    store.redis.hset(store._user_key("legacy"), hash_text("Old"), json.dumps({"text": "Old", "embedding": [0.0, 2.0]}))
+
+    matrix = store.get_style_matrix("legacy")
+
+    assert matrix.texts == ["Old"]
+    assert matrix.embeddings.tolist() == [[0.0, 1.0]]
+
+
+def test_legacy_entry_migrated_when_counts_match(store):
+    store.redis.hset(store._user_key("mixed"), hash_text("Old"), json.dumps({"text": "Old", "embedding": [0.0, 2.0]}))
+    store.redis.hset(store._texts_key("mixed"), hash_text("Orphan"), "Orphan")
+
+    matrix = store.get_style_matrix("mixed")
+
+    assert matrix.texts == ["Old"]
+    assert matrix.embeddings.tolist() == [[0.0, 1.0]]
+
+
+def test_vectors_without_text_are_skipped(store):
+    store.store_embedding("u1", "Hi there!", [1.0, 0.0])
+    store.redis.hdel(store._texts_key("u1"), hash_text("Hi there!"))
+    store.store_embedding("u1", "Thanks!", [0.0, 1.0])
+
+    assert store.get_style_matrix("u1").texts == ["Thanks!"]
+
+
+def test_matrix_cache_hits_until_write(store):
+    store.store_embedding("u1", "Hi there!", [0.1, 0.2])
+
+    first = store.get_style_matrix("u1")
+    assert store.get_style_matrix("u1") is first
+    store.store_embedding("u1", "Thanks!", [0.3, 0.4])
+
+    assert len(store.get_style_matrix("u1")) == 2
+    assert store.matrix_cache.stats()["hits"] == 1
+    assert store.matrix_cache.stats()["misses"] == 2
+
+
+def test_matrix_cache_invalidated_by_other_process():
+    server = fakeredis.FakeServer()
+    worker_a, worker_b = UserVectorStore(), UserVectorStore()
+    worker_a.redis = fakeredis.FakeRedis(server=server)
+    worker_b.redis = fakeredis.FakeRedis(server=server)
+
+    worker_a.store_embedding("u1", "Hi there!", [0.1, 0.2])
+    assert len(worker_b.get_style_matrix("u1")) == 1
+    worker_a.store_embedding("u1", "Thanks!", [0.3, 0.4])
+    assert len(worker_b.get_style_matrix("u1")) == 2
+    worker_a.clear_user_data("u1")
+    assert len(worker_b.get_style_matrix("u1")) == 0
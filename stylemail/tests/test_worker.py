@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import fakeredis
+import pytest
+from stylemail.benchmarks.upstream import ThreadedServer, UpstreamProfile, fake_nudges, upstream_app
+from stylemail.clients import AsyncStyleMailClients
+from stylemail.config import Config
+from stylemail.nudges import prepare_nudges
+from stylemail.vectorstore import AsyncUserVectorStore
+from stylemail.worker import StyleMailWorker, run_worker
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    profile = UpstreamProfile(embedding_latency=0, chat_latency=0.05, token_delay=0, nudge_latency=0, embedding_dim=16)
+    server = ThreadedServer(upstream_app(profile)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_clients(upstream, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{upstream.url}/v1")
+
+    def make():
+        store = AsyncUserVectorStore()
+        store.redis = fakeredis.FakeAsyncRedis()
+        return AsyncStyleMailClients(Config.from_env(), store=store)
+
+    return make
+
+
+async def lines_of(*requests):
+    for request in requests:
+        yield request if isinstance(request, str) else json.dumps(request)
+
+
+def test_worker_answers_concurrent_requests_by_id(make_clients):
+    nudges = [dict(n) for n in prepare_nudges(fake_nudges("e1", 2))]
+    requests = [
+        {"id": 1, "method": "seed", "params": {"user_id": "u1", "samples": ["Hi there!", "Thanks!"]}},
+        "not json",
+        {"id": 2, "method": "explode"},
+        {"id": 3, "method": "generate", "params": {"user_id": "u1", "prompt": "missing subject"}},
+        {"id": 4, "method": "generate", "params": {"user_id": "nobody", "subject": "S", "prompt": "P"}},
+        "",
+    ] + [
+        {"id": f"email-{i}", "method": "nudge_email", "params": {"user_id": "u1", "prompt": f"Check in {i}", "nudges": nudges}}
+        for i in range(8)
+    ]
+
+    async def scenario():
+        clients = make_clients()
+        worker = StyleMailWorker(clients)
+        written = []
+
+        async def write(text):
+            written.append(text)
+
+        started = asyncio.get_running_loop().time()
+        await worker.serve(lines_of(*requests), write)
+        elapsed = asyncio.get_running_loop().time() - started
+        await clients.aclose()
+        return [json.loads(line) for line in written], elapsed
+
+    responses, elapsed = asyncio.run(scenario())
+    by_id = {response["id"]: response for response in responses}
+
+    assert len(responses) == len(requests) - 1
+    assert by_id[1] == {"id": 1, "result": {"stored": 2}}
+    assert by_id[None]["error"]["type"] == "JSONDecodeError"
+    assert by_id[2]["error"] == {"type": "ValueError", "message": "Unknown method: 'explode'"}
+    assert by_id[3]["error"]["type"] == "ValueError"
+    assert by_id[4]["error"]["type"] == "RuntimeError"
+    assert all(by_id[f"email-{i}"]["result"]["subject"] for i in range(8))
+    # Eight 50 ms completions overlap instead of running back to back
+    assert elapsed < 0.35
+
+
+def test_worker_serves_a_unix_socket(make_clients, tmp_path):
+    path = str(tmp_path / "worker.sock")
+
+    async def scenario():
+        task = asyncio.create_task(run_worker(make_clients(), path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'{"id": "a", "method": "ping"}\n{"id": "b", "method": "seed", "params": {"user_id": "u2", "samples": ["Hello"]}}\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in range(2)]
+        writer.close()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return responses
+
+    responses = {r["id"]: r["result"] for r in asyncio.run(scenario())}
+
+    assert responses["a"]["pong"] is True
+    assert responses["b"] == {"stored": 1}
+    assert not os.path.exists(path)
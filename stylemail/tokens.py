@@ -0,0 +1,42 @@
+from functools import lru_cache
+from typing import Iterable
+
+from stylemail.config import CHAT_MODEL
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character heuristic
+    tiktoken = None
+
+# English text averages roughly four characters per token for OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encodings are downloaded on first use; offline hosts get the heuristic
+        return None
+
+
+def estimate_tokens(text: str, model: str = CHAT_MODEL) -> int:
+    """
+    Count (or estimate) the tokens ``text`` will use for ``model``.
+
+    Uses tiktoken when it is installed, otherwise ``len(text) / CHARS_PER_TOKEN``
+    rounded up, which is close enough for rate-limit budgeting.
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def estimate_batch_tokens(texts: Iterable[str], model: str) -> int:
+    return sum(estimate_tokens(text, model) for text in texts)
@@ -1,37 +1,455 @@
+import asyncio
 import redis
+import redis.asyncio
 import numpy as np
 import hashlib
 import json
-from typing import List
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence
+from stylemail.cache import EmbeddingCache, StyleMatrixCache
+from stylemail.ann import IVFIndex
+from stylemail.config import ANN_MIN_SAMPLES, ANN_PROBES
+from stylemail.metrics import span
+from stylemail.similarity import cosine_scores, normalize_rows, top_k_indices
+
+# Embeddings are stored as raw little-endian float32 rows so a user's whole
+# style set can be decoded with a single np.frombuffer call.
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def hash_text(text: str) -> str:
+    """Return the sha256 hex digest used as the document id for a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_embedding(embedding) -> bytes:
+    """Encode an embedding vector as unit-normalized, packed float32 bytes."""
+    return normalize_rows(embedding).astype(EMBEDDING_DTYPE, copy=False).tobytes()
+
+
+@dataclass
+class StyleMatrix:
+    """
+    A user's style samples decoded into one contiguous embedding matrix.
+
+    Row ``i`` of ``embeddings`` belongs to ``doc_ids[i]`` / ``texts[i]``. Rows are
+    unit-normalized when stored, so cosine similarity is a plain dot product.
+    """
+    doc_ids: List[str]
+    texts: List[str]
+    embeddings: np.ndarray
+    # Approximate index, attached by the store for large corpora
+    index: Optional[IVFIndex] = field(default=None, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate in-memory footprint, used to bound the matrix cache."""
+        index_bytes = self.index.nbytes if self.index is not None else 0
+        return self.embeddings.nbytes + index_bytes + sum(len(t) + len(d) for t, d in zip(self.texts, self.doc_ids))
+
+    def nearest(self, queries: np.ndarray, k: int) -> np.ndarray:
+        """
+        Row indices of the k samples closest to each of ``queries`` (n_queries x dim), best first.
+
+        Exact when no index is attached; otherwise only the index's probed lists are scored.
+        """
+        if self.index is not None:
+            return self.index.search(self.embeddings, queries, k)
+        return top_k_indices(cosine_scores(self.embeddings, queries), k)
+
+    @classmethod
+    def empty(cls) -> "StyleMatrix":
+        return cls(doc_ids=[], texts=[], embeddings=np.empty((0, 0), dtype=EMBEDDING_DTYPE))
 
 
 class UserVectorStore:
-    def __init__(self, redis_url: str = None, host: str = "localhost", port: int = 6379, db: int = None, password: str = "", namespace: str = "style_mail_vector"):
-        kwargs = {"host": host, "port": port, "password": password}
-        if db is not None:
-            kwargs["db"] = db
-        self.redis = redis.Redis(**kwargs)
+    redis_class = redis.Redis
+
+    def __init__(self, redis_url: str = None, host: str = "localhost", port: int = 6379, db: int = None, password: str = "", namespace: str = "style_mail_vector", matrix_cache: Optional[StyleMatrixCache] = None, embedding_cache: Optional[EmbeddingCache] = None, connection_pool=None, ann_min_samples: Optional[int] = ANN_MIN_SAMPLES, ann_probes: int = ANN_PROBES):
+        if connection_pool is not None:
+            kwargs = {"connection_pool": connection_pool}
+        else:
+            kwargs = {"host": host, "port": port, "password": password}
+            if db is not None:
+                kwargs["db"] = db
+        self.redis = self.redis_class(**kwargs)
         self.namespace = namespace
+        self.matrix_cache = matrix_cache if matrix_cache is not None else StyleMatrixCache()
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+        # None disables the approximate index entirely
+        self.ann_min_samples = ann_min_samples
+        self.ann_probes = ann_probes
+
+    def _prefix(self) -> str:
+        return f"{self.namespace}:" if self.namespace else ""
 
     def _user_key(self, user_id: str) -> str:
-        prefix = f"{self.namespace}:" if self.namespace else ""
-        return f"{prefix}user:{user_id}:vectors"
+        return f"{self._prefix()}user:{user_id}:vectors"
+
+    def _texts_key(self, user_id: str) -> str:
+        return f"{self._prefix()}user:{user_id}:texts"
+
+    def _version_key(self, user_id: str) -> str:
+        return f"{self._prefix()}user:{user_id}:version"
+
+    def _embedding_key(self, model: str, text: str) -> str:
+        return f"{self._prefix()}embedding:{model}:{self._hash_text(text)}"
 
     def _hash_text(self, text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return hash_text(text)
+
+    def get_cached_embeddings(self, texts: Sequence[str], model: str) -> List[Optional[np.ndarray]]:
+        """
+        Look up raw embeddings for texts by content hash.
+
+        Checks the in-process tier first and fetches the remainder from Redis with
+        one MGET. Returns None in place of every text that was not cached.
+        """
+        keys = [self._embedding_key(model, t) for t in texts]
+        found = self.embedding_cache.get_many(keys)
+        missing = [i for i, v in enumerate(found) if v is None]
+        if missing:
+            with span("redis.embedding_cache"):
+                remote = self.redis.mget([keys[i] for i in missing])
+            self._merge_remote_embeddings(keys, found, missing, remote)
+        return found
+
+    def _merge_remote_embeddings(self, keys, found, missing, remote) -> None:
+        hit_keys, hit_values = [], []
+        for i, raw in zip(missing, remote):
+            if raw is not None:
+                found[i] = np.frombuffer(raw, dtype=EMBEDDING_DTYPE)
+                hit_keys.append(keys[i])
+                hit_values.append(found[i])
+        self.embedding_cache.put_many(hit_keys, hit_values)
+        self.embedding_cache.record(remote_hits=len(hit_keys), misses=len(missing) - len(hit_keys))
+
+    def cache_embeddings(self, texts: Sequence[str], embeddings: Sequence[List[float]], model: str) -> None:
+        """Store raw embeddings in both cache tiers, keyed by content hash, with the configured TTL."""
+        self._queue_cache_embeddings(texts, embeddings, model).execute()
+
+    def _queue_cache_embeddings(self, texts, embeddings, model, pipe=None):
+        keys = [self._embedding_key(model, t) for t in texts]
+        values = [np.asarray(e, dtype=EMBEDDING_DTYPE) for e in embeddings]
+        self.embedding_cache.put_many(keys, values)
+        if pipe is None:
+            pipe = self.redis.pipeline(transaction=False)
+        for key, value in zip(keys, values):
+            pipe.set(key, value.tobytes(), ex=self.embedding_cache.ttl)
+        return pipe
 
     def store_embedding(self, user_id: str, text: str, embedding: List[float]) -> None:
-        key = self._user_key(user_id)
+        self._queue_store_embedding(user_id, text, embedding).execute()
+        self.matrix_cache.invalidate(user_id)
+
+    def _queue_store_embedding(self, user_id, text, embedding):
         doc_id = self._hash_text(text)
-        self.redis.hset(key, doc_id, json.dumps({"text": text, "embedding": embedding}))
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self._user_key(user_id), doc_id, pack_embedding(embedding))
+        pipe.hset(self._texts_key(user_id), doc_id, text)
+        pipe.incr(self._version_key(user_id))
+        return pipe
 
-    def get_all_embeddings(self, user_id: str) -> List[dict]:
-        key = self._user_key(user_id)
+    def store_embeddings(self, user_id: str, texts: Sequence[str], embeddings: Sequence[List[float]], cache: Optional[tuple] = None) -> None:
+        """
+        Store many samples in one MULTI round trip, bumping the version once.
+
+        ``cache`` is an optional ``(texts, embeddings, model)`` triple of freshly
+        computed embeddings to add to the embedding cache in the same round trip.
+        """
+        pipe = self._queue_store_embeddings(user_id, texts, embeddings, cache)
+        with span("redis.store_embeddings"):
+            pipe.execute()
+        self.matrix_cache.invalidate(user_id)
+
+    def _queue_store_embeddings(self, user_id, texts, embeddings, cache=None):
+        pipe = self.redis.pipeline(transaction=True)
+        if cache:
+            self._queue_cache_embeddings(*cache, pipe=pipe)
+        doc_ids = [self._hash_text(t) for t in texts]
+        if doc_ids:
+            packed = normalize_rows(np.asarray(embeddings, dtype=np.float32)).astype(EMBEDDING_DTYPE, copy=False)
+            pipe.hset(self._user_key(user_id), mapping={d: row.tobytes() for d, row in zip(doc_ids, packed)})
+            pipe.hset(self._texts_key(user_id), mapping=dict(zip(doc_ids, texts)))
+            pipe.incr(self._version_key(user_id))
+        return pipe
+
+    def existing_doc_ids(self, user_id: str, doc_ids: Sequence[str]) -> set:
+        """Return the subset of doc_ids already stored for the user, in one round trip."""
+        with span("redis.existing_doc_ids"):
+            flags = self._queue_exists(user_id, doc_ids).execute()
+        return self._existing(doc_ids, flags)
+
+    def _queue_exists(self, user_id, doc_ids):
+        pipe = self.redis.pipeline(transaction=False)
+        for doc_id in doc_ids:
+            pipe.hexists(self._texts_key(user_id), doc_id)
+        return pipe
+
+    @staticmethod
+    def _existing(doc_ids, flags) -> set:
+        return {d for d, exists in zip(doc_ids, flags) if exists}
+
+    def get_version(self, user_id: str) -> int:
+        """
+        Return the user's write counter.
+
+        Every write bumps it and it is never reset, so a cached matrix tagged with
+        the current version is guaranteed to be up to date across processes.
+        """
+        version = self.redis.get(self._version_key(user_id))
+        return int(version) if version else 0
+
+    def _queue_load_raw(self, user_id: str):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(self._version_key(user_id))
+        pipe.hgetall(self._user_key(user_id))
+        pipe.hgetall(self._texts_key(user_id))
+        return pipe
+
+    def _load_raw(self, user_id: str):
+        version, vectors, texts = self._queue_load_raw(user_id).execute()
+        return int(version) if version else 0, vectors, texts
+
+    @staticmethod
+    def _needs_migration(vectors: dict, texts: dict) -> bool:
+        # Legacy JSON entries are vectors without a text. Compare the key sets, not their
+        # sizes: an orphaned text can make the counts match while a legacy entry remains.
+        return not vectors.keys() <= texts.keys()
+
+    @staticmethod
+    def _decode_matrix(vectors: dict, texts: dict) -> StyleMatrix:
+        # A vector with no text left (e.g. an unreadable legacy entry) is dropped
+        doc_ids = [d for d in vectors if d in texts]
+        if not doc_ids:
+            return StyleMatrix.empty()
+        embeddings = np.frombuffer(b"".join(vectors[d] for d in doc_ids), dtype=EMBEDDING_DTYPE)
+        return StyleMatrix(
+            doc_ids=[d.decode("utf-8") for d in doc_ids],
+            texts=[texts[d].decode("utf-8") for d in doc_ids],
+            embeddings=embeddings.reshape(len(doc_ids), -1),
+        )
+
+    def _needs_index(self, matrix: StyleMatrix) -> bool:
+        return self.ann_min_samples is not None and len(matrix) >= self.ann_min_samples
+
+    def _with_index(self, matrix: StyleMatrix) -> StyleMatrix:
+        """Return ``matrix`` with an IVF index attached and its rows regrouped by list."""
+        index, order = IVFIndex.build(matrix.embeddings, n_probe=self.ann_probes)
+        return StyleMatrix(
+            doc_ids=[matrix.doc_ids[i] for i in order],
+            texts=[matrix.texts[i] for i in order],
+            embeddings=matrix.embeddings[order],
+            index=index,
+        )
+
+    def get_style_matrix(self, user_id: str) -> StyleMatrix:
+        """
+        Load all of a user's samples as a StyleMatrix.
+
+        Served from the in-process matrix cache when the user's version counter is
+        unchanged; otherwise vectors, texts and version are fetched in one MULTI
+        round-trip and the vectors are decoded with a single np.frombuffer over the
+        concatenated blobs. Users still stored in the legacy JSON format are
+        migrated on first read. Matrices of at least ``ann_min_samples`` rows get an
+        IVF index, built once per version and cached with the matrix.
+        """
         try:
-            raw = self.redis.hgetall(key)
-            return [json.loads(v) for v in raw.values()]
+            with span("redis.get_version"):
+                version = self.get_version(user_id)
+            cached = self.matrix_cache.get(user_id, version)
+            if cached is not None:
+                return cached
+
+            with span("redis.load_style"):
+                version, vectors, texts = self._load_raw(user_id)
+            if self._needs_migration(vectors, texts):
+                self.migrate_user(user_id)
+                version, vectors, texts = self._load_raw(user_id)
+
+            with span("style.decode"):
+                matrix = self._decode_matrix(vectors, texts)
+            if self._needs_index(matrix):
+                with span("style.build_index"):
+                    matrix = self._with_index(matrix)
+            self.matrix_cache.put(user_id, version, matrix)
+            return matrix
         except Exception as e:
             raise RuntimeError(f"Failed to retrieve embeddings from Redis for user '{user_id}': {e}")
 
+    def get_all_embeddings(self, user_id: str) -> List[dict]:
+        matrix = self.get_style_matrix(user_id)
+        return [
+            {"text": text, "embedding": row}
+            for text, row in zip(matrix.texts, matrix.embeddings)
+        ]
+
     def clear_user_data(self, user_id: str) -> None:
-        self.redis.delete(self._user_key(user_id))
+        self._queue_clear_user_data(user_id).execute()
+        self.matrix_cache.invalidate(user_id)
+
+    def _queue_clear_user_data(self, user_id: str):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(self._user_key(user_id), self._texts_key(user_id))
+        pipe.incr(self._version_key(user_id))
+        return pipe
+
+    def migrate_user(self, user_id: str) -> int:
+        """
+        Convert a user's legacy JSON-encoded samples to the packed float32 format in place.
+
+        Returns the number of samples converted.
+        """
+        raw = self.redis.hgetall(self._user_key(user_id))
+        known = set(self.redis.hkeys(self._texts_key(user_id)))
+        pipe, converted = self._queue_migration(user_id, raw, known)
+        if converted:
+            pipe.execute()
+            self.matrix_cache.invalidate(user_id)
+        return converted
+
+    def _queue_migration(self, user_id: str, raw: dict, known: set):
+        vectors_key = self._user_key(user_id)
+        texts_key = self._texts_key(user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        converted = 0
+        for doc_id, value in raw.items():
+            if doc_id in known:
+                continue
+            try:
+                entry = json.loads(value)
+            except ValueError:
+                # Not JSON, so not a legacy entry: a packed vector whose text is missing
+                continue
+            pipe.hset(vectors_key, doc_id, pack_embedding(entry["embedding"]))
+            pipe.hset(texts_key, doc_id, entry["text"])
+            converted += 1
+        pipe.incr(self._version_key(user_id))
+        return pipe, converted
+
+    def iter_user_ids(self) -> Iterator[str]:
+        """Yield the id of every user with stored samples in this namespace."""
+        prefix = f"{self._prefix()}user:"
+        suffix = ":vectors"
+        for key in self.redis.scan_iter(match=f"{prefix}*{suffix}"):
+            yield key.decode("utf-8")[len(prefix):-len(suffix)]
+
+    def migrate_all(self) -> Dict[str, int]:
+        """Migrate every legacy user key in the namespace, returning converted counts per user."""
+        results = {}
+        for user_id in self.iter_user_ids():
+            converted = self.migrate_user(user_id)
+            if converted:
+                results[user_id] = converted
+        return results
+
+
+class AsyncUserVectorStore(UserVectorStore):
+    """
+    asyncio variant of UserVectorStore backed by redis.asyncio.
+
+    Key layout, encoding and the in-process caches are shared with the sync store;
+    every method that touches Redis is a coroutine.
+    """
+    redis_class = redis.asyncio.Redis
+
+    async def get_cached_embeddings(self, texts: Sequence[str], model: str) -> List[Optional[np.ndarray]]:
+        keys = [self._embedding_key(model, t) for t in texts]
+        found = self.embedding_cache.get_many(keys)
+        missing = [i for i, v in enumerate(found) if v is None]
+        if missing:
+            with span("redis.embedding_cache"):
+                remote = await self.redis.mget([keys[i] for i in missing])
+            self._merge_remote_embeddings(keys, found, missing, remote)
+        return found
+
+    async def cache_embeddings(self, texts: Sequence[str], embeddings: Sequence[List[float]], model: str) -> None:
+        await self._queue_cache_embeddings(texts, embeddings, model).execute()
+
+    async def store_embedding(self, user_id: str, text: str, embedding: List[float]) -> None:
+        await self._queue_store_embedding(user_id, text, embedding).execute()
+        self.matrix_cache.invalidate(user_id)
+
+    async def store_embeddings(self, user_id: str, texts: Sequence[str], embeddings: Sequence[List[float]], cache: Optional[tuple] = None) -> None:
+        pipe = self._queue_store_embeddings(user_id, texts, embeddings, cache)
+        with span("redis.store_embeddings"):
+            await pipe.execute()
+        self.matrix_cache.invalidate(user_id)
+
+    async def existing_doc_ids(self, user_id: str, doc_ids: Sequence[str]) -> set:
+        with span("redis.existing_doc_ids"):
+            flags = await self._queue_exists(user_id, doc_ids).execute()
+        return self._existing(doc_ids, flags)
+
+    async def get_version(self, user_id: str) -> int:
+        version = await self.redis.get(self._version_key(user_id))
+        return int(version) if version else 0
+
+    async def _load_raw(self, user_id: str):
+        version, vectors, texts = await self._queue_load_raw(user_id).execute()
+        return int(version) if version else 0, vectors, texts
+
+    async def get_style_matrix(self, user_id: str) -> StyleMatrix:
+        try:
+            with span("redis.get_version"):
+                version = await self.get_version(user_id)
+            cached = self.matrix_cache.get(user_id, version)
+            if cached is not None:
+                return cached
+
+            with span("redis.load_style"):
+                version, vectors, texts = await self._load_raw(user_id)
+            if self._needs_migration(vectors, texts):
+                await self.migrate_user(user_id)
+                version, vectors, texts = await self._load_raw(user_id)
+
+            with span("style.decode"):
+                matrix = self._decode_matrix(vectors, texts)
+            if self._needs_index(matrix):
+                # Clustering is CPU-bound; keep it off the event loop
+                with span("style.build_index"):
+                    matrix = await asyncio.to_thread(self._with_index, matrix)
+            self.matrix_cache.put(user_id, version, matrix)
+            return matrix
+        except Exception as e:
+            raise RuntimeError(f"Failed to retrieve embeddings from Redis for user '{user_id}': {e}")
+
+    async def get_all_embeddings(self, user_id: str) -> List[dict]:
+        matrix = await self.get_style_matrix(user_id)
+        return [
+            {"text": text, "embedding": row}
+            for text, row in zip(matrix.texts, matrix.embeddings)
+        ]
+
+    async def clear_user_data(self, user_id: str) -> None:
+        await self._queue_clear_user_data(user_id).execute()
+        self.matrix_cache.invalidate(user_id)
+
+    async def migrate_user(self, user_id: str) -> int:
+        raw = await self.redis.hgetall(self._user_key(user_id))
+        known = set(await self.redis.hkeys(self._texts_key(user_id)))
+        pipe, converted = self._queue_migration(user_id, raw, known)
+        if converted:
+            await pipe.execute()
+            self.matrix_cache.invalidate(user_id)
+        return converted
+
+    async def iter_user_ids(self) -> AsyncIterator[str]:
+        prefix = f"{self._prefix()}user:"
+        suffix = ":vectors"
+        async for key in self.redis.scan_iter(match=f"{prefix}*{suffix}"):
+            yield key.decode("utf-8")[len(prefix):-len(suffix)]
+
+    async def migrate_all(self) -> Dict[str, int]:
+        results = {}
+        async for user_id in self.iter_user_ids():
+            converted = await self.migrate_user(user_id)
+            if converted:
+                results[user_id] = converted
+        return results
+
+    async def aclose(self) -> None:
+        await self.redis.aclose()
@@ -0,0 +1,197 @@
+"""
+Long-running worker that serves stylemail calls as line-delimited JSON.
+
+Each request is one line, ``{"id": 1, "method": "generate", "params": {...}}``.
+Each response is one line carrying the same id, with either ``result`` or
+``error`` (``{"type": ..., "message": ...}``). Requests run concurrently on one
+set of AsyncStyleMailClients, so responses can come back out of order; callers
+match them by id. The worker reads stdin and writes stdout by default; only
+responses are written there, and logs go to stderr. With a socket path it
+serves the same protocol to every connection on a Unix socket.
+
+Started with ``python -m stylemail.cli worker [--socket=PATH]``; the Node.js
+wrapper in ``stylemail/js`` keeps one running and multiplexes its calls over it.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from stylemail.api import aseed_user_style, agenerate_email, agenerate_nudge_email, agenerate_nudge_summary, agenerate_team_nudge_emails
+from stylemail.clients import AsyncStyleMailClients
+
+logger = logging.getLogger(__name__)
+
+
+class StyleMailWorker:
+    """Dispatches protocol requests to the async API with shared, long-lived clients."""
+    # Requests in flight per connection before the worker stops reading new ones
+    max_concurrency = 64
+
+    def __init__(self, clients: AsyncStyleMailClients):
+        self.clients = clients
+        self.methods: Dict[str, Callable[..., Awaitable[Any]]] = {
+            "ping": self.ping,
+            "seed": self.seed,
+            "generate": self.generate,
+            "nudge_email": self.nudge_email,
+            "team_nudge_emails": self.team_nudge_emails,
+            "nudge_summary": self.nudge_summary,
+        }
+
+    async def ping(self) -> Dict[str, Any]:
+        return {"pong": True, "pid": os.getpid()}
+
+    async def seed(self, user_id: str, samples) -> Dict[str, int]:
+        return {"stored": await aseed_user_style(user_id, samples, clients=self.clients)}
+
+    async def generate(self, user_id: str, subject: str, prompt: str) -> Dict[str, str]:
+        return await agenerate_email(user_id, subject, prompt, clients=self.clients)
+
+    async def nudge_email(self, user_id: str, prompt: str, nudges) -> Dict[str, str]:
+        return await agenerate_nudge_email(user_id, prompt, nudges, clients=self.clients)
+
+    async def team_nudge_emails(self, user_id: str, prompt: str, team) -> Dict[str, Dict[str, str]]:
+        return await agenerate_team_nudge_emails(user_id, prompt, team, clients=self.clients)
+
+    async def nudge_summary(self, user_id: str, prompt: str, nudges) -> Dict[str, str]:
+        return await agenerate_nudge_summary(user_id, prompt, nudges, clients=self.clients)
+
+    async def handle(self, line: str) -> Dict[str, Any]:
+        """
+        Run the request on one protocol line and build its response.
+
+        Malformed requests and failing calls are answered with an ``error``
+        rather than raised, so one bad request never stops the worker.
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects")
+            request_id = request.get("id")
+            method = self.methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"Unknown method: {request.get('method')!r}")
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise ValueError("params must be a JSON object")
+            try:
+                call = method(**params)
+            except TypeError as e:
+                raise ValueError(f"Invalid params for {request['method']}: {e}")
+            return {"id": request_id, "result": await call}
+        except Exception as e:
+            logger.warning("Worker request %s failed: %s: %s", request_id, type(e).__name__, e)
+            return {"id": request_id, "error": {"type": type(e).__name__, "message": str(e)}}
+
+    async def serve(self, lines: AsyncIterator[str], write: Callable[[str], Awaitable[None]]) -> None:
+        """
+        Answer every request read from ``lines`` until it is exhausted, then wait for those in flight.
+
+        ``write`` receives each response as one JSON line, including the newline.
+        """
+        slots = asyncio.Semaphore(self.max_concurrency)
+        pending: Set[asyncio.Task] = set()
+
+        async def respond(line: str) -> None:
+            try:
+                response = await self.handle(line)
+                await write(json.dumps(response, default=str) + "\n")
+            finally:
+                slots.release()
+
+        async for line in lines:
+            if not line.strip():
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _stdin_lines() -> AsyncIterator[str]:
+    # A daemon reader thread works for pipes, files and terminals alike and never
+    # holds up interpreter exit the way a blocked executor thread would
+    loop = asyncio.get_running_loop()
+    lines: asyncio.Queue = asyncio.Queue()
+
+    def read() -> None:
+        try:
+            for line in sys.stdin:
+                loop.call_soon_threadsafe(lines.put_nowait, line)
+            loop.call_soon_threadsafe(lines.put_nowait, None)
+        except RuntimeError:  # the loop closed first
+            pass
+
+    threading.Thread(target=read, name="stylemail-worker-stdin", daemon=True).start()
+    while True:
+        line = await lines.get()
+        if line is None:
+            return
+        yield line
+
+
+async def _stream_lines(reader: asyncio.StreamReader) -> AsyncIterator[str]:
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield line.decode("utf-8")
+
+
+async def run_worker(clients: AsyncStyleMailClients, socket_path: Optional[str] = None) -> None:
+    """
+    Serve requests over stdin/stdout until stdin closes, or on ``socket_path`` until cancelled.
+
+    The clients are warmed first, so the first request does not pay for importing
+    openai or connecting to Redis. Closes ``clients`` before returning.
+    """
+    worker = StyleMailWorker(clients)
+    try:
+        try:
+            await clients.warm()
+        except Exception as e:
+            logger.warning("Redis connection failed: %s", e)
+        if socket_path is None:
+            # stdout carries responses only; anything printed by accident goes to stderr
+            out, sys.stdout = sys.stdout, sys.stderr
+
+            async def write(text: str) -> None:
+                out.write(text)
+                out.flush()
+
+            try:
+                await worker.serve(_stdin_lines(), write)
+            finally:
+                sys.stdout = out
+            return
+
+        async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            lock = asyncio.Lock()
+
+            async def write(text: str) -> None:
+                async with lock:
+                    writer.write(text.encode("utf-8"))
+                    await writer.drain()
+
+            try:
+                await worker.serve(_stream_lines(reader), write)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(connection, path=socket_path, limit=2 ** 24)
+        logger.info("Worker listening on %s", socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+    finally:
+        await clients.aclose()